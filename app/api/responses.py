@@ -0,0 +1,128 @@
+import hashlib
+from typing import Any, Hashable, Optional, Tuple
+
+import orjson
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from app.config import settings
+from app.thirdparty_translators.cache import TTLCache
+
+# rendered (content, body, etag) by response key, reused while content is the same
+# object (e.g. a cached translation), so conditional hits skip serialization
+rendered_cache = TTLCache(settings.cache_max_entries)
+RENDERED_TTL = 3600.0
+
+
+def _model_fields(obj: Any) -> dict:
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    raise TypeError(f"type {type(obj).__name__} is not JSON serializable")
+
+
+def _set_model_fields(obj: Any) -> dict:
+    if isinstance(obj, BaseModel):
+        fields_set = obj.__fields_set__
+        return {k: v for k, v in obj.__dict__.items() if k in fields_set}
+    raise TypeError(f"type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any, exclude_unset: bool = False) -> bytes:
+    """Serializes Smartcar models (or lists/dicts of them) straight to JSON bytes
+
+    Args:
+        content (Any): models, or plain JSON values containing models
+        exclude_unset (bool, optional): leave out model fields that were never set,
+            like response_model_exclude_unset. Defaults to False.
+
+    Returns:
+        bytes: JSON encoded content
+    """
+    default = _set_model_fields if exclude_unset else _model_fields
+    return orjson.dumps(content, default=default)
+
+
+class ModelResponse(JSONResponse):
+    """JSON response for models that are already valid, e.g. built by a translator.
+
+    Returning a Response from a route skips FastAPI's response_model validation and
+    jsonable_encoder pass, the route's response_model is still used for the OpenAPI
+    schema.
+    """
+
+    def __init__(self, content: Any, exclude_unset: bool = False, **kwargs):
+        self.exclude_unset = exclude_unset
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content, self.exclude_unset)
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag of a response body"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match header against etag (weak comparison, as the header
+    requires)
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.replace("W/", "", 1) == etag:
+            return True
+    return False
+
+
+def render(
+    content: Any, key: Optional[Hashable] = None, exclude_unset: bool = False
+) -> Tuple[bytes, str]:
+    """Serializes content and computes its ETag, memoized under key
+
+    Args:
+        content (Any): models, or plain JSON values containing models
+        key (Hashable, optional): response key, e.g. (route, vehicle_id). The memo is
+            only used while content is the very same object. Defaults to no memo.
+        exclude_unset (bool, optional): see dumps. Defaults to False.
+
+    Returns:
+        Tuple[bytes, str]: body and ETag
+    """
+    if key is not None:
+        entry = rendered_cache.get(key)
+        if entry is not None and entry[0] is content:
+            return entry[1], entry[2]
+
+    body = dumps(content, exclude_unset)
+    etag = make_etag(body)
+    if key is not None:
+        rendered_cache.set(key, (content, body, etag), RENDERED_TTL)
+    return body, etag
+
+
+def conditional_response(
+    request: Request,
+    content: Any,
+    key: Optional[Hashable] = None,
+    exclude_unset: bool = False,
+) -> Response:
+    """JSON response with an ETag, or an empty 304 if the request's If-None-Match
+    has the same ETag
+
+    Args:
+        request (Request): request being answered
+        content (Any): models, or plain JSON values containing models
+        key (Hashable, optional): response key, see render. Defaults to no memo.
+        exclude_unset (bool, optional): see dumps. Defaults to False.
+
+    Returns:
+        Response: 200 with body and ETag, or 304 with ETag
+    """
+    body, etag = render(content, key, exclude_unset)
+    headers = {"ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
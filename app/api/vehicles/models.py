@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -28,4 +28,35 @@ class StartStopEngineRequest(BaseModel):
 
 
 class StartStopEngineResponse(BaseModel):
-    status: str
\ No newline at end of file
+    status: str
+
+
+class SectionError(BaseModel):
+    status: int
+    detail: str
+
+
+class VehicleSnapshot(BaseModel):
+    info: Optional[VehicleInfo]
+    doors: Optional[List[Door]]
+    fuel: Optional[Fuel]
+    battery: Optional[Battery]
+    errors: Dict[str, SectionError] = {}
+
+
+class BatchRequest(BaseModel):
+    vehicle_ids: List[str]
+    resources: List[str] = ["info", "doors", "fuel", "battery"]
+
+
+class BatchResponse(BaseModel):
+    results: Dict[str, VehicleSnapshot] = {}
+    errors: Dict[str, SectionError] = {}
+
+
+class EngineJob(BaseModel):
+    job_id: str
+    vehicle_id: str
+    status: str  # pending|running|succeeded|failed|unknown
+    result: Optional[StartStopEngineResponse]
+    error: Optional[SectionError]
@@ -1,8 +1,13 @@
 import logging
-from typing import List
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from starlette.responses import StreamingResponse
 
+from app.api.responses import ModelResponse, conditional_response, dumps
+from app.config import settings
+from app.registry import get_registry
+from app.thirdparty_translators import admission, engine_jobs, idempotency, telemetry
 from app.thirdparty_translators import translator_selectors as tpt
 
 from . import models
@@ -10,91 +15,365 @@ from . import models
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+SNAPSHOT_FIELDS = ["info", "doors", "fuel", "battery"]
+
+
+class SubscriptionResponse(StreamingResponse):
+    """Streams the changes of a telemetry subscriber, and unsubscribes once the
+    response ends, also when its body never started or was cancelled on disconnect
+    (an async generator only runs its finally once started and closed)
+    """
+
+    def __init__(self, subscriber: telemetry.Subscriber, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.subscriber = subscriber
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            telemetry.unsubscribe(self.subscriber)
+
+
+def _checked_brand(vehicle_id: str, brand: Optional[str]) -> str:
+    brand = brand or "UNKN"
+    logger.info("selected brand %s", brand)
+    if brand == "UNKN":
+        raise KeyError(f"unable to find brand for vehicle_id {vehicle_id}")
+    if not tpt.is_supported_brand(brand):
+        raise KeyError(f"brand {brand} of vehicle_id {vehicle_id} is not supported")
+
+    return brand
+
 
 def lookup_vehicle_id(vehicle_id: str) -> str:
     """Performs a lookup of the vehicle id to determine which external api to hit
-    (currently lookup data is represented in a dictionary, but could be a DB or other media)
+    (lookup data comes from the vehicle registry, see app.registry)
 
     Args:
         vehicle_id (str): id of vehicle to lookup
 
     Raises:
-        ValueError: raises value error if vehicle_id is not in brand_dict
+        KeyError: raises key error if vehicle_id is not in the registry or its brand
+            is not supported
 
     Returns:
         str: brand name as string
     """
-    brand_dict = {
-        "1234": "gm",
-        "1235": "gm",
-        "FORD": "ford",
-    }  # could be a query to a database
-    brand = brand_dict.get(vehicle_id, "UNKN")
-    logger.info(f"selected brand {brand}")
-    if brand == "UNKN":
-        raise KeyError(f"unable to find brand for vehicle_id {vehicle_id}")
+    return _checked_brand(vehicle_id, get_registry().get_brand(vehicle_id))
 
-    return brand
+
+async def lookup_vehicle_id_async(vehicle_id: str) -> str:
+    """Async version of lookup_vehicle_id, registry lookups that miss its caches run
+    off the event loop
+    """
+    brand = await get_registry().get_brand_async(vehicle_id)
+    return _checked_brand(vehicle_id, brand)
+
+
+def _supported_brands(vehicle_ids: List[str], brands: Dict[str, str]) -> Dict[str, str]:
+    supported = {
+        vid: brand for vid, brand in brands.items() if tpt.is_supported_brand(brand)
+    }
+    logger.info("found brands for %d of %d vehicles", len(supported), len(vehicle_ids))
+    return supported
+
+
+def lookup_vehicle_ids(vehicle_ids: List[str]) -> Dict[str, str]:
+    """Performs a bulk lookup of vehicle ids to determine which external api to hit
+
+    Args:
+        vehicle_ids (List[str]): ids of vehicles to lookup
+
+    Returns:
+        Dict[str, str]: brand name by vehicle id, unknown ids and unsupported brands
+            are left out
+    """
+    return _supported_brands(vehicle_ids, get_registry().get_brands(vehicle_ids))
+
+
+async def lookup_vehicle_ids_async(vehicle_ids: List[str]) -> Dict[str, str]:
+    """Async version of lookup_vehicle_ids"""
+    brands = await get_registry().get_brands_async(vehicle_ids)
+    return _supported_brands(vehicle_ids, brands)
+
+
+def validate_fields(
+    fields: List[str], allowed: List[str] = SNAPSHOT_FIELDS
+) -> List[str]:
+    """Checks requested snapshot fields and removes duplicates
+
+    Args:
+        fields (List[str]): requested fields
+        allowed (List[str], optional): valid fields. Defaults to SNAPSHOT_FIELDS.
+
+    Raises:
+        HTTPException: raises 400 error if a field is unknown or none are requested
+
+    Returns:
+        List[str]: fields in request order without duplicates
+    """
+    selected = list(dict.fromkeys(fields))
+    invalid = [f for f in selected if f not in allowed]
+    if invalid or not selected:
+        err_message = f"invalid fields {invalid}, expected any of {allowed}"
+        logger.error(err_message)
+        raise HTTPException(400, detail=err_message)
+
+    return selected
 
 
-@router.get("/{vehicle_id}", response_model=models.VehicleInfo)
-def get_vehicle_info(vehicle_id: str):
+@router.post(
+    "/batch",
+    response_model=models.BatchResponse,
+    dependencies=[Depends(admission.route("batch"))],
+)
+async def get_batch(body: models.BatchRequest):
+    """
+    Fetches resources (info|doors|fuel|battery) of many vehicles in one request.
+    Results and errors are reported per vehicle.
+    """
+    vehicle_ids = list(dict.fromkeys(body.vehicle_ids))
+    if len(vehicle_ids) > settings.batch_max_vehicles:
+        err_message = f"batch is limited to {settings.batch_max_vehicles} vehicles"
+        logger.error(err_message)
+        raise HTTPException(400, detail=err_message)
+    selected = validate_fields(body.resources)
+
+    brands = await lookup_vehicle_ids_async(vehicle_ids)
+    batch = await tpt.select_batch_async(brands, selected)
+    errors = {
+        vid: models.SectionError(
+            status=404, detail=f"unable to find brand for vehicle_id {vid}"
+        )
+        for vid in vehicle_ids
+        if vid not in brands
+    }
+    errors.update(batch.errors)
+    if errors:  # errors is left unset when empty so it is left out of the response
+        batch.errors = errors
+
+    return ModelResponse(batch, exclude_unset=True)
+
+
+@router.get(
+    "/{vehicle_id}",
+    response_model=models.VehicleInfo,
+    dependencies=[Depends(admission.route("info"))],
+)
+async def get_vehicle_info(vehicle_id: str, request: Request):
     """Fetches vehicle information by vehicle_id"""
     try:
-        brand = lookup_vehicle_id(vehicle_id)
+        brand = await lookup_vehicle_id_async(vehicle_id)
     except KeyError as e:
         logger.error(e)
         raise HTTPException(404, detail=str(e))
 
-    return tpt.select_vehicle_info(brand, vehicle_id)
+    content = await tpt.select_vehicle_info_async(brand, vehicle_id)
+    return conditional_response(request, content, key=("info", brand, vehicle_id))
 
 
-@router.get("/{vehicle_id}/doors", response_model=List[models.Door])
-def get_doors(vehicle_id: str):
+@router.get(
+    "/{vehicle_id}/doors",
+    response_model=List[models.Door],
+    dependencies=[Depends(admission.route("doors"))],
+)
+async def get_doors(vehicle_id: str, request: Request):
     """Fetches door security information by vehicle_id"""
     try:
-        brand = lookup_vehicle_id(vehicle_id)
+        brand = await lookup_vehicle_id_async(vehicle_id)
     except KeyError as e:
         logger.error(e)
         raise HTTPException(404, detail=str(e))
 
-    return tpt.select_security_status(brand, vehicle_id)
+    content = await tpt.select_security_status_async(brand, vehicle_id)
+    return conditional_response(request, content, key=("doors", brand, vehicle_id))
 
 
-@router.get("/{vehicle_id}/fuel", response_model=models.Fuel)
-def get_fuel_range(vehicle_id: str):
+@router.get(
+    "/{vehicle_id}/fuel",
+    response_model=models.Fuel,
+    dependencies=[Depends(admission.route("fuel"))],
+)
+async def get_fuel_range(vehicle_id: str, request: Request):
     """Fetches fuel range by vehicle_id. Returns null if vehicle does not use fuel"""
     try:
-        brand = lookup_vehicle_id(vehicle_id)
+        brand = await lookup_vehicle_id_async(vehicle_id)
     except KeyError as e:
         logger.error(e)
         raise HTTPException(404, detail=str(e))
 
-    return tpt.select_fuel_level(brand, vehicle_id)
+    content = await tpt.select_fuel_level_async(brand, vehicle_id)
+    return conditional_response(request, content, key=("fuel", brand, vehicle_id))
 
 
-@router.get("/{vehicle_id}/battery", response_model=models.Battery)
-def get_battery_range(vehicle_id: str):
+@router.get(
+    "/{vehicle_id}/battery",
+    response_model=models.Battery,
+    dependencies=[Depends(admission.route("battery"))],
+)
+async def get_battery_range(vehicle_id: str, request: Request):
     """Fetches battery range by vehicle_id. Returns null if vehicle is not electric"""
     try:
-        brand = lookup_vehicle_id(vehicle_id)
+        brand = await lookup_vehicle_id_async(vehicle_id)
     except KeyError as e:
         logger.error(e)
         raise HTTPException(404, detail=str(e))
 
-    return tpt.select_battery_level(brand, vehicle_id)
+    content = await tpt.select_battery_level_async(brand, vehicle_id)
+    return conditional_response(request, content, key=("battery", brand, vehicle_id))
 
 
-@router.post("/{vehicle_id}/engine", response_model=models.StartStopEngineResponse)
-def start_stop_engine(vehicle_id: str, body: models.StartStopEngineRequest):
+@router.get(
+    "/{vehicle_id}/snapshot",
+    response_model=models.VehicleSnapshot,
+    dependencies=[Depends(admission.route("snapshot"))],
+)
+async def get_snapshot(vehicle_id: str, request: Request, fields: Optional[str] = None):
+    """
+    Fetches info, doors, fuel and battery of a vehicle in one request.
+    fields is a comma separated subset of info|doors|fuel|battery (defaults to all).
+    Sections that fail are reported in errors instead of failing the whole request.
+    """
+    if fields:
+        selected = validate_fields([f.strip() for f in fields.split(",") if f.strip()])
+    else:
+        selected = SNAPSHOT_FIELDS
+
+    try:
+        brand = await lookup_vehicle_id_async(vehicle_id)
+    except KeyError as e:
+        logger.error(e)
+        raise HTTPException(404, detail=str(e))
+
+    snapshot = await tpt.select_snapshot_async(brand, vehicle_id, selected)
+    if len(snapshot.errors) == len(selected):  # nothing to return, fails as a whole
+        error = next(iter(snapshot.errors.values()))
+        raise HTTPException(error.status, detail=error.detail)
+
+    return conditional_response(request, snapshot, exclude_unset=True)
+
+
+@router.get(
+    "/{vehicle_id}/stream",
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def stream_telemetry(
+    vehicle_id: str, request: Request, fields: Optional[str] = None
+):
+    """
+    Streams door and energy state of a vehicle as Server-Sent Events.
+    fields is a comma separated subset of doors|fuel|battery (defaults to all).
+    The first "telemetry" event has the current state, the next ones only the
+    fields that changed, with section errors in errors.
+    """
+    if fields:
+        selected = validate_fields(
+            [f.strip() for f in fields.split(",") if f.strip()],
+            telemetry.TELEMETRY_FIELDS,
+        )
+    else:
+        selected = telemetry.TELEMETRY_FIELDS
+
+    try:
+        brand = await lookup_vehicle_id_async(vehicle_id)
+    except KeyError as e:
+        logger.error(e)
+        raise HTTPException(404, detail=str(e))
+
+    # subscribed before the response starts, so a full worker still answers 429
+    subscriber = telemetry.subscribe(brand, vehicle_id, selected)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                changes = await subscriber.next(settings.telemetry_keepalive)
+                if changes is None:
+                    yield b": keep-alive\n\n"
+                else:
+                    yield b"event: telemetry\ndata: " + dumps(changes) + b"\n\n"
+        finally:
+            telemetry.unsubscribe(subscriber)
+
+    return SubscriptionResponse(
+        subscriber,
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/{vehicle_id}/engine",
+    response_model=models.StartStopEngineResponse,
+    responses={202: {"model": models.EngineJob}},
+    dependencies=[Depends(admission.route("engine"))],
+)
+async def start_stop_engine(
+    vehicle_id: str,
+    body: models.StartStopEngineRequest,
+    request: Request,
+    prefer: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+):
     """
     Sends a request to start/stop vehicle. Proper commands are START|STOP
     Returns "success" upon success, "error" upon error.
+    With a "Prefer: respond-async" header the command runs in the background, a 202
+    with the job is returned at once, see /{vehicle_id}/engine/jobs/{job_id}.
+    Commands sent again with the same Idempotency-Key are sent to the vehicle once,
+    the first response is returned with an "Idempotent-Replayed: true" header.
     """
+    if idempotency_key and len(idempotency_key) > settings.idempotency_key_max_length:
+        err_message = (
+            "Idempotency-Key is limited to "
+            f"{settings.idempotency_key_max_length} characters"
+        )
+        logger.error(err_message)
+        raise HTTPException(400, detail=err_message)
     try:
-        brand = lookup_vehicle_id(vehicle_id)
+        brand = await lookup_vehicle_id_async(vehicle_id)
     except KeyError as e:
         logger.error(e)
         raise HTTPException(404, detail=str(e))
 
-    return tpt.select_start_stop_engine(brand, vehicle_id, body.dict())
\ No newline at end of file
+    post_data = body.dict()
+    respond_async = bool(prefer and "respond-async" in prefer)
+
+    async def send():
+        if respond_async:
+            return engine_jobs.engine_jobs.submit(brand, vehicle_id, post_data)
+        return await tpt.select_start_stop_engine_async(brand, vehicle_id, post_data)
+
+    if idempotency_key:
+        fingerprint = (tuple(sorted(post_data.items())), respond_async)
+        result, replayed = await idempotency.engine_commands.run(
+            (vehicle_id, idempotency_key), fingerprint, send
+        )
+    else:
+        result, replayed = await send(), False
+
+    headers = {"Idempotent-Replayed": "true"} if replayed else {}
+    if respond_async:
+        headers["Location"] = request.url_for(
+            "get_engine_job", vehicle_id=vehicle_id, job_id=result.id
+        )
+        return ModelResponse(result.model(), status_code=202, headers=headers)
+    return ModelResponse(result, headers=headers)
+
+
+@router.get("/{vehicle_id}/engine/jobs/{job_id}", response_model=models.EngineJob)
+async def get_engine_job(vehicle_id: str, job_id: str):
+    """
+    Returns the state of an engine command sent with "Prefer: respond-async"
+    (pending|running|succeeded|failed|unknown), with its result once it succeeded.
+    An unknown command timed out after it was sent and may have been carried out,
+    check the vehicle before sending it again
+    """
+    job = engine_jobs.engine_jobs.get(job_id)
+    if job is None or job.vehicle_id != vehicle_id:
+        err_message = f"engine job {job_id} not found for vehicle_id {vehicle_id}"
+        logger.error(err_message)
+        raise HTTPException(404, detail=err_message)
+
+    return ModelResponse(job.model())
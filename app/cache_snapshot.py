@@ -0,0 +1,131 @@
+"""Snapshots of the in-process caches, for warm restarts
+
+The vehicle response cache and the registry lookup cache are written to a compressed
+JSON file on an interval and at shutdown, and loaded back at startup. Expiry times
+are stored as wall clock times, so loaded entries keep their original TTLs and
+entries that expired in between are skipped.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import zlib
+from typing import Dict, Optional
+
+import orjson
+
+from app.config import settings
+from app.registry import get_registry
+from app.thirdparty_translators import translator_selectors
+from app.thirdparty_translators.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+_task: Optional[asyncio.Future] = None
+
+
+def snapshot_caches() -> Dict[str, TTLCache]:
+    """Returns the snapshotted caches by name"""
+    return {
+        "vehicle": translator_selectors.vehicle_cache,
+        "registry": get_registry().cache,
+    }
+
+
+def save_snapshot(path: str) -> int:
+    """Writes the caches to path, replacing it atomically
+
+    Returns:
+        int: number of entries written
+    """
+    now = time.time()
+    caches = {}
+    count = 0
+    for name, cache in snapshot_caches().items():
+        caches[name] = [
+            [key, value, now + expires_in, now + expires_in + grace]
+            for key, value, expires_in, grace in cache.items()
+        ]
+        count += len(caches[name])
+
+    body = orjson.dumps(
+        {"version": SNAPSHOT_VERSION, "saved_at": now, "caches": caches}
+    )
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(zlib.compress(body, 1))
+    os.replace(tmp_path, path)
+    logger.info("saved %d cache entries to %s", count, path)
+    return count
+
+
+def load_snapshot(path: str) -> int:
+    """Fills the caches from the snapshot at path, if there is a readable one
+
+    Returns:
+        int: number of entries loaded
+    """
+    try:
+        with open(path, "rb") as f:
+            snapshot = orjson.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+        return 0
+    except (OSError, zlib.error, orjson.JSONDecodeError) as e:
+        logger.warning("ignoring unreadable cache snapshot %s: %r", path, e)
+        return 0
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        logger.warning("ignoring cache snapshot %s of another version", path)
+        return 0
+
+    now = time.time()
+    count = 0
+    for name, cache in snapshot_caches().items():
+        for key, value, expires_at, stale_until in snapshot["caches"].get(name, []):
+            if stale_until <= now and expires_at <= now:
+                continue
+            if isinstance(key, list):  # tuple keys come back as JSON arrays
+                key = tuple(key)
+            cache.set(key, value, expires_at - now, stale_until - expires_at)
+            count += 1
+    logger.info("loaded %d cache entries from %s", count, path)
+    return count
+
+
+async def _save_periodically(path: str, interval: float):
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, save_snapshot, path)
+        except Exception as e:
+            logger.warning("failed to save cache snapshot %s: %r", path, e)
+
+
+def start_snapshots():
+    """Loads the snapshot at settings.cache_snapshot_path and starts saving it every
+    settings.cache_snapshot_interval seconds. Does nothing if the path is not set
+    """
+    global _task
+    path = settings.cache_snapshot_path
+    if not path:
+        return
+    load_snapshot(path)
+    _task = asyncio.ensure_future(
+        _save_periodically(path, settings.cache_snapshot_interval)
+    )
+
+
+def stop_snapshots():
+    """Stops the periodic saves and saves a last snapshot"""
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    _task = None
+    try:
+        save_snapshot(settings.cache_snapshot_path)
+    except Exception as e:
+        logger.warning("failed to save cache snapshot: %r", e)
@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseSettings
+
+
+class Settings(BaseSettings):
+    """Application settings. Every value can be overridden by an environment variable
+    of the same name, e.g. POOL_MAX_CONNECTIONS=200
+    """
+
+    # third-party API base urls (e.g. GM_BASE_URL=http://localhost:8100 to use the
+    # local simulator, see simulator/)
+    gm_base_url: str = "http://gmapid.azurewebsites.net"
+
+    # shared upstream connection pool (one per worker)
+    pool_max_connections: int = 100
+    pool_max_keepalive_connections: int = 20
+    pool_keepalive_expiry: float = 5.0  # seconds an idle connection is kept open
+    pool_max_connections_per_host: int = 50
+
+    # upstream timeouts in seconds, services without an entry use the defaults
+    upstream_connect_timeout: float = 2.0
+    upstream_read_timeout: float = 5.0
+    upstream_connect_timeouts: Dict[str, float] = {}
+    upstream_read_timeouts: Dict[str, float] = {"actionEngineService": 10.0}
+
+    # retries of idempotent upstream reads on connection errors, timeouts and
+    # upstream_retry_statuses, with exponential backoff and full jitter (seconds)
+    upstream_retries: int = 2
+    upstream_retry_backoff: float = 0.05
+    upstream_retry_backoff_max: float = 1.0
+    upstream_retry_statuses: List[str] = ["502", "503", "504"]
+
+    # hedging of idempotent reads: a second identical request is sent when the first
+    # has not answered within hedge_percentile of the last hedge_window latencies,
+    # hedges are capped to hedge_budget (share) of requests
+    hedge_enabled: bool = False
+    hedge_services: List[str] = [
+        "getVehicleInfoService",
+        "getSecurityStatusService",
+        "getEnergyService",
+    ]
+    hedge_percentile: float = 95.0
+    hedge_budget: float = 0.05
+    hedge_window: int = 1000
+    hedge_min_samples: int = 100
+    hedge_min_delay: float = 0.005
+
+    # admission control of upstream calls: adaptive (AIMD) concurrency limit per brand,
+    # shrinking on calls slower than admission_target_latency (seconds) or failing.
+    # Calls over the limit wait in a priority queue (lower priority values first) up to
+    # their route's deadline (seconds), or are rejected with a 429. Routes are
+    # info|doors|fuel|battery|snapshot|batch|engine, telemetry for stream polling
+    admission_enabled: bool = True
+    admission_initial_limit: int = 20
+    admission_min_limit: int = 2
+    admission_max_limit: int = 200
+    admission_target_latency: float = 1.0
+    admission_backoff_ratio: float = 0.9
+    admission_queue_size: int = 200
+    admission_default_priority: int = 1
+    admission_default_deadline: float = 2.0
+    admission_priorities: Dict[str, int] = {
+        "engine": 0,
+        "batch": 2,
+        "telemetry": 2,
+        "refresh": 3,
+    }
+    admission_deadlines: Dict[str, float] = {"engine": 5.0, "batch": 5.0}
+
+    # per-brand circuit breaker, opened by consecutive connection errors, timeouts
+    # and upstream_retry_statuses, probed again after breaker_reset_timeout seconds
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+
+    # upstream response cache, TTLs are in seconds per upstream service
+    # (services without a TTL are not cached)
+    cache_max_entries: int = 10000
+    cache_ttls: Dict[str, float] = {
+        "getVehicleInfoService": 3600.0,
+        "getSecurityStatusService": 5.0,
+        "getEnergyService": 5.0,
+    }
+    # seconds an expired entry is still served while it is refreshed in the background
+    cache_stale_grace: Dict[str, float] = {
+        "getVehicleInfoService": 3600.0,
+        "getSecurityStatusService": 10.0,
+        "getEnergyService": 10.0,
+    }
+
+    # refresh-ahead of hot vehicles: requested refresh_hot_threshold times within
+    # refresh_hot_window seconds, refreshed when found within refresh_ahead seconds
+    # of expiring. Background refreshes are bounded
+    refresh_hot_window: float = 60.0
+    refresh_hot_threshold: int = 5
+    refresh_ahead: float = 1.0
+    refresh_max_concurrency: int = 10
+    refresh_max_pending: int = 1000
+
+    # upstream data shared by the workers of a host (memory|sqlite), None disables
+    # it. On a miss, one worker holds a fill lock for shared_cache_lock_lease seconds
+    # while the others serve stale data or wait up to shared_cache_fill_wait seconds
+    shared_cache_backend: Optional[str] = None
+    shared_cache_path: str = "/tmp/shared_cache.db"
+    shared_cache_max_entries: int = 100000
+    shared_cache_lock_lease: float = 10.0
+    shared_cache_fill_wait: float = 1.0
+    shared_cache_poll_interval: float = 0.02
+
+    # file the vehicle and registry caches are saved to on an interval and at
+    # shutdown, and loaded from at startup. None disables snapshots
+    cache_snapshot_path: Optional[str] = None
+    cache_snapshot_interval: float = 300.0
+
+    # engine commands sent with "Prefer: respond-async" run as background jobs:
+    # engine_job_workers at once, up to engine_job_queue_size waiting (429 beyond),
+    # each bounded by the actionEngineService read timeout. Finished job states are
+    # kept engine_job_ttl seconds, up to engine_job_max_jobs
+    engine_job_workers: int = 4
+    engine_job_queue_size: int = 100
+    engine_job_ttl: float = 600.0
+    engine_job_max_jobs: int = 10000
+
+    # engine commands sent with an Idempotency-Key run once per key and vehicle,
+    # their results are replayed for idempotency_ttl seconds
+    idempotency_max_keys: int = 10000
+    idempotency_ttl: float = 86400.0
+    idempotency_key_max_length: int = 255
+
+    # GET /vehicles/{id}/stream, one poller per vehicle and worker shared by its
+    # subscribers. It polls every telemetry_max_interval / subscribers seconds, down
+    # to telemetry_min_interval. Idle streams get a keep-alive every
+    # telemetry_keepalive seconds
+    telemetry_min_interval: float = 1.0
+    telemetry_max_interval: float = 10.0
+    telemetry_keepalive: float = 15.0
+    telemetry_max_subscribers: int = 1000
+
+    # POST /vehicles/batch, concurrency is the number of vehicles fetched at once
+    # per brand, brands without an entry use batch_default_concurrency
+    batch_max_vehicles: int = 500
+    batch_default_concurrency: int = 10
+    batch_concurrency: Dict[str, int] = {}
+
+    # vehicle registry backend (memory|sqlite), lookup cache and unknown-id filters
+    registry_backend: str = "memory"
+    registry_path: str = "registry.db"
+    registry_cache_size: int = 100000
+    registry_cache_ttl: float = 3600.0
+    registry_negative_cache_size: int = 100000
+    registry_negative_ttl: float = 60.0
+    registry_bloom_error_rate: Optional[float] = 0.01  # None disables the filter
+    # seconds between checks for ids added by other processes, rebuilding the filter
+    registry_bloom_check_interval: float = 5.0
+
+
+settings = Settings()
@@ -1,10 +1,205 @@
+import atexit
 import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
+import threading
+import time
 from pathlib import Path
+from typing import Dict, Optional
 
+import orjson
 from loguru import logger
 
+from .tracing import get_request_id
+
+LEVELS = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20, "DEBUG": 10}
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a random share of records, by level and by logger name.
+    The rates of a record's level and of its logger (or nearest configured parent
+    logger) are multiplied, levels and loggers without a rate keep every record
+
+    Args:
+        levels (Dict[str, float]): rate (0-1) by level name, e.g. {"DEBUG": 0.01}
+        loggers (Dict[str, float]): rate (0-1) by logger name, e.g. {"uvicorn.access": 0.1}
+    """
+
+    def __init__(
+        self,
+        levels: Optional[Dict[str, float]] = None,
+        loggers: Optional[Dict[str, float]] = None,
+    ):
+        super().__init__()
+        self.levels = {LEVELS[k.upper()]: v for k, v in (levels or {}).items()}
+        self.loggers = dict(loggers or {})
+        self._rates: Dict[tuple, float] = {}  # (levelno, logger name): rate
+
+    def rate(self, levelno: int, name: str) -> float:
+        key = (levelno, name)
+        rate = self._rates.get(key)
+        if rate is None:
+            rate = self.levels.get(levelno, 1.0)
+            parent = name
+            while parent:
+                if parent in self.loggers:
+                    rate *= self.loggers[parent]
+                    break
+                parent = parent.rpartition(".")[0]
+            self._rates[key] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rate(record.levelno, record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class BoundedQueueHandler(logging.Handler):
+    """Hands records to a background writer through a bounded queue, so callers
+    never block on (or pay for) formatting and I/O.
+
+    Once the queue is filled past watermark, records below WARNING are kept at
+    overload_sample_rate ("sample" policy) or dropped ("drop" policy). Records that
+    find the queue full are always dropped. The writer reports dropped records.
+
+    Args:
+        maxsize (int): queue capacity in records
+        policy (str): overload policy, sample|drop
+        watermark (float): share of maxsize above which the queue is overloaded
+        overload_sample_rate (float): rate kept under the sample policy
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        policy: str = "sample",
+        watermark: float = 0.8,
+        overload_sample_rate: float = 0.1,
+    ):
+        if policy not in ("sample", "drop"):
+            raise ValueError(f"unknown overload policy {policy}, expected sample|drop")
+        super().__init__()
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.high_water = int(maxsize * watermark)
+        self.overload_rate = overload_sample_rate if policy == "sample" else 0.0
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord):
+        record.request_id = get_request_id()  # the writer runs outside the request
+        if self.queue.qsize() >= self.high_water and record.levelno < logging.WARNING:
+            if self.overload_rate <= 0.0 or random.random() >= self.overload_rate:
+                self.dropped += 1
+                return
+        try:
+            # formatted by the writer, in-process records don't need pickling
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    # Handler.handle takes a lock around emit, the queue is thread safe already
+    def handle(self, record: logging.LogRecord) -> bool:
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "function": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id is not None:
+            entry["request_id"] = request_id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+    def formatTime(self, record: logging.LogRecord, datefmt=None) -> str:
+        ct = time.gmtime(record.created)
+        msecs = int(record.msecs)
+        return time.strftime("%Y-%m-%dT%H:%M:%S", ct) + f".{msecs:03d}Z"
+
+
+class QueueWriter:
+    """Background thread writing queued records to handlers
+
+    Args:
+        source (BoundedQueueHandler): handler whose queue is drained
+        handlers (list): handlers doing the formatting and I/O
+        report_interval (float): seconds between reports of dropped records
+    """
+
+    _stop = object()
+
+    def __init__(self, source: BoundedQueueHandler, handlers: list, report_interval=10):
+        self.source = source
+        self.handlers = handlers
+        self.report_interval = report_interval
+        self._reported = 0
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Writes the remaining records and stops the thread"""
+        if self._thread.is_alive():
+            self.source.queue.put(self._stop)
+            self._thread.join()
+        for handler in self.handlers:
+            handler.close()
+
+    def _write(self, record: logging.LogRecord):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _report_dropped(self):
+        dropped = self.source.dropped
+        if dropped > self._reported:
+            record = logging.LogRecord(
+                __name__,
+                logging.WARNING,
+                __file__,
+                0,
+                "logging overloaded, dropped %d records",
+                (dropped - self._reported,),
+                None,
+            )
+            self._reported = dropped
+            self._write(record)
+
+    def _run(self):
+        next_report = time.monotonic() + self.report_interval
+        while True:
+            try:
+                record = self.source.queue.get(timeout=self.report_interval)
+            except queue.Empty:
+                record = None
+            if record is self._stop:
+                self._report_dropped()
+                return
+            if record is not None:
+                self._write(record)
+            if time.monotonic() >= next_report:
+                self._report_dropped()
+                next_report = time.monotonic() + self.report_interval
+
 
 class InterceptHandler(logging.Handler):
     loglevel_mapping = {
@@ -27,16 +222,23 @@ class InterceptHandler(logging.Handler):
             frame = frame.f_back
             depth += 1
 
-        log = logger.bind(request_id="app")
+        log = logger.bind(request_id=get_request_id() or "app")
         log.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
 
 
 class CustomizeLogger:
+    _writer: Optional[QueueWriter] = None
+
     @classmethod
     def make_logger(cls, config_path: Path):
 
         config = cls.load_logging_config(config_path)
         logging_config = config.get("logger")
+        # the log file can be moved with LOG_PATH, e.g. out of the source tree in tests
+        logging_config["path"] = os.environ.get("LOG_PATH", logging_config.get("path"))
+
+        if logging_config.get("mode", "loguru") == "json":
+            return cls.structured_logging(logging_config)
 
         logger = cls.customize_logging(
             logging_config.get("path"),
@@ -65,7 +267,8 @@ class CustomizeLogger:
             level=level.upper(),
             format=format,
         )
-        logging.basicConfig(handlers=[InterceptHandler()], level=0)
+        # records below the configured level are never created
+        logging.basicConfig(handlers=[InterceptHandler()], level=level.upper())
         logging.getLogger("uvicorn.access").handlers = [InterceptHandler()]
         for _log in ["uvicorn", "uvicorn.error", "fastapi"]:
             _logger = logging.getLogger(_log)
@@ -73,9 +276,72 @@ class CustomizeLogger:
 
         return logger.bind(request_id=None, method=None)
 
+    @classmethod
+    def structured_logging(cls, logging_config: dict) -> logging.Logger:
+        """Routes stdlib logging (the app's, uvicorn's and fastapi's) through a
+        bounded queue to a background writer producing JSON lines on stdout and in
+        a daily rotated file
+
+        Args:
+            logging_config (dict): "logger" section of logging_config.json
+
+        Returns:
+            logging.Logger: the app logger
+        """
+        cls.shutdown()
+        logger.remove()  # loguru is not used in this mode
+
+        level = logging_config.get("level", "info").upper()
+        queue_config = logging_config.get("queue", {})
+        sampling = logging_config.get("sampling", {})
+
+        formatter = JSONFormatter()
+        stream = logging.StreamHandler(sys.stdout)
+        filepath = Path(logging_config.get("path"))
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        file = logging.handlers.TimedRotatingFileHandler(
+            filepath,
+            when="midnight",
+            backupCount=logging_config.get("backup_count", 30),
+            delay=True,
+        )
+        for handler in (stream, file):
+            handler.setFormatter(formatter)
+
+        handler = BoundedQueueHandler(
+            maxsize=queue_config.get("maxsize", 10000),
+            policy=queue_config.get("overload_policy", "sample"),
+            watermark=queue_config.get("watermark", 0.8),
+            overload_sample_rate=queue_config.get("overload_sample_rate", 0.1),
+        )
+        handler.addFilter(
+            SamplingFilter(sampling.get("levels"), sampling.get("loggers"))
+        )
+
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(level)
+        for _log in ["uvicorn", "uvicorn.error", "uvicorn.access", "fastapi"]:
+            _logger = logging.getLogger(_log)
+            _logger.handlers = []
+            _logger.propagate = True
+
+        cls._writer = QueueWriter(handler, [stream, file])
+        cls._writer.start()
+        atexit.unregister(cls.shutdown)
+        atexit.register(cls.shutdown)
+        return logging.getLogger("app")
+
+    @classmethod
+    def shutdown(cls):
+        """Flushes queued records and stops the background writer, if running"""
+        if cls._writer is not None:
+            cls._writer.stop()
+            cls._writer = None
+
     @classmethod
     def load_logging_config(cls, config_path):
         config = None
         with open(config_path) as config_file:
             config = json.load(config_file)
-        return config
\ No newline at end of file
+        return config
@@ -3,8 +3,13 @@ from pathlib import Path
 
 from fastapi import FastAPI
 
+from . import cache_snapshot, metrics
 from .api.vehicles import router as vehicle_router
 from .custom_logging import CustomizeLogger
+from .registry import close_registry, get_registry
+from .shared_cache import close_shared_cache
+from .thirdparty_translators import engine_jobs, http_client
+from .tracing import RequestContextMiddleware
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +23,42 @@ def create_app() -> FastAPI:
     logger = CustomizeLogger.make_logger(config_path)
     app.logger = logger
 
+    app.add_middleware(RequestContextMiddleware)
     app.include_router(vehicle_router, prefix="/vehicles")
+    app.include_router(metrics.router)
+
+    @app.on_event("startup")
+    def start_http_client():
+        http_client.start_client()
+
+    @app.on_event("startup")
+    def open_registry():
+        get_registry()
+
+    # after open_registry and before shutdown_registry, the registry cache is saved
+    @app.on_event("startup")
+    async def load_cache_snapshot():
+        cache_snapshot.start_snapshots()
+
+    @app.on_event("shutdown")
+    def save_cache_snapshot():
+        cache_snapshot.stop_snapshots()
+
+    @app.on_event("shutdown")
+    def shutdown_registry():
+        close_registry()
+
+    @app.on_event("shutdown")
+    def shutdown_shared_cache():
+        close_shared_cache()
+
+    @app.on_event("shutdown")
+    def stop_engine_jobs():
+        engine_jobs.engine_jobs.close()
+
+    @app.on_event("shutdown")
+    async def close_http_client():
+        await http_client.close_client()
 
     return app
 
@@ -0,0 +1,154 @@
+"""Prometheus metrics of the app and its upstream calls
+
+Set the PROMETHEUS_MULTIPROC_DIR environment variable to an empty directory, before the
+app is imported, to aggregate metrics across gunicorn workers. Gunicorn configs should
+call child_exit from their child_exit hook so gauges of dead workers are dropped (see
+docker/gunicorn_conf.py), and the directory should be emptied before gunicorn starts.
+"""
+
+import os
+from typing import Dict, Tuple
+
+from fastapi import APIRouter
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.responses import Response
+
+router = APIRouter()
+
+# upstream calls are mostly tens to hundreds of milliseconds, cache hits microseconds
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of requests to the app by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests being handled by the app",
+    multiprocess_mode="livesum",
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of third-party API requests by service and response status",
+    ["brand", "service", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "upstream_requests_in_flight",
+    "Third-party API requests waiting for a response",
+    ["brand", "service"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_POOL_CONNECTIONS = Gauge(
+    "upstream_pool_connections",
+    "Requests using (in_use) or waiting for (waiting) a connection of the shared "
+    "upstream pool, and its idle keep-alive connections (keepalive), by host",
+    ["host", "state"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_HEDGES = Counter(
+    "upstream_hedged_requests",
+    "Third-party API requests that were hedged with a second request",
+    ["brand", "service"],
+)
+UPSTREAM_HEDGE_WINS = Counter(
+    "upstream_hedge_wins",
+    "Hedged third-party API requests answered first by the hedge",
+    ["brand", "service"],
+)
+ADMISSION_LIMIT = Gauge(
+    "admission_concurrency_limit",
+    "Adaptive concurrency limit of upstream calls by brand",
+    ["brand"],
+    multiprocess_mode="liveall",
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected",
+    "Upstream calls shed with a 429 by brand, route and reason",
+    ["brand", "route", "reason"],
+)
+SINGLEFLIGHT_COLLAPSED = Counter(
+    "singleflight_collapsed",
+    "Third-party API requests that joined an identical request in flight",
+    ["brand", "service"],
+)
+CACHE_REQUESTS = Counter(
+    "vehicle_cache_requests",
+    "Upstream response cache lookups by service and result (hit|stale|miss)",
+    ["brand", "service", "result"],
+)
+CACHE_REFRESHES = Counter(
+    "vehicle_cache_refreshes",
+    "Background cache refreshes by reason (stale|ahead), or dropped when too many",
+    ["reason"],
+)
+
+# label children by label values, labels() takes a lock and validates every call
+_children: Dict[Tuple, object] = {}
+
+
+def child(metric, *labels):
+    """Returns the (memoized) child of metric for the label values"""
+    key = (metric, labels)
+    found = _children.get(key)
+    if found is None:
+        found = _children[key] = metric.labels(*labels)
+    return found
+
+
+def observe_upstream(brand: str, service: str, status: str, seconds: float):
+    child(UPSTREAM_LATENCY, brand, service, status).observe(seconds)
+
+
+def count_cache_lookup(brand: str, service: str, result: str):
+    child(CACHE_REQUESTS, brand, service, result).inc()
+
+
+def multiprocess_enabled() -> bool:
+    return bool(
+        os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+        or os.environ.get("prometheus_multiproc_dir")
+    )
+
+
+def child_exit(server, worker):
+    """Gunicorn child_exit hook, e.g. child_exit = app.metrics.child_exit"""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(worker.pid)
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus metrics, aggregated over every worker in multiprocess mode"""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,76 @@
+import logging
+from typing import Optional
+
+from app.config import settings
+
+from .base import VehicleRegistry
+from .bloom import BloomFilter
+from .cached import CachedRegistry
+from .memory import MemoryRegistry
+from .sqlite import SQLiteRegistry
+
+__all__ = [
+    "BloomFilter",
+    "CachedRegistry",
+    "MemoryRegistry",
+    "SQLiteRegistry",
+    "VehicleRegistry",
+    "close_registry",
+    "create_registry",
+    "get_registry",
+]
+
+logger = logging.getLogger(__name__)
+
+# vehicles registered in the memory backend
+SEED_VEHICLES = {
+    "1234": "gm",
+    "1235": "gm",
+    "FORD": "ford",
+}
+
+_registry: Optional[CachedRegistry] = None
+
+
+def create_registry() -> CachedRegistry:
+    """Creates the registry backend selected by settings.registry_backend
+    (memory|sqlite) wrapped with the lookup caches
+
+    Raises:
+        ValueError: raises if the backend is unknown
+
+    Returns:
+        CachedRegistry: cached registry
+    """
+    if settings.registry_backend == "memory":
+        backend: VehicleRegistry = MemoryRegistry(SEED_VEHICLES)
+    elif settings.registry_backend == "sqlite":
+        backend = SQLiteRegistry(settings.registry_path)
+    else:
+        raise ValueError(f"unknown registry backend {settings.registry_backend}")
+
+    logger.info("using %s vehicle registry", settings.registry_backend)
+    return CachedRegistry(
+        backend,
+        cache_size=settings.registry_cache_size,
+        cache_ttl=settings.registry_cache_ttl,
+        negative_cache_size=settings.registry_negative_cache_size,
+        negative_ttl=settings.registry_negative_ttl,
+        bloom_error_rate=settings.registry_bloom_error_rate,
+        bloom_check_interval=settings.registry_bloom_check_interval,
+    )
+
+
+def get_registry() -> CachedRegistry:
+    """Returns the worker's registry, creating it on first use"""
+    global _registry
+    if _registry is None:
+        _registry = create_registry()
+    return _registry
+
+
+def close_registry():
+    global _registry
+    if _registry is not None:
+        _registry.close()
+        _registry = None
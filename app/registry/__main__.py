@@ -0,0 +1,80 @@
+"""Registry command line tools
+
+Bulk import vehicles from a CSV file with vehicle_id,brand rows:
+
+    python -m app.registry import vehicles.csv --db registry.db
+"""
+
+import argparse
+import csv
+import sys
+import time
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+from app.config import settings
+
+from .sqlite import SQLiteRegistry
+
+
+def read_vehicles(
+    csv_file: TextIO, skipped: Optional[List[int]] = None
+) -> Iterator[Tuple[str, str]]:
+    """Yields (vehicle_id, brand) pairs, skipping a vehicle_id,brand header and
+    blank lines
+
+    Args:
+        csv_file (TextIO): CSV file with vehicle_id,brand rows
+        skipped (List[int], optional): line numbers of rows without a vehicle id and
+            a brand are appended to it
+    """
+    reader = csv.reader(csv_file)
+    for row in reader:
+        if not row or row[0] == "vehicle_id":
+            continue
+        vehicle_id = row[0].strip()
+        brand = row[1].strip().lower() if len(row) > 1 else ""
+        if vehicle_id and brand:
+            yield vehicle_id, brand
+        elif skipped is not None:
+            skipped.append(reader.line_num)
+
+
+def import_vehicles(path: str, db: str, skipped: Optional[List[int]] = None) -> int:
+    """Imports the vehicles of a CSV file, see read_vehicles
+
+    Returns:
+        int: vehicles imported
+    """
+    registry = SQLiteRegistry(db)
+    try:
+        with open(path, newline="") as csv_file:
+            return registry.add_many(read_vehicles(csv_file, skipped))
+    finally:
+        registry.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.registry")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser(
+        "import", help="bulk import vehicle_id,brand rows from a CSV file"
+    )
+    import_parser.add_argument("csv_path")
+    import_parser.add_argument("--db", default=settings.registry_path)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    skipped: List[int] = []
+    count = import_vehicles(args.csv_path, args.db, skipped)
+    elapsed = time.perf_counter() - start
+    for line in skipped:
+        print(
+            f"skipped line {line} of {args.csv_path}: expected vehicle_id,brand",
+            file=sys.stderr,
+        )
+    print(f"imported {count} vehicles into {args.db} in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class VehicleRegistry:
+    """Maps vehicle ids to the brand whose API serves them"""
+
+    def get_brand(self, vehicle_id: str) -> Optional[str]:
+        """Returns the brand of vehicle_id, or None if it is not registered"""
+        raise NotImplementedError
+
+    def get_brands(self, vehicle_ids: List[str]) -> Dict[str, str]:
+        """Returns brand by vehicle id, unknown ids are left out"""
+        brands = {}
+        for vehicle_id in vehicle_ids:
+            brand = self.get_brand(vehicle_id)
+            if brand is not None:
+                brands[vehicle_id] = brand
+        return brands
+
+    def add_many(self, vehicles: Iterable[Tuple[str, str]]) -> int:
+        """Registers (vehicle_id, brand) pairs, replacing existing ids.
+        Returns the number of pairs written
+        """
+        raise NotImplementedError
+
+    def iter_ids(self) -> Iterator[str]:
+        """Iterates over every registered vehicle id"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def generation(self) -> Optional[int]:
+        """Returns a number that changes whenever ids are added, None if the
+        registry never changes
+        """
+        return None
+
+    def close(self):
+        pass
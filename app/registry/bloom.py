@@ -0,0 +1,41 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Probabilistic set of strings. might_contain never returns False for an added
+    item, and returns True for a missing item with about error_rate probability.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _hashes(self, item: str):
+        # double hashing: two 64 bit halves of one digest give every position
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        return (
+            int.from_bytes(digest[:8], "little"),
+            int.from_bytes(digest[8:], "little") | 1,
+        )
+
+    def add(self, item: str):
+        h1, h2 = self._hashes(item)
+        bits, size = self._bits, self.size
+        for i in range(self.hash_count):
+            pos = (h1 + i * h2) % size
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, item: str) -> bool:
+        h1, h2 = self._hashes(item)
+        bits, size = self._bits, self.size
+        for i in range(self.hash_count):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __contains__(self, item: str) -> bool:
+        return self.might_contain(item)
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.thirdparty_translators.cache import TTLCache
+
+from .base import VehicleRegistry
+from .bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_blocking(fn: Callable, *args):
+    return await asyncio.get_event_loop().run_in_executor(None, fn, *args)
+
+
+class CachedRegistry(VehicleRegistry):
+    """Wraps a registry backend with an in-process lookup cache, a negative cache
+    for unknown ids, and an optional Bloom filter that rejects most unknown ids
+    without touching either cache or the backend.
+
+    The Bloom filter is built in a background thread on first use, and rebuilt when
+    the backend's generation changes (bumped once per import by another process,
+    e.g. the import command), checked every bloom_check_interval seconds. Lookups
+    skip the filter while it is built, and a filter is only used if no ids were
+    added while building it. Ids imported by another process may be rejected until
+    the next check after their import completes.
+
+    The *_async lookups are for the event loop: cache misses and generation checks
+    query the backend in the default executor.
+    """
+
+    def __init__(
+        self,
+        backend: VehicleRegistry,
+        cache_size: int,
+        cache_ttl: float,
+        negative_cache_size: int,
+        negative_ttl: float,
+        bloom_error_rate: Optional[float] = None,
+        bloom_check_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backend = backend
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(cache_size)
+        self.negative_cache = TTLCache(negative_cache_size)
+        self.bloom_error_rate = bloom_error_rate
+        self.bloom_check_interval = bloom_check_interval
+        self._clock = clock
+        self.bloom: Optional[BloomFilter] = None
+        self.bloom_rejections = 0
+        self._bloom_generation: Optional[int] = None
+        self._bloom_checked_at: Optional[float] = None
+        self._bloom_building = False
+        self._bloom_lock = threading.Lock()
+
+    def rebuild_bloom(self):
+        """Builds the Bloom filter over every registered id, again if ids were added
+        while it was built
+        """
+        generation = self.backend.generation()
+        while True:
+            count = len(self.backend)
+            # sized with headroom so ids added later don't push up the error rate
+            bloom = BloomFilter(max(count * 2, 1000), self.bloom_error_rate)
+            for vehicle_id in self.backend.iter_ids():
+                bloom.add(vehicle_id)
+            built_generation, generation = generation, self.backend.generation()
+            if generation == built_generation:
+                break
+        with self._bloom_lock:
+            self.bloom = bloom
+            self._bloom_generation = generation
+        logger.info("built registry bloom filter over %d vehicle ids", count)
+
+    def _rebuild_in_background(self):
+        with self._bloom_lock:
+            if self._bloom_building:
+                return
+            self._bloom_building = True
+
+        def build():
+            try:
+                self.rebuild_bloom()
+            except Exception as e:
+                logger.warning("failed to build registry bloom filter: %r", e)
+            finally:
+                self._bloom_building = False
+
+        threading.Thread(target=build, name="registry-bloom", daemon=True).start()
+
+    def _bloom_check_due(self) -> bool:
+        if not self.bloom_error_rate:
+            return False
+        now = self._clock()
+        checked_at = self._bloom_checked_at
+        if checked_at is None or now - checked_at >= self.bloom_check_interval:
+            self._bloom_checked_at = now
+            return True
+        return False
+
+    def _check_bloom(self):
+        """Drops the Bloom filter if ids were added by another process, and starts
+        (re)building it if needed
+        """
+        if self.bloom is not None:
+            if self.backend.generation() == self._bloom_generation:
+                return
+            self.bloom = None
+        self._rebuild_in_background()
+
+    def _active_bloom(self) -> Optional[BloomFilter]:
+        """Returns the Bloom filter if it is up to date with the backend, None while
+        it is (re)built
+        """
+        if self._bloom_check_due():
+            self._check_bloom()
+        return self.bloom
+
+    async def _active_bloom_async(self) -> Optional[BloomFilter]:
+        if self._bloom_check_due():
+            await _run_blocking(self._check_bloom)
+        return self.bloom
+
+    def _cached_brand(
+        self, bloom: Optional[BloomFilter], vehicle_id: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Looks vehicle_id up in the Bloom filter and the caches
+
+        Returns:
+            Tuple[bool, Optional[str]]: whether they answered, and the brand (None
+                for an unknown id)
+        """
+        if bloom is not None and not bloom.might_contain(vehicle_id):
+            self.bloom_rejections += 1
+            return True, None
+        brand = self.cache.get(vehicle_id)
+        if brand is not None:
+            return True, brand
+        if self.negative_cache.get(vehicle_id) is not None:
+            return True, None
+        return False, None
+
+    def _remember(self, vehicle_id: str, brand: Optional[str]) -> Optional[str]:
+        if brand is None:
+            self.negative_cache.set(vehicle_id, True, self.negative_ttl)
+        else:
+            self.cache.set(vehicle_id, brand, self.cache_ttl)
+        return brand
+
+    def get_brand(self, vehicle_id: str) -> Optional[str]:
+        found, brand = self._cached_brand(self._active_bloom(), vehicle_id)
+        if found:
+            return brand
+        return self._remember(vehicle_id, self.backend.get_brand(vehicle_id))
+
+    async def get_brand_async(self, vehicle_id: str) -> Optional[str]:
+        found, brand = self._cached_brand(await self._active_bloom_async(), vehicle_id)
+        if found:
+            return brand
+        brand = await _run_blocking(self.backend.get_brand, vehicle_id)
+        return self._remember(vehicle_id, brand)
+
+    def _split_cached(
+        self, bloom: Optional[BloomFilter], vehicle_ids: List[str]
+    ) -> Tuple[Dict[str, str], List[str]]:
+        """Returns the brands answered by the filter and the caches, and the ids left
+        to fetch from the backend
+        """
+        brands = {}
+        to_fetch = []
+        for vehicle_id in vehicle_ids:
+            found, brand = self._cached_brand(bloom, vehicle_id)
+            if not found:
+                to_fetch.append(vehicle_id)
+            elif brand is not None:
+                brands[vehicle_id] = brand
+        return brands, to_fetch
+
+    def _remember_many(self, to_fetch: List[str], fetched: Dict[str, str]):
+        for vehicle_id in to_fetch:
+            self._remember(vehicle_id, fetched.get(vehicle_id))
+
+    def get_brands(self, vehicle_ids: List[str]) -> Dict[str, str]:
+        brands, to_fetch = self._split_cached(self._active_bloom(), vehicle_ids)
+        if to_fetch:
+            fetched = self.backend.get_brands(to_fetch)
+            self._remember_many(to_fetch, fetched)
+            brands.update(fetched)
+        return brands
+
+    async def get_brands_async(self, vehicle_ids: List[str]) -> Dict[str, str]:
+        bloom = await self._active_bloom_async()
+        brands, to_fetch = self._split_cached(bloom, vehicle_ids)
+        if to_fetch:
+            fetched = await _run_blocking(self.backend.get_brands, to_fetch)
+            self._remember_many(to_fetch, fetched)
+            brands.update(fetched)
+        return brands
+
+    def add_many(self, vehicles: Iterable[Tuple[str, str]]) -> int:
+        vehicles = list(vehicles)
+        bloom = self.bloom
+        if bloom is not None:  # before the backend, so the ids are never rejected
+            for vehicle_id, _ in vehicles:
+                bloom.add(vehicle_id)
+        count = self.backend.add_many(vehicles)
+        for vehicle_id, _ in vehicles:
+            self.cache.delete(vehicle_id)
+            self.negative_cache.delete(vehicle_id)
+        return count
+
+    def iter_ids(self) -> Iterator[str]:
+        return self.backend.iter_ids()
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+    def close(self):
+        self.backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "cache": self.cache.stats(),
+            "negative_cache": self.negative_cache.stats(),
+            "bloom_rejections": self.bloom_rejections,
+        }
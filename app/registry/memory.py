@@ -0,0 +1,31 @@
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from .base import VehicleRegistry
+
+
+class MemoryRegistry(VehicleRegistry):
+    """Registry held in a dict, used for development and tests"""
+
+    def __init__(self, vehicles: Optional[Dict[str, str]] = None):
+        self._brands: Dict[str, str] = dict(vehicles or {})
+        self._generation = 0
+
+    def get_brand(self, vehicle_id: str) -> Optional[str]:
+        return self._brands.get(vehicle_id)
+
+    def add_many(self, vehicles: Iterable[Tuple[str, str]]) -> int:
+        count = 0
+        for vehicle_id, brand in vehicles:
+            self._brands[vehicle_id] = brand
+            count += 1
+        self._generation += 1
+        return count
+
+    def iter_ids(self) -> Iterator[str]:
+        return iter(list(self._brands))
+
+    def __len__(self) -> int:
+        return len(self._brands)
+
+    def generation(self) -> Optional[int]:
+        return self._generation
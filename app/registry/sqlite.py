@@ -0,0 +1,117 @@
+import itertools
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .base import VehicleRegistry
+
+# stays under SQLITE_MAX_VARIABLE_NUMBER on older sqlite builds
+QUERY_CHUNK_SIZE = 500
+WRITE_CHUNK_SIZE = 10000
+
+
+class SQLiteRegistry(VehicleRegistry):
+    """Registry stored in an SQLite file, indexed by vehicle id so lookups stay
+    flat as the fleet grows. Each thread gets its own connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS vehicles ("
+                "vehicle_id TEXT PRIMARY KEY, brand TEXT NOT NULL) WITHOUT ROWID"
+            )
+            # bumped once per add_many, so other processes see ids were added
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                "key TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get_brand(self, vehicle_id: str) -> Optional[str]:
+        row = (
+            self._connection()
+            .execute("SELECT brand FROM vehicles WHERE vehicle_id = ?", (vehicle_id,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def get_brands(self, vehicle_ids: List[str]) -> Dict[str, str]:
+        conn = self._connection()
+        brands = {}
+        for start in range(0, len(vehicle_ids), QUERY_CHUNK_SIZE):
+            end = start + QUERY_CHUNK_SIZE
+            chunk = vehicle_ids[start:end]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                "SELECT vehicle_id, brand FROM vehicles "
+                f"WHERE vehicle_id IN ({placeholders})",
+                chunk,
+            )
+            brands.update(rows)
+        return brands
+
+    def add_many(self, vehicles: Iterable[Tuple[str, str]]) -> int:
+        conn = self._connection()
+        count = 0
+        vehicles = iter(vehicles)
+        while True:
+            chunk = list(itertools.islice(vehicles, WRITE_CHUNK_SIZE))
+            if not chunk:
+                break
+            with conn:  # one transaction per chunk
+                conn.executemany(
+                    "INSERT OR REPLACE INTO vehicles (vehicle_id, brand) VALUES (?, ?)",
+                    chunk,
+                )
+            count += len(chunk)
+        if count:  # once the import is complete, readers rebuild their filter once
+            with conn:
+                conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('generation', 1) "
+                    "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+                )
+        return count
+
+    def iter_ids(self) -> Iterator[str]:
+        # separate cursor so the scan doesn't interfere with lookups on this thread
+        cursor = self._connection().cursor()
+        cursor.arraysize = WRITE_CHUNK_SIZE
+        cursor.execute("SELECT vehicle_id FROM vehicles")
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            for (vehicle_id,) in rows:
+                yield vehicle_id
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM vehicles").fetchone()[0]
+
+    def generation(self) -> Optional[int]:
+        row = (
+            self._connection()
+            .execute("SELECT value FROM meta WHERE key = 'generation'")
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
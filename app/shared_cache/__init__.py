@@ -0,0 +1,64 @@
+import logging
+from typing import Optional
+
+from app.config import settings
+
+from .base import SharedCache
+from .memory import MemorySharedCache
+from .sqlite import SQLiteSharedCache
+
+__all__ = [
+    "MemorySharedCache",
+    "SQLiteSharedCache",
+    "SharedCache",
+    "close_shared_cache",
+    "create_shared_cache",
+    "get_shared_cache",
+]
+
+logger = logging.getLogger(__name__)
+
+_shared_cache: Optional[SharedCache] = None
+
+
+def create_shared_cache() -> Optional[SharedCache]:
+    """Creates the shared cache backend selected by settings.shared_cache_backend
+    (memory|sqlite), None if it is not set
+
+    Raises:
+        ValueError: raises if the backend is unknown
+
+    Returns:
+        Optional[SharedCache]: shared cache
+    """
+    backend = settings.shared_cache_backend
+    if not backend:
+        return None
+    if backend == "memory":
+        cache: SharedCache = MemorySharedCache(settings.shared_cache_max_entries)
+    elif backend == "sqlite":
+        cache = SQLiteSharedCache(
+            settings.shared_cache_path, settings.shared_cache_max_entries
+        )
+    else:
+        raise ValueError(f"unknown shared cache backend {backend}")
+
+    logger.info("using %s shared cache", backend)
+    return cache
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """Returns the worker's shared cache, creating it on first use. None if no
+    backend is configured
+    """
+    global _shared_cache
+    if _shared_cache is None and settings.shared_cache_backend:
+        _shared_cache = create_shared_cache()
+    return _shared_cache
+
+
+def close_shared_cache():
+    global _shared_cache
+    if _shared_cache is not None:
+        _shared_cache.close()
+        _shared_cache = None
@@ -0,0 +1,45 @@
+from typing import Optional, Tuple
+
+
+class SharedCache:
+    """Cache of serialized values shared by the worker processes of a host.
+
+    Entries expire after their own TTL and can be kept for a grace period after,
+    during which get() still returns them as stale. Fill locks let a single worker
+    fetch a missing key while the others wait for it. Times are wall clock seconds,
+    as they are compared across processes.
+    """
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Returns (value, seconds until it expires) for key, or None if it is
+        missing or past its grace period. Stale values have zero or negative seconds
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float, grace: float = 0.0):
+        """Stores value under key for ttl seconds, plus grace seconds during which
+        get() returns it as stale
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def try_lock(self, key: str, owner: str, lease: float) -> bool:
+        """Takes the fill lock of key for lease seconds, unless another owner holds
+        it. The lease bounds how long a crashed owner can block the key
+
+        Returns:
+            bool: True if owner holds the lock
+        """
+        raise NotImplementedError
+
+    def unlock(self, key: str, owner: str):
+        """Releases the fill lock of key if owner holds it"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
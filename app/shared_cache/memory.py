@@ -0,0 +1,46 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from app.thirdparty_translators.cache import TTLCache
+
+from .base import SharedCache
+
+
+class MemorySharedCache(SharedCache):
+    """Shared cache held in the worker, used for development and tests, or as the
+    stand-in of a networked store
+    """
+
+    def __init__(self, maxsize: int, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._entries = TTLCache(maxsize, clock)
+        self._locks: Dict[str, Tuple[str, float]] = {}  # key: (owner, until)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        return self._entries.lookup(key)
+
+    def set(self, key: str, value: bytes, ttl: float, grace: float = 0.0):
+        self._entries.set(key, value, ttl, grace)
+
+    def delete(self, key: str):
+        self._entries.delete(key)
+
+    def try_lock(self, key: str, owner: str, lease: float) -> bool:
+        with self._lock:
+            now = self._clock()
+            held = self._locks.get(key)
+            if held is not None and held[0] != owner and held[1] > now:
+                return False
+            self._locks[key] = (owner, now + lease)
+            return True
+
+    def unlock(self, key: str, owner: str):
+        with self._lock:
+            held = self._locks.get(key)
+            if held is not None and held[0] == owner:
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from .base import SharedCache
+
+# writes between prunes of expired and excess entries
+PRUNE_EVERY = 256
+
+
+class SQLiteSharedCache(SharedCache):
+    """Shared cache stored in an SQLite file in WAL mode, so the workers of a host
+    read it concurrently while one of them writes. Each thread gets its own
+    connection. Size is bounded lazily: every PRUNE_EVERY writes, entries past their
+    grace period are deleted, then the ones closest to expiring beyond maxsize.
+    """
+
+    def __init__(self, path: str, maxsize: int, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.maxsize = maxsize
+        self._clock = clock
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, "
+                "value BLOB NOT NULL, expires_at REAL NOT NULL, "
+                "stale_until REAL NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_stale_until ON cache (stale_until)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, "
+                "owner TEXT NOT NULL, until REAL NOT NULL) WITHOUT ROWID"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL stays consistent without syncing every commit, a crash can only
+            # lose the latest entries, which are refetched
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        now = self._clock()
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value, expires_at FROM cache "
+                "WHERE key = ? AND (stale_until > ? OR expires_at > ?)",
+                (key, now, now),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return row[0], row[1] - now
+
+    def set(self, key: str, value: bytes, ttl: float, grace: float = 0.0):
+        expires_at = self._clock() + ttl
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, stale_until) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, expires_at + grace),
+            )
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    def delete(self, key: str):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def prune(self):
+        """Deletes entries past their grace period and expired locks, then the
+        entries closest to expiring while there are more than maxsize
+        """
+        now = self._clock()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM cache WHERE stale_until <= ? AND expires_at <= ?",
+                (now, now),
+            )
+            conn.execute("DELETE FROM locks WHERE until <= ?", (now,))
+            excess = len(self) - self.maxsize
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY stale_until LIMIT ?)",
+                    (excess,),
+                )
+
+    def try_lock(self, key: str, owner: str, lease: float) -> bool:
+        now = self._clock()
+        conn = self._connection()
+        with conn:
+            # a single upsert, so two workers can't both take the lock
+            cursor = conn.execute(
+                "INSERT INTO locks (key, owner, until) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, "
+                "until = excluded.until "
+                "WHERE locks.until <= ? OR locks.owner = excluded.owner",
+                (key, owner, now + lease, now),
+            )
+        return cursor.rowcount > 0
+
+    def unlock(self, key: str, owner: str):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, owner))
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
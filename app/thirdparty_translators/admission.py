@@ -0,0 +1,287 @@
+"""Admission control of upstream calls, per brand
+
+Every brand gets an adaptive concurrency limit (AIMD: it grows by about one per limit
+calls answered within the target latency, and shrinks by a ratio on slow or failed
+calls). Calls over the limit wait in a bounded priority queue until their route's
+deadline. They are rejected early with a 429 when the queue is full or when the wait
+is expected to last past the deadline.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app import metrics
+from app.config import settings
+
+from . import resilience
+
+logger = logging.getLogger(__name__)
+
+# route being handled, sets the priority and deadline of its upstream calls
+current_route: ContextVar[str] = ContextVar("admission_route", default="default")
+
+
+def route(name: str):
+    """Returns a route dependency tagging the upstream calls of the route with name,
+    e.g. dependencies=[Depends(admission.route("engine"))]
+    """
+
+    async def tag_route():
+        current_route.set(name)
+
+    return tag_route
+
+
+class Waiter:
+    __slots__ = ("priority", "seq", "deadline", "future", "route")
+
+    def __init__(self, priority: int, seq: int, deadline: float, route: str):
+        self.priority = priority
+        self.seq = seq
+        self.deadline = deadline
+        self.route = route
+        self.future: asyncio.Future = asyncio.get_event_loop().create_future()
+
+    def __lt__(self, other: "Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a bounded priority wait queue, for a single
+    event loop
+
+    Args:
+        name (str): brand, used in errors and metrics
+        initial_limit (int): starting concurrency limit
+        min_limit (int): lowest limit
+        max_limit (int): highest limit
+        target_latency (float): seconds, slower calls shrink the limit
+        backoff_ratio (float): limit multiplier on slow or failed calls
+        queue_size (int): waiting calls kept at most
+        clock (optional): time source. Defaults to time.monotonic.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        target_latency: float,
+        backoff_ratio: float,
+        queue_size: int,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff_ratio = backoff_ratio
+        self.queue_size = queue_size
+        self._clock = clock
+        self.in_flight = 0
+        self.avg_latency = target_latency / 2  # moving average of call latency
+        self._queue: List[Waiter] = []
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self._limit_gauge = metrics.child(metrics.ADMISSION_LIMIT, name)
+
+    def _expected_wait(self, ahead: int) -> float:
+        """Seconds a call with ahead calls queued before it is expected to wait"""
+        return (ahead + 1) * self.avg_latency / max(1.0, self.limit)
+
+    def _reject(self, route: str, reason: str, wait: float) -> HTTPException:
+        self.rejected += 1
+        metrics.child(metrics.ADMISSION_REJECTED, self.name, route, reason).inc()
+        logger.warning(
+            "shedding %s call of route %s (%s), limit %.1f, %d queued",
+            self.name,
+            route,
+            reason,
+            self.limit,
+            len(self._queue),
+        )
+        return HTTPException(
+            429,
+            detail=f"too many requests to {self.name} API, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+    async def acquire(self, priority: int, timeout: float, route: str):
+        """Waits for a free slot
+
+        Args:
+            priority (int): lower values are admitted first
+            timeout (float): seconds the call may wait
+            route (str): route of the call, for metrics
+
+        Raises:
+            HTTPException: raises 429 error when the call can't be admitted in time
+        """
+        if self.in_flight < self.limit and not self._queue:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        ahead = sum(1 for waiter in self._queue if waiter.priority <= priority)
+        wait = self._expected_wait(ahead)
+        if wait > timeout:
+            raise self._reject(route, "deadline", wait)
+        if len(self._queue) >= self.queue_size:
+            # a full queue makes room for the call by rejecting a lower priority one
+            lowest = max(self._queue)
+            if lowest.priority <= priority:
+                raise self._reject(route, "queue_full", wait)
+            self._queue.remove(lowest)
+            heapq.heapify(self._queue)
+            lowest.future.set_exception(
+                self._reject(lowest.route, "preempted", self._expected_wait(ahead))
+            )
+
+        waiter = Waiter(priority, next(self._seq), self._clock() + timeout, route)
+        heapq.heappush(self._queue, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+        if waiter.future.done() and not waiter.future.cancelled():
+            waiter.future.result()  # raises if the call was preempted
+            self.admitted += 1
+            return
+        self._abandon(waiter)
+        raise self._reject(route, "timeout", self._expected_wait(len(self._queue)))
+
+    def _abandon(self, waiter: Waiter):
+        """Takes a waiter that gave up out of the queue, or gives back its slot if
+        it was admitted at the same time
+        """
+        future = waiter.future
+        if future.done() and not future.cancelled() and future.exception() is None:
+            self.in_flight -= 1
+            self._wake()
+            return
+        future.cancel()
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+
+    def release(self, latency: Optional[float], overloaded: bool):
+        """Frees a slot and adapts the limit to the call's outcome
+
+        Args:
+            latency (Optional[float]): seconds the call took, None if it never reached
+                the upstream (e.g. its circuit was open), which leaves the limit as is
+            overloaded (bool): the upstream failed or timed out
+        """
+        self.in_flight -= 1
+        if latency is None:
+            self._wake()
+            return
+        self.avg_latency += 0.1 * (latency - self.avg_latency)
+        if overloaded or latency > self.target_latency:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._limit_gauge.set(self.limit)
+        self._wake()
+
+    def _wake(self):
+        now = self._clock()
+        while self._queue and self.in_flight < self.limit:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done() or waiter.deadline <= now:
+                continue  # gave up already
+            self.in_flight += 1
+            waiter.future.set_result(True)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._queue),
+            "avg_latency": self.avg_latency,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(brand: str) -> AdaptiveLimiter:
+    limiter = _limiters.get(brand)
+    if limiter is None:
+        limiter = _limiters[brand] = AdaptiveLimiter(
+            brand,
+            settings.admission_initial_limit,
+            settings.admission_min_limit,
+            settings.admission_max_limit,
+            settings.admission_target_latency,
+            settings.admission_backoff_ratio,
+            settings.admission_queue_size,
+        )
+    return limiter
+
+
+def _overloaded(error: Optional[BaseException]) -> bool:
+    if error is None:
+        return False
+    if isinstance(error, HTTPException):
+        return error.status_code in (502, 503, 504)
+    return not isinstance(error, asyncio.CancelledError)
+
+
+@asynccontextmanager
+async def admit(brand: str) -> AsyncIterator[None]:
+    """Holds a slot of brand's limiter for an upstream call, using the priority and
+    deadline configured for the current route
+
+    Raises:
+        HTTPException: raises 429 error if the call is shed
+    """
+    if not settings.admission_enabled:
+        yield
+        return
+
+    name = current_route.get()
+    limiter = get_limiter(brand)
+    await limiter.acquire(
+        settings.admission_priorities.get(name, settings.admission_default_priority),
+        settings.admission_deadlines.get(name, settings.admission_default_deadline),
+        name,
+    )
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if isinstance(error, resilience.CircuitOpenError):
+            limiter.release(None, False)  # failed fast, says nothing of the upstream
+        else:
+            limiter.release(time.perf_counter() - start, _overloaded(error))
+
+
+def stats() -> Dict[str, dict]:
+    return {brand: limiter.stats() for brand, limiter in _limiters.items()}
+
+
+def reset():
+    _limiters.clear()
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """Bounded LRU cache where every entry expires after its own TTL.
+    Entries can be kept for a grace period after they expire, during which lookup()
+    still returns them as stale. Safe to share between the event loop and threadpool
+    workers.
+    """
+
+    def __init__(self, maxsize: int, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        # key: (expires_at, value, stale_until)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value for key, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value, stale_until = entry
+            now = self._clock()
+            if expires_at <= now:
+                if stale_until <= now:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def lookup(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Returns (value, seconds until it expires) for key, or None if it is
+        missing or past its grace period. Stale values have zero or negative seconds
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value, stale_until = entry
+            now = self._clock()
+            if stale_until <= now and expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if expires_at <= now:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return value, expires_at - now
+
+    def set(self, key: Hashable, value: Any, ttl: float, grace: float = 0.0):
+        """Stores value under key for ttl seconds, plus grace seconds during which
+        lookup() returns it as stale. Evicts the least recently used entry if the
+        cache is full
+        """
+        with self._lock:
+            expires_at = self._clock() + ttl
+            self._entries[key] = (expires_at, value, expires_at + grace)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def items(self) -> List[Tuple[Hashable, Any, float, float]]:
+        """Returns (key, value, seconds until it expires, seconds of grace after) of
+        the entries not past their grace period, least recently used first, so
+        setting them in order rebuilds the cache
+        """
+        with self._lock:
+            now = self._clock()
+            return [
+                (key, value, expires_at - now, stale_until - expires_at)
+                for key, (expires_at, value, stale_until) in self._entries.items()
+                if stale_until > now or expires_at > now
+            ]
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale_hits": self.stale_hits,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
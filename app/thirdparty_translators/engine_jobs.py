@@ -0,0 +1,211 @@
+"""Engine commands run as background jobs
+
+POST /vehicles/{id}/engine with a "Prefer: respond-async" header queues the command
+and answers 202 with a job id at once. A fixed pool of workers sends queued commands
+through start_stop_engine, and GET /vehicles/{id}/engine/jobs/{job_id} returns the
+job's state and translated response. Job states are kept in the worker process for
+engine_job_ttl seconds.
+
+Commands are not cancelled once sent, they are bounded by GM's read timeout. A command
+that timed out may still have reached the vehicle, its job ends as unknown rather than
+failed, so clients check the vehicle before sending it again.
+"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app import tracing
+from app.api.vehicles import models
+from app.config import settings
+
+from . import admission
+from . import translator_selectors as tpt
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+UNKNOWN = "unknown"  # sent, but GM did not answer in time
+
+
+class Job:
+    __slots__ = (
+        "id",
+        "brand",
+        "vehicle_id",
+        "post_data",
+        "status",
+        "result",
+        "error",
+        "request_id",
+    )
+
+    def __init__(self, brand: str, vehicle_id: str, post_data: dict):
+        self.id = uuid.uuid4().hex
+        self.request_id = tracing.get_request_id()  # of the submitting request
+        self.brand = brand
+        self.vehicle_id = vehicle_id
+        self.post_data = post_data
+        self.status = PENDING
+        self.result: Optional[models.StartStopEngineResponse] = None
+        self.error: Optional[models.SectionError] = None
+
+    def model(self) -> models.EngineJob:
+        return models.EngineJob(
+            job_id=self.id,
+            vehicle_id=self.vehicle_id,
+            status=self.status,
+            result=self.result,
+            error=self.error,
+        )
+
+
+class JobQueue:
+    """Bounded queue of engine commands with a fixed pool of workers, for a single
+    event loop. Workers start with the first job
+
+    Args:
+        workers (int): commands sent at once
+        queue_size (int): jobs waiting at most
+        command_timeout (float): seconds a command may take once started (GM's read
+            timeout), rejected commands are told to retry after it
+        ttl (float): seconds finished job states are kept
+        max_jobs (int): finished job states kept at most, oldest are dropped. Queued
+            and running jobs are always kept, there are at most queue_size + workers
+        run (optional): sends a command, (brand, vehicle_id, post_data) -> response.
+            Defaults to select_start_stop_engine_async.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        command_timeout: float,
+        ttl: float,
+        max_jobs: int,
+        run: Optional[
+            Callable[[str, str, dict], Awaitable[models.StartStopEngineResponse]]
+        ] = None,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.command_timeout = command_timeout
+        self.ttl = ttl
+        self.jobs = TTLCache(max_jobs)  # finished jobs
+        self._active: Dict[str, Job] = {}  # queued and running jobs
+        self._run = run
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Future] = []
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.unknown = 0
+
+    def submit(self, brand: str, vehicle_id: str, post_data: dict) -> Job:
+        """Queues an engine command
+
+        Raises:
+            HTTPException: raises 429 error if the queue is full
+
+        Returns:
+            Job: queued job
+        """
+        if self._queue is None:  # created lazily so it binds to the running loop
+            self._queue = asyncio.Queue(self.queue_size)
+            # started in an empty context, not the submitting request's one
+            context = contextvars.Context()
+            self._tasks = [
+                context.run(asyncio.ensure_future, self._work())
+                for _ in range(self.workers)
+            ]
+
+        job = Job(brand, vehicle_id, post_data)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning("engine job queue is full, rejecting %s", vehicle_id)
+            raise HTTPException(
+                429,
+                detail="too many engine commands queued, try again later",
+                headers={"Retry-After": str(max(1, math.ceil(self.command_timeout)))},
+            )
+        self.submitted += 1
+        self._active[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._active.get(job_id)
+        return job if job is not None else self.jobs.get(job_id)
+
+    async def _work(self):
+        # looked up here, the selectors module may still be importing at __init__
+        run = self._run or tpt.select_start_stop_engine_async
+        admission.current_route.set("engine")
+        while True:
+            job = await self._queue.get()
+            tracing.request_id.set(job.request_id)  # logs carry the job's request
+            job.status = RUNNING
+            try:
+                job.result = await run(job.brand, job.vehicle_id, job.post_data)
+                job.status = SUCCEEDED
+            except Exception as e:
+                job.error = tpt.section_error(e)
+                # a timed out command may have been carried out, it is not retried
+                job.status = UNKNOWN if job.error.status == 504 else FAILED
+            if job.status == FAILED:
+                self.failed += 1
+                logger.warning("engine job %s failed: %s", job.id, job.error.detail)
+            elif job.status == UNKNOWN:
+                self.unknown += 1
+                logger.warning("engine job %s outcome is unknown", job.id)
+            self.jobs.set(job.id, job, self.ttl)  # kept for ttl once finished
+            del self._active[job.id]
+
+    def close(self):
+        """Stops the workers, queued jobs are dropped"""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
+        self._active.clear()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "unknown": self.unknown,
+        }
+
+
+def _create_queue() -> JobQueue:
+    return JobQueue(
+        settings.engine_job_workers,
+        settings.engine_job_queue_size,
+        settings.upstream_read_timeouts.get(
+            "actionEngineService", settings.upstream_read_timeout
+        ),
+        settings.engine_job_ttl,
+        settings.engine_job_max_jobs,
+    )
+
+
+engine_jobs = _create_queue()
+
+
+def reset():
+    """Stops the workers and forgets every job"""
+    global engine_jobs
+    engine_jobs.close()
+    engine_jobs = _create_queue()
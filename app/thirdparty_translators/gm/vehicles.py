@@ -1,41 +1,58 @@
+import asyncio
+import functools
 import logging
-from typing import List, Optional
+import time
+from typing import Optional, Tuple
 
+import httpx
+import orjson
 import requests
 from fastapi import HTTPException
 from pydantic.error_wrappers import ValidationError
 
+from app import metrics
 from app.api.vehicles import models
+from app.config import settings
+
+from .. import admission, hedging, http_client, resilience
+from ..mapping import (
+    Field,
+    ListSpec,
+    ModelSpec,
+    bool_from_string,
+    enum_map,
+    first_flag,
+    float_or_null,
+    to_str,
+    value,
+)
+from ..singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
-BASE_URL = "http://gmapid.azurewebsites.net"  # hardcoded for now, but could be pulled from config file in future
+BASE_URL = settings.gm_base_url  # set through the GM_BASE_URL environment variable
 
+# coalesces concurrent identical reads into one upstream request
+request_flights = SingleFlight(metrics.SINGLEFLIGHT_COLLAPSED)
 
-def post_vehicle_request(
-    url: str,
-    vehicle_id: str,
-    raw=False,
-    response_type="JSON",
-    extra_data: Optional[dict] = None,
-) -> dict:
-    f"""Makes a POST request to {BASE_URL} and returns the result as a dict
+
+def _build_post_data(
+    url: str, vehicle_id: str, response_type: str, extra_data: Optional[dict]
+) -> Tuple[str, dict]:
+    """Validates the request arguments and builds the POST route and body
 
     Args:
         url (str): route to service
         vehicle_id (str): vehicle id
-        raw: if True, return the entire response, not just the data dict
-        response_type (str, optional): response type from service. Defaults to "JSON".
-        extra_data(dict, optional): any extra values that need to be passed in POST body
+        response_type (str): response type from service
+        extra_data (dict, optional): any extra values that need to be passed in POST body
 
     Raises:
         ValueError: raises if vehicle_id is empty or None
         ValueError: raises if url is empty or None
-        HTTPException: raises if status code is not 200
-        ValueError: raises if data json is None
 
     Returns:
-        dict: json data from response as dict
+        Tuple[str, dict]: normalized route and POST body
     """
     if not vehicle_id:
         raise ValueError("missing vehicle id")
@@ -48,19 +65,34 @@ def post_vehicle_request(
     post_data = {"id": vehicle_id, "responseType": response_type}
     if extra_data:  # adds extra key/values if provided
         post_data.update(extra_data)
-        logger.debug(f"post_data: {post_data}")
+        logger.debug("post_data: %s", post_data)
 
-    res = requests.post(f"{BASE_URL}{url}", json=post_data)
-    res_json = res.json()
+    return url, post_data
+
+
+def _parse_vehicle_response(status_code: int, res_json: dict, raw: bool) -> dict:
+    """Checks the GM API response body and returns the requested portion of it
+
+    Args:
+        status_code (int): HTTP status code of the response
+        res_json (dict): decoded response body
+        raw (bool): if True, return the entire response, not just the data dict
 
+    Raises:
+        HTTPException: raises if status code is not 200
+        HTTPException: raises if data json is None
+
+    Returns:
+        dict: json data from response as dict
+    """
     if not raw:  # grabs only the data portion if not raw
         data = res_json.get("data")
     else:
         data = res_json
 
-    logger.debug(f"data from POST request: {data}")
+    logger.debug("data from POST request: %s", data)
 
-    status = res_json.get("status", str(res.status_code))
+    status = res_json.get("status", str(status_code))
 
     if status != "200":
         err_message = res_json.get("reason")
@@ -75,151 +107,282 @@ def post_vehicle_request(
     return data
 
 
-def translator(func):
-    """Decorator to wrap validation and keyerrors into one error
+# commands are not idempotent, they are never retried automatically
+NON_RETRYABLE_SERVICES = {"actionEngineService"}
 
-    Raises:
-        ValueError: raises value error when unable to translate data
-
-    Args:
-        func ([type]): translate function
-    """
-
-    def inner(data: dict):
-        try:
-            translated_data = func(data)
-            logger.debug(f"translated data: {translated_data}")
-            return translated_data
-        except (ValidationError, KeyError) as e:
-            logger.error(e)
-            raise HTTPException(
-                status_code=500,
-                detail="translation failed because of incorrectly formed data from external API",
-            )
 
-    return inner
+def _timeouts(service: str) -> Tuple[float, float]:
+    """Returns the (connect, read) timeouts of service in seconds"""
+    return (
+        settings.upstream_connect_timeouts.get(
+            service, settings.upstream_connect_timeout
+        ),
+        settings.upstream_read_timeouts.get(service, settings.upstream_read_timeout),
+    )
 
 
-@translator
-def translate_vehicle_info(data: dict) -> models.VehicleInfo:
-    """Translates vehicle info from GM API format to Smartcar format
+def _max_attempts(service: str, extra_data: Optional[dict]) -> int:
+    if extra_data or service in NON_RETRYABLE_SERVICES:
+        return 1
+    return 1 + settings.upstream_retries
 
-    Args:
-        data (dict): data from GM API response
 
-    Returns:
-        models.VehicleInfo: Smartcar formatted data
+def _decode(status_code: int, content: bytes) -> dict:
+    """Decodes a GM response body, bodies that are not JSON (e.g. a gateway error
+    page) are turned into a GM error with the HTTP status
     """
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError:
+        return {"status": str(status_code), "reason": "invalid response from GM API"}
 
-    new_data: dict = {}
-    if "vin" in data:
-        new_data["vin"] = data["vin"].get("value")
-
-    if "color" in data:
-        new_data["color"] = data["color"].get("value")
 
-    if "driveTrain" in data:
-        new_data["driveTrain"] = data["driveTrain"].get("value")
+def _transport_error(service: str, error: Exception) -> HTTPException:
+    """Turns a connection error or timeout into a 502 or 504 error"""
+    timed_out = isinstance(error, (requests.Timeout, httpx.TimeoutException))
+    err_message = f"GM API {'timed out' if timed_out else 'is unreachable'} ({service})"
+    logger.error("%s: %r", err_message, error)
+    return HTTPException(504 if timed_out else 502, detail=err_message)
 
-    door_count = 0  # gets door count
-    if data.get("twoDoorCoupe") and data["twoDoorCoupe"].get("value") == "True":
-        door_count = 2
-    elif data.get("fourDoorSedan") and data["fourDoorSedan"].get("value") == "True":
-        door_count = 4
 
-    new_data["doorCount"] = door_count
+def _record_attempt(
+    breaker: resilience.CircuitBreaker, status: str, error: Optional[Exception]
+) -> bool:
+    """Reports the outcome of an attempt to the breaker
 
-    return models.VehicleInfo.parse_obj(new_data)
+    Returns:
+        bool: True if the upstream failed and the request may be retried
+    """
+    if error is None and status not in settings.upstream_retry_statuses:
+        breaker.record_success()
+        return False
+    breaker.record_failure()
+    return True
 
 
-@translator
-def translate_security_status(data: dict) -> List[models.Door]:
-    """Translates security status info from GM API format to Smartcar format
+def post_vehicle_request(
+    url: str,
+    vehicle_id: str,
+    raw=False,
+    response_type="JSON",
+    extra_data: Optional[dict] = None,
+) -> dict:
+    f"""Makes a POST request to {BASE_URL} and returns the result as a dict.
+    Reads are retried on connection errors, timeouts and unavailable statuses
 
     Args:
-        data (dict): data from GM API response
+        url (str): route to service
+        vehicle_id (str): vehicle id
+        raw: if True, return the entire response, not just the data dict
+        response_type (str, optional): response type from service. Defaults to "JSON".
+        extra_data(dict, optional): any extra values that need to be passed in POST body
 
     Raises:
-        TypeError: raises type error if door.values is not a list
+        ValueError: raises if vehicle_id is empty or None
+        ValueError: raises if url is empty or None
+        HTTPException: raises if status code is not 200
+        HTTPException: raises 502/504 error on connection errors and timeouts
+        HTTPException: raises 503 error while the GM circuit breaker is open
+        ValueError: raises if data json is None
 
     Returns:
-        List[models.Door]: list of door objects
+        dict: json data from response as dict
     """
-    new_data_list = []
-    if data.get("doors"):
-        door_list = data["doors"].get("values")
-        if not isinstance(door_list, list):  # rare edge case
-            err_message = f"was expecting list of doors, instead got {door_list}"
-            logger.error(err_message)
-            raise TypeError(err_message)
-
-        for door in door_list:
-            new_door = {}
-            new_door["location"] = door["location"].get("value")
-            new_door["locked"] = (
-                True if door["locked"].get("value") == "True" else False
+    url, post_data = _build_post_data(url, vehicle_id, response_type, extra_data)
+
+    service = url[1:]
+    in_flight = metrics.child(metrics.UPSTREAM_IN_FLIGHT, "gm", service)
+    breaker = resilience.get_breaker("gm")
+    timeout = _timeouts(service)
+    attempts = _max_attempts(service, extra_data)
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        in_flight.inc()
+        start = time.perf_counter()
+        status, error = "error", None
+        try:
+            res = http_client.get_session().post(
+                f"{BASE_URL}{url}", json=post_data, timeout=timeout
             )
-            new_data_list.append(models.Door.parse_obj(new_door))
-
-    return new_data_list
-
-
-@translator
-def translate_fuel_level(data: dict) -> models.Fuel:
-    """Translates fuel information from GM API to Smartcar format
+            res_json = _decode(res.status_code, res.content)
+            status = res_json.get("status", str(res.status_code))
+        except requests.RequestException as e:
+            error = _transport_error(service, e)
+        finally:
+            in_flight.dec()
+            elapsed = time.perf_counter() - start
+            metrics.observe_upstream("gm", service, status, elapsed)
+            logger.debug("POST %s status %s took %.1fms", url, status, elapsed * 1000)
+
+        if not _record_attempt(breaker, status, error) or attempt == attempts:
+            break
+        time.sleep(resilience.backoff_delay(attempt))
+
+    if error is not None:
+        raise error
+    return _parse_vehicle_response(res.status_code, res_json, raw)
+
+
+async def post_vehicle_request_async(
+    url: str,
+    vehicle_id: str,
+    raw=False,
+    response_type="JSON",
+    extra_data: Optional[dict] = None,
+) -> dict:
+    """Async version of post_vehicle_request. Makes a non-blocking POST request to
+    the GM API through the worker's shared connection pool. Concurrent identical
+    reads (no extra_data) share a single upstream request, slow reads can be hedged
+    (see settings.hedge_enabled). Requests go through GM's admission control (see
+    admission.admit), once per upstream request
 
     Args:
-        data (dict): energy data retrieved from GM
+        url (str): route to service
+        vehicle_id (str): vehicle id
+        raw: if True, return the entire response, not just the data dict
+        response_type (str, optional): response type from service. Defaults to "JSON".
+        extra_data(dict, optional): any extra values that need to be passed in POST body
 
     Raises:
-        ValueError: raises value error if fuel_value_str cannot be converted to float
+        ValueError: raises if vehicle_id is empty or None
+        ValueError: raises if url is empty or None
+        HTTPException: raises if status code is not 200
+        HTTPException: raises 502/504 error on connection errors and timeouts
+        HTTPException: raises 503 error while the GM circuit breaker is open
+        HTTPException: raises 429 error if the request is shed by admission control
+        HTTPException: raises if data json is None
 
     Returns:
-        models.Fuel: [description]
+        dict: json data from response as dict
     """
-    if "tankLevel" in data:
-        fuel_value_str = data["tankLevel"].get("value")
-    else:
-        fuel_value_str = None
-
-    if fuel_value_str is None or fuel_value_str.lower() == "null":
-        fuel_value = None
-    else:
-        try:
-            fuel_value = float(fuel_value_str)
-        except ValueError as e:
-            raise ValueError(f"{fuel_value_str} is not a correct percentage")
+    url, post_data = _build_post_data(url, vehicle_id, response_type, extra_data)
+
+    service = url[1:]
+    in_flight = metrics.child(metrics.UPSTREAM_IN_FLIGHT, "gm", service)
+    breaker = resilience.get_breaker("gm")
+    connect_timeout, read_timeout = _timeouts(service)
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    attempts = _max_attempts(service, extra_data)
+    hedger = None
+    if not extra_data and service not in NON_RETRYABLE_SERVICES:
+        hedger = hedging.get_hedger("gm", service)
+
+    def post():
+        return http_client.get_client().post(
+            f"{BASE_URL}{url}", json=post_data, timeout=timeout
+        )
+
+    async def send() -> dict:
+        # one admission slot per upstream request, coalesced callers share it
+        async with admission.admit("gm"):
+            for attempt in range(1, attempts + 1):
+                breaker.before_call()
+                in_flight.inc()
+                start = time.perf_counter()
+                status, error = "error", None
+                try:
+                    res = await (post() if hedger is None else hedger.run(post))
+                    res_json = _decode(res.status_code, res.content)
+                    status = res_json.get("status", str(res.status_code))
+                except httpx.TransportError as e:
+                    error = _transport_error(service, e)
+                finally:
+                    in_flight.dec()
+                    elapsed = time.perf_counter() - start
+                    metrics.observe_upstream("gm", service, status, elapsed)
+                    logger.debug(
+                        "POST %s status %s took %.1fms", url, status, elapsed * 1000
+                    )
+
+                if not _record_attempt(breaker, status, error) or attempt == attempts:
+                    break
+                await asyncio.sleep(resilience.backoff_delay(attempt))
+
+            if error is not None:
+                raise error
+            return _parse_vehicle_response(res.status_code, res_json, raw)
+
+    if extra_data:  # commands are never coalesced
+        return await send()
+
+    key = (url, vehicle_id, raw, response_type)
+    return await request_flights.do(key, send, ("gm", service))
 
-    return models.Fuel(percent=fuel_value)
 
-
-@translator
-def translate_battery_level(data: dict) -> models.Battery:
-    """Translates battery information from GM API to Smartcar format
-
-    Args:
-        data (dict): energy data retrieved from GM
+def translator(func):
+    """Decorator to wrap validation, key and type errors (malformed data) into one error
 
     Raises:
-        ValueError: raises value error if battery_value_str cannot be converted to float
+        ValueError: raises value error when unable to translate data
 
-    Returns:
-        models.Battery: [description]
+    Args:
+        func ([type]): translate function
     """
-    if "batteryLevel" in data:
-        battery_value_str = data["batteryLevel"].get("value")
-    else:
-        battery_value_str = None
 
-    if battery_value_str is None or battery_value_str.lower() == "null":
-        battery_value = None
-    else:
+    @functools.wraps(func)
+    def inner(data: dict):
         try:
-            battery_value = float(battery_value_str)  # could possibly throw error?
-        except ValueError as e:
-            raise ValueError(f"{battery_value_str} is not a correct percentage")
+            translated_data = func(data)
+            logger.debug("translated data: %s", translated_data)
+            return translated_data
+        except (ValidationError, KeyError, TypeError, AttributeError) as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=500,
+                detail="translation failed because of incorrectly formed data from external API",
+            )
+
+    return inner
 
-    return models.Battery(percent=battery_value)
+
+# {GM Status: Smartcar Status}
+status_dict = {"EXECUTED": "success", "FAILED": "error"}
+
+# Smartcar model: GM payload mappings, compiled into translators below
+VEHICLE_INFO_SPEC = ModelSpec(
+    models.VehicleInfo,
+    {
+        "vin": value("vin", coerce=to_str),
+        "color": value("color", coerce=to_str),
+        "doorCount": Field(
+            compute=first_flag({"twoDoorCoupe": 2, "fourDoorSedan": 4}, default=0)
+        ),
+        "driveTrain": value("driveTrain", coerce=to_str),
+    },
+)
+SECURITY_STATUS_SPEC = ListSpec(
+    ("doors", "values"),
+    ModelSpec(
+        models.Door,
+        {
+            "location": value("location", coerce=to_str),
+            "locked": value("locked", coerce=bool_from_string),
+        },
+    ),
+)
+FUEL_LEVEL_SPEC = ModelSpec(
+    models.Fuel,
+    {"percent": value("tankLevel", coerce=float_or_null, required=False)},
+)
+BATTERY_LEVEL_SPEC = ModelSpec(
+    models.Battery,
+    {"percent": value("batteryLevel", coerce=float_or_null, required=False)},
+)
+START_STOP_ENGINE_SPEC = ModelSpec(
+    models.StartStopEngineResponse,
+    {
+        "status": Field(
+            path=("status",),
+            coerce=enum_map(status_dict, "status {value} not in status_dict!"),
+        )
+    },
+)
+
+# Translate GM API data (the data dict of a response) to Smartcar models
+translate_vehicle_info = translator(VEHICLE_INFO_SPEC.compile())
+translate_security_status = translator(SECURITY_STATUS_SPEC.compile())
+translate_fuel_level = translator(FUEL_LEVEL_SPEC.compile())
+translate_battery_level = translator(BATTERY_LEVEL_SPEC.compile())
 
 
 def translate_engine_command(command: str) -> str:
@@ -246,30 +409,17 @@ def translate_engine_command(command: str) -> str:
         raise HTTPException(status_code=400, detail=err_message)
 
 
-@translator
-def translate_start_stop_engine(data: dict) -> models.StartStopEngineResponse:
-    """Translates response from GM start/stop engine into Smartcar response
+# Translates the actionResult of a GM start/stop engine response
+translate_start_stop_engine = translator(START_STOP_ENGINE_SPEC.compile())
 
-    Args:
-        data (dict): dict containing status key
 
-    Raises:
-        HTTPException: raises 500 error if status is not in status_dict
-
-    Returns:
-        models.StartStopEngineResponse: Smartcar StartStopEngine response
-    """
-    # {GM Status: Smartcar Status}
-    status_dict = {"EXECUTED": "success", "FAILED": "error"}
-    status = data["status"]
-    if status in status_dict:
-        translated_status = status_dict[status]
-    else:
-        err_message = f"status {status} not in status_dict!"
-        logger.error(err_message)
-        raise HTTPException(status_code=500, detail=err_message)
-
-    return models.StartStopEngineResponse(status=translated_status)
+# {Smartcar resource: (GM service, translator)}
+RESOURCES = {
+    "info": ("getVehicleInfoService", translate_vehicle_info),
+    "doors": ("getSecurityStatusService", translate_security_status),
+    "fuel": ("getEnergyService", translate_fuel_level),
+    "battery": ("getEnergyService", translate_battery_level),
+}
 
 
 def start_stop_engine(
@@ -294,3 +444,26 @@ def start_stop_engine(
         extra_data={"command": translated_command},
     )
     return translate_start_stop_engine(data.get("actionResult", {}))
+
+
+async def start_stop_engine_async(
+    vehicle_id: str, post_data: dict
+) -> models.StartStopEngineResponse:
+    """Async version of start_stop_engine
+
+    Args:
+        vehicle_id (str): vehicle id
+        post_data (dict): dict containing command to send to GM API
+
+    Returns:
+        models.StartStopEngineResponse: Smartcar StartStopEngine response
+    """
+    command = post_data.get("action", "")
+    translated_command = translate_engine_command(command)
+    data = await post_vehicle_request_async(
+        "actionEngineService",
+        vehicle_id,
+        raw=True,
+        extra_data={"command": translated_command},
+    )
+    return translate_start_stop_engine(data.get("actionResult", {}))
@@ -0,0 +1,198 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app import metrics
+from app.config import settings
+
+
+class LatencyTracker:
+    """Latencies of the last window requests, with a percentile that is recomputed
+    every refresh_every samples instead of on every read
+
+    Args:
+        window (int): number of recent latencies kept
+        percentile (float): percentile (0-100) returned by threshold()
+        refresh_every (int, optional): samples between recomputations. Defaults to 16.
+    """
+
+    def __init__(self, window: int, percentile: float, refresh_every: int = 16):
+        self.samples: deque = deque(maxlen=window)
+        self.percentile = percentile
+        self.refresh_every = refresh_every
+        self._threshold: Optional[float] = None
+        self._since_refresh = 0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= self.refresh_every:
+            self._threshold = None
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def threshold(self) -> Optional[float]:
+        """Returns the tracked percentile of recent latencies, None without samples"""
+        if self._threshold is None and self.samples:
+            ordered = sorted(self.samples)
+            index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+            self._threshold = ordered[index]
+            self._since_refresh = 0
+        return self._threshold
+
+
+class HedgeBudget:
+    """Token bucket capping hedges to a share of requests. Every request earns ratio
+    tokens and a hedge spends one, up to burst tokens can be saved
+
+    Args:
+        ratio (float): hedges allowed per request, e.g. 0.05 for 5% extra load
+        burst (float, optional): maximum saved tokens. Defaults to 10.
+    """
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+
+    def earn(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class Hedger:
+    """Sends a second identical request when the first has not answered within a
+    percentile of recent latencies, the first answer wins and the other request is
+    cancelled. Only for idempotent requests.
+
+    Args:
+        brand (str): brand of the upstream, for metrics
+        service (str): upstream service, for metrics
+        tracker (LatencyTracker): recent latencies of service
+        budget (HedgeBudget): hedges allowed
+        min_samples (int): samples needed before hedging starts
+        min_delay (float): seconds waited at least before hedging
+    """
+
+    def __init__(
+        self,
+        brand: str,
+        service: str,
+        tracker: LatencyTracker,
+        budget: HedgeBudget,
+        min_samples: int,
+        min_delay: float,
+    ):
+        self.tracker = tracker
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._hedged_counter = metrics.child(metrics.UPSTREAM_HEDGES, brand, service)
+        self._wins_counter = metrics.child(metrics.UPSTREAM_HEDGE_WINS, brand, service)
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, None while there are too few samples"""
+        if len(self.tracker) < max(1, self.min_samples):
+            return None
+        return max(self.min_delay, self.tracker.threshold())
+
+    async def _timed(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.perf_counter()
+        result = await fn()
+        self.tracker.add(time.perf_counter() - start)
+        return result
+
+    async def run(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Awaits fn(), hedged with a second fn() call if it is slow
+
+        Args:
+            fn (Callable[[], Awaitable[Any]]): makes the request
+
+        Returns:
+            Any: result of the first successful call, or the error of the first call
+                if both failed
+        """
+        self.requests += 1
+        self.budget.earn()
+        delay = self.delay()
+        if delay is None:
+            return await self._timed(fn)
+
+        primary = asyncio.ensure_future(self._timed(fn))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self.budget.try_spend():
+                return await primary
+
+            self.hedged += 1
+            self._hedged_counter.inc()
+            hedge = asyncio.ensure_future(self._timed(fn))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                            self._wins_counter.inc()
+                        return task.result()
+            return primary.result()  # both failed
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+            "win_rate": self.hedge_wins / self.hedged if self.hedged else 0.0,
+            "delay": self.delay(),
+        }
+
+
+_hedgers: Dict[Tuple[str, str], Hedger] = {}
+
+
+def get_hedger(brand: str, service: str) -> Optional[Hedger]:
+    """Returns the hedger of an upstream service, None if hedging is disabled or the
+    service is not listed in settings.hedge_services
+    """
+    if not settings.hedge_enabled or service not in settings.hedge_services:
+        return None
+    key = (brand, service)
+    hedger = _hedgers.get(key)
+    if hedger is None:
+        hedger = _hedgers[key] = Hedger(
+            brand,
+            service,
+            LatencyTracker(settings.hedge_window, settings.hedge_percentile),
+            HedgeBudget(settings.hedge_budget),
+            settings.hedge_min_samples,
+            settings.hedge_min_delay,
+        )
+    return hedger
+
+
+def stats() -> Dict[str, dict]:
+    """Returns hedging counters keyed by brand/service"""
+    return {f"{brand}/{service}": h.stats() for (brand, service), h in _hedgers.items()}
+
+
+def reset():
+    _hedgers.clear()
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from app import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HostStats:
+    """Saturation counters for a single upstream host"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.saturated = 0  # requests that had to wait for a free connection slot
+        self.keepalive = 0  # idle connections kept open, as of the last response
+
+    def dict(self) -> dict:
+        return {
+            "limit": self.limit,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "waiting": self.waiting,
+            "saturated": self.saturated,
+            "keepalive": self.keepalive,
+        }
+
+
+class PooledClient:
+    """Keep-alive connection pool shared by every upstream call made from a worker.
+    Wraps httpx.AsyncClient and adds a per-host connection limit, since httpx only
+    limits the pool as a whole. In-use, waiting and keep-alive counts are exported
+    as the upstream_pool_connections gauge.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        max_connections_per_host: int,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.max_connections_per_host = max_connections_per_host
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            transport=transport,
+        )
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._host_stats: Dict[str, HostStats] = {}
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """Makes a POST request through the pool, waiting for a free slot on the host
+
+        Args:
+            url (str): full url to POST to
+            **kwargs: passed through to httpx.AsyncClient.post
+
+        Returns:
+            httpx.Response: upstream response
+        """
+        host = httpx.URL(url).host
+        # slots are created lazily so they bind to the running loop
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_stats[host] = HostStats(self.max_connections_per_host)
+        slots = self._host_slots[host]
+        stats = self._host_stats[host]
+        waiting = metrics.child(metrics.UPSTREAM_POOL_CONNECTIONS, host, "waiting")
+        in_use = metrics.child(metrics.UPSTREAM_POOL_CONNECTIONS, host, "in_use")
+
+        stats.requests += 1
+        if slots.locked():
+            stats.saturated += 1
+        stats.waiting += 1
+        waiting.inc()
+        try:
+            await slots.acquire()
+        finally:
+            stats.waiting -= 1
+            waiting.dec()
+
+        stats.in_flight += 1
+        in_use.inc()
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        try:
+            return await self._client.post(url, **kwargs)
+        finally:
+            stats.in_flight -= 1
+            in_use.dec()
+            slots.release()
+            stats.keepalive = self._keepalive_connections(host)
+            metrics.child(metrics.UPSTREAM_POOL_CONNECTIONS, host, "keepalive").set(
+                stats.keepalive
+            )
+
+    def _keepalive_connections(self, host: str) -> int:
+        """Counts idle connections to host in httpx's pool. The pool is not public
+        API, transports without one (e.g. mock transports) have none
+        """
+        pool = getattr(self._client._transport, "_pool", None)
+        connections = getattr(pool, "_connections", {})
+        return sum(
+            connection.is_idle()
+            for (_, origin_host, _), origin_connections in connections.items()
+            if origin_host.decode() == host
+            for connection in origin_connections
+        )
+
+    def stats(self) -> Dict[str, dict]:
+        """Returns pool saturation counters keyed by upstream host"""
+        return {host: stats.dict() for host, stats in self._host_stats.items()}
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_client: Optional[PooledClient] = None
+_session: Optional[requests.Session] = None
+
+
+def start_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> PooledClient:
+    """Creates the worker's shared upstream client. Called on app startup
+
+    Args:
+        transport (httpx.AsyncBaseTransport, optional): transport override, used in tests
+
+    Returns:
+        PooledClient: the shared client
+    """
+    global _client
+    _client = PooledClient(
+        max_connections=settings.pool_max_connections,
+        max_keepalive_connections=settings.pool_max_keepalive_connections,
+        keepalive_expiry=settings.pool_keepalive_expiry,
+        max_connections_per_host=settings.pool_max_connections_per_host,
+        transport=transport,
+    )
+    return _client
+
+
+async def close_client():
+    """Closes the shared upstream client and its connections. Called on app shutdown"""
+    global _client, _session
+    if _client is not None:
+        logger.info("closing upstream connection pool, stats: %s", _client.stats())
+        await _client.aclose()
+        _client = None
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+def get_client() -> PooledClient:
+    """Returns the shared upstream client, creating it if the app was not started
+    through its startup event (e.g. when used outside of a server)
+    """
+    if _client is None:
+        logger.info("upstream connection pool not started, creating it now")
+        return start_client()
+    return _client
+
+
+def get_session() -> requests.Session:
+    """Returns a keep-alive requests.Session for the sync upstream path"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.pool_max_keepalive_connections,
+            pool_maxsize=settings.pool_max_connections_per_host,
+        )
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Returns saturation counters of the shared upstream pool keyed by host"""
+    if _client is None:
+        return {}
+    return _client.stats()
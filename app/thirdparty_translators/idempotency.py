@@ -0,0 +1,102 @@
+"""Idempotency-Key support for commands
+
+A command sent with an Idempotency-Key runs once per key: concurrent duplicates share
+the call in flight, and later duplicates get the stored result until it expires.
+Failed calls are not stored, so a client can retry them with the same key. Reusing a
+key for a different request is rejected.
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+from .cache import TTLCache
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+    """Results of commands by idempotency key, bounded and expiring
+
+    Args:
+        maxsize (int): results kept at most, least recently used are dropped
+        ttl (float): seconds a result is kept
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.ttl = ttl
+        self.results = TTLCache(maxsize)  # key: (fingerprint, result)
+        self._flights = SingleFlight()
+        self._in_flight: Dict[Hashable, Hashable] = {}  # key: fingerprint
+        self.replayed = 0
+
+    async def run(
+        self, key: Hashable, fingerprint: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Awaits fn() unless key was already used for the same request
+
+        Args:
+            key (Hashable): idempotency key, scoped by the caller (e.g. per vehicle)
+            fingerprint (Hashable): identifies the request sent with key
+            fn (Callable[[], Awaitable[Any]]): runs the command
+
+        Raises:
+            HTTPException: raises 409 error if key is in use by a different request
+                in flight, 422 error if key was used for a different request
+
+        Returns:
+            Tuple[Any, bool]: result, and whether it was stored or shared
+        """
+        stored = self.results.get(key)
+        if stored is not None:
+            if stored[0] != fingerprint:
+                raise self._conflict(422, key)
+            self.replayed += 1
+            return stored[1], True
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            if in_flight != fingerprint:
+                raise self._conflict(409, key)
+            self.replayed += 1
+            return await self._flights.do(key, fn), True
+
+        async def run_once():
+            try:
+                result = await fn()
+            finally:
+                self._in_flight.pop(key, None)
+            self.results.set(key, (fingerprint, result), self.ttl)
+            return result
+
+        self._in_flight[key] = fingerprint
+        return await self._flights.do(key, run_once), False
+
+    def _conflict(self, status: int, key: Hashable) -> HTTPException:
+        logger.warning("idempotency key %s reused for a different request", key)
+        return HTTPException(
+            status, detail="Idempotency-Key was already used for a different request"
+        )
+
+    def stats(self) -> dict:
+        return {
+            "stored": len(self.results),
+            "in_flight": len(self._in_flight),
+            "replayed": self.replayed,
+        }
+
+
+def _create_store() -> IdempotencyStore:
+    return IdempotencyStore(settings.idempotency_max_keys, settings.idempotency_ttl)
+
+
+engine_commands = _create_store()
+
+
+def reset():
+    global engine_commands
+    engine_commands = _create_store()
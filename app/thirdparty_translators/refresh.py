@@ -0,0 +1,129 @@
+"""Background refreshes of cached upstream data
+
+Serves stale-while-revalidate: a value past its TTL but within its grace period is
+returned at once while one background refresh replaces it. Hot keys (requested at least
+refresh_hot_threshold times within refresh_hot_window seconds) are refreshed ahead,
+when a request finds them within refresh_ahead seconds of expiring.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from app import metrics
+from app.config import settings
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class HotKeys:
+    """Counts requests per key within fixed windows, bounded to maxsize keys
+
+    Args:
+        maxsize (int): keys tracked at most, least recently requested are dropped
+        window (float): seconds a count is kept
+        threshold (int): requests within window that make a key hot
+    """
+
+    def __init__(self, maxsize: int, window: float, threshold: int):
+        self.counts = TTLCache(maxsize)
+        self.window = window
+        self.threshold = threshold
+
+    def touch(self, key: Hashable) -> bool:
+        """Counts a request for key
+
+        Returns:
+            bool: True if key is hot
+        """
+        entry = self.counts.lookup(key)
+        if entry is None:
+            count = 1
+            self.counts.set(key, count, self.window)
+        else:  # keeps the window started by the first request
+            count = entry[0] + 1
+            self.counts.set(key, count, entry[1])
+        return count >= self.threshold
+
+
+class Refresher:
+    """Runs background refreshes, at most one per key and max_concurrency at once.
+    Refreshes beyond max_pending are dropped, so refreshing can't overload upstreams
+
+    Args:
+        max_concurrency (int): refreshes running at once
+        max_pending (int): refreshes running or waiting at most
+    """
+
+    def __init__(self, max_concurrency: int, max_pending: int):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self._pending: Dict[Hashable, asyncio.Future] = {}  # key: refresh task
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.scheduled = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def schedule(
+        self, key: Hashable, refresh: Callable[[], Awaitable[None]], reason: str
+    ) -> bool:
+        """Starts refresh() in the background unless key is already being refreshed
+
+        Args:
+            key (Hashable): cache key being refreshed
+            refresh (Callable[[], Awaitable[None]]): fetches and stores the new value
+            reason (str): stale|ahead, for metrics
+
+        Returns:
+            bool: True if the refresh was started
+        """
+        if key in self._pending:
+            return False
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            metrics.child(metrics.CACHE_REFRESHES, "dropped").inc()
+            return False
+        if self._slots is None:  # created lazily so it binds to the running loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+        self.scheduled += 1
+        metrics.child(metrics.CACHE_REFRESHES, reason).inc()
+        self._pending[key] = asyncio.ensure_future(self._run(key, refresh))
+        return True
+
+    async def _run(self, key: Hashable, refresh: Callable[[], Awaitable[None]]):
+        try:
+            async with self._slots:
+                await refresh()
+        except Exception as e:
+            self.failed += 1
+            logger.warning("background refresh of %s failed: %r", key, e)
+        finally:
+            self._pending.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "scheduled": self.scheduled,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+hot_keys = HotKeys(
+    settings.cache_max_entries,
+    settings.refresh_hot_window,
+    settings.refresh_hot_threshold,
+)
+refresher = Refresher(settings.refresh_max_concurrency, settings.refresh_max_pending)
+
+
+def reset():
+    """Forgets hot keys and pending refreshes"""
+    global refresher
+    hot_keys.counts.clear()
+    refresher = Refresher(
+        settings.refresh_max_concurrency, settings.refresh_max_pending
+    )
@@ -0,0 +1,155 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(HTTPException):
+    """503 error raised instead of calling an upstream whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Stops calls to an unhealthy upstream.
+
+    After failure_threshold consecutive failures the circuit opens and calls fail fast.
+    After reset_timeout seconds a single probe call is let through (half open),
+    its success closes the circuit, its failure opens it again. Safe to share between
+    the event loop and threadpool workers.
+
+    Args:
+        name (str): upstream name, used in errors
+        failure_threshold (int): consecutive failures that open the circuit
+        reset_timeout (float): seconds the circuit stays open before a probe
+        clock (Callable[[], float], optional): time source. Defaults to time.monotonic.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is let through"""
+        return max(0.0, self.opened_at + self.reset_timeout - self._clock())
+
+    def before_call(self):
+        """Checks that a call may be made, call it before every upstream request
+
+        Raises:
+            HTTPException: raises 503 error while the circuit is open
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+
+            now = self._clock()
+            if self.state == OPEN and now >= self.opened_at + self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probe_started = None
+            if self.state == HALF_OPEN:
+                # a probe that never reported back (e.g. cancelled) is replaced
+                probe_stale = (
+                    self.probe_started is not None
+                    and now >= self.probe_started + self.reset_timeout
+                )
+                if self.probe_started is None or probe_stale:
+                    self.probe_started = now
+                    logger.info("probing %s API, circuit is half open", self.name)
+                    return
+
+            self.rejected += 1
+            retry_after = max(1, round(self.retry_after()))
+
+        raise CircuitOpenError(
+            503,
+            detail=f"{self.name} API is unavailable, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("%s API recovered, closing circuit", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self.probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.error(
+                        "%s API failing (%d failures), opening circuit",
+                        self.name,
+                        self.failures,
+                    )
+                self.state = OPEN
+                self.opened_at = self._clock()
+                self.probe_started = None
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(brand: str) -> CircuitBreaker:
+    """Returns the circuit breaker shared by every upstream call of brand"""
+    breaker = _breakers.get(brand)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(
+                brand,
+                CircuitBreaker(
+                    brand,
+                    settings.breaker_failure_threshold,
+                    settings.breaker_reset_timeout,
+                ),
+            )
+    return breaker
+
+
+def reset_breakers():
+    _breakers.clear()
+
+
+def backoff_delay(attempt: int) -> float:
+    """Seconds to wait before retry number attempt (starting at 1), exponential
+    backoff with full jitter so retries of many callers don't line up
+    """
+    cap = min(
+        settings.upstream_retry_backoff_max,
+        settings.upstream_retry_backoff * 2 ** (attempt - 1),
+    )
+    return random.uniform(0, cap)
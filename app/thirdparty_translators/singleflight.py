@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from prometheus_client import Counter
+
+from app import metrics
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into a single call.
+    Every caller gets the same result, or the same exception.
+
+    Args:
+        collapsed_metric (Counter, optional): counter of calls that joined a call in
+            flight, labelled with the labels given to do()
+    """
+
+    def __init__(self, collapsed_metric: Optional[Counter] = None):
+        self.collapsed_metric = collapsed_metric
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        labels: Tuple[str, ...] = (),
+    ) -> Any:
+        """Awaits fn(), unless a call for key is already in flight, in which case its
+        result is awaited instead
+
+        Args:
+            key (Hashable): identifies identical calls
+            fn (Callable[[], Awaitable[Any]]): makes the call
+            labels (Tuple[str, ...], optional): label values of collapsed_metric
+
+        Returns:
+            Any: result of the shared call
+        """
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.collapsed += 1
+            if self.collapsed_metric is not None:
+                metrics.child(self.collapsed_metric, *labels).inc()
+        else:
+            # runs as its own task so a cancelled caller doesn't cancel the others
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # marks the exception as retrieved if every caller left
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._in_flight),
+        }
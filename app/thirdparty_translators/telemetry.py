@@ -0,0 +1,182 @@
+"""Door and energy telemetry pushed to stream subscribers
+
+Every vehicle with subscribers gets a single poller per worker, fetching its doors,
+fuel and battery through the snapshot selector (so the caches still apply) and
+pushing only the sections that changed. The poll interval shrinks as subscribers
+are added, and the poller stops when the last one leaves.
+"""
+
+import asyncio
+import contextvars
+import logging
+from typing import Any, Dict, Hashable, List, Optional, Set
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+from . import admission
+from . import translator_selectors as tpt
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_FIELDS = ["doors", "fuel", "battery"]
+
+
+class Subscriber:
+    """Changes not yet sent to a stream client. Changes pushed while the client is
+    busy are merged, so a slow client gets the latest state without a backlog
+    """
+
+    def __init__(self, key: Hashable, fields: List[str]):
+        self.key = key
+        self.fields = fields
+        self.pending: Dict[str, Any] = {}
+        self.errors: Dict[str, Any] = {}  # errors of fields, as last pushed
+        self.ready = asyncio.Event()
+
+    def push(self, changes: Dict[str, Any]):
+        """Merges changed sections (and section errors) into the pending changes"""
+        for field, value in changes.items():
+            if field == "errors":
+                errors = {f: e for f, e in value.items() if f in self.fields}
+                if errors != self.errors:
+                    self.errors = self.pending["errors"] = errors
+            elif field in self.fields:
+                self.pending[field] = value
+        if self.pending:
+            self.ready.set()
+
+    async def next(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Waits for changes
+
+        Returns:
+            Optional[Dict[str, Any]]: changed sections by field, None after timeout
+                seconds without changes
+        """
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        changes, self.pending = self.pending, {}
+        self.ready.clear()
+        return changes
+
+
+class VehiclePoller:
+    """Polls the telemetry of a vehicle while it has subscribers
+
+    Args:
+        brand (str): brand of vehicle
+        vehicle_id (str): vehicle id
+    """
+
+    def __init__(self, brand: str, vehicle_id: str):
+        self.brand = brand
+        self.vehicle_id = vehicle_id
+        self.subscribers: Set[Subscriber] = set()
+        # last value of each section, and section errors
+        self.state: Dict[str, Any] = {"errors": {}}
+        self.polls = 0
+        self._task: Optional[asyncio.Future] = None
+
+    def interval(self) -> float:
+        """Seconds between polls, shorter with more subscribers"""
+        return max(
+            settings.telemetry_min_interval,
+            settings.telemetry_max_interval / max(1, len(self.subscribers)),
+        )
+
+    def add(self, subscriber: Subscriber):
+        self.subscribers.add(subscriber)
+        subscriber.push(self.state)  # starts from the current state
+        if self._task is None:
+            # started in an empty context, it outlives the first subscriber's request
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._poll())
+
+    def remove(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _poll(self):
+        admission.current_route.set("telemetry")
+        while True:
+            try:
+                snapshot = await tpt.select_snapshot_async(
+                    self.brand, self.vehicle_id, TELEMETRY_FIELDS
+                )
+            except Exception as e:
+                logger.warning("telemetry poll of %s failed: %r", self.vehicle_id, e)
+            else:
+                self.polls += 1
+                self.publish(snapshot)
+            await asyncio.sleep(self.interval())
+
+    def publish(self, snapshot):
+        """Pushes the sections of snapshot that changed since the last poll"""
+        sections = {f: getattr(snapshot, f) for f in snapshot.__fields_set__}
+        sections["errors"] = sections.get("errors", {})
+        changes = {}
+        for field, value in sections.items():
+            if field not in self.state or self.state[field] != value:
+                self.state[field] = value
+                changes[field] = value
+        if changes:
+            for subscriber in self.subscribers:
+                subscriber.push(changes)
+
+
+_pollers: Dict[Hashable, VehiclePoller] = {}
+_subscriber_count = 0
+
+
+def subscribe(brand: str, vehicle_id: str, fields: List[str]) -> Subscriber:
+    """Subscribes to the telemetry of a vehicle, starting its poller if needed
+
+    Raises:
+        HTTPException: raises 429 error if the worker has too many subscribers
+
+    Returns:
+        Subscriber: pending changes of the subscriber
+    """
+    global _subscriber_count
+    if _subscriber_count >= settings.telemetry_max_subscribers:
+        logger.warning("too many telemetry subscribers, rejecting %s", vehicle_id)
+        raise HTTPException(429, detail="too many telemetry streams, try again later")
+
+    key = (brand, vehicle_id)
+    poller = _pollers.get(key)
+    if poller is None:
+        poller = _pollers[key] = VehiclePoller(brand, vehicle_id)
+    subscriber = Subscriber(key, fields)
+    poller.add(subscriber)
+    _subscriber_count += 1
+    return subscriber
+
+
+def unsubscribe(subscriber: Subscriber):
+    """Removes a subscriber, stopping its vehicle's poller if it was the last one"""
+    global _subscriber_count
+    poller = _pollers.get(subscriber.key)
+    if poller is None or subscriber not in poller.subscribers:
+        return
+    poller.remove(subscriber)
+    _subscriber_count -= 1
+    if not poller.subscribers:
+        del _pollers[subscriber.key]
+
+
+def stats() -> dict:
+    return {"pollers": len(_pollers), "subscribers": _subscriber_count}
+
+
+def reset():
+    """Stops every poller"""
+    global _subscriber_count
+    for poller in _pollers.values():
+        for subscriber in list(poller.subscribers):
+            poller.remove(subscriber)
+    _pollers.clear()
+    _subscriber_count = 0
@@ -1,66 +1,482 @@
-from typing import List
+from types import ModuleType
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import importlib
+import itertools
 import logging
+import os
+import time
 
+import orjson
 from fastapi.exceptions import HTTPException
 
+from app import metrics
 from app.api.vehicles import models as vehicle_models
+from app.config import settings
+from app.shared_cache import SharedCache, get_shared_cache
 
-from .gm import vehicles as gm_vehicles
+from . import admission, refresh
+from .cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# {brand: adapter module}, each module is imported the first time its brand is used.
+# Adapters provide RESOURCES ({resource: (service, translator)}),
+# post_vehicle_request(_async) and start_stop_engine(_async)
+BRAND_ADAPTERS = {
+    "gm": "app.thirdparty_translators.gm.vehicles",
+}
+_adapters: Dict[str, ModuleType] = {}
 
-# following functions select which translators to use based on brand
-def select_vehicle_info(brand: str, vehicle_id: str) -> vehicle_models.VehicleInfo:
+# caches upstream data by (brand, service, vehicle_id)
+vehicle_cache = TTLCache(settings.cache_max_entries)
+# caches (upstream data, translated model) by (brand, resource, vehicle_id), a
+# translation is reused while its upstream data is still the cached one
+translation_cache = TTLCache(settings.cache_max_entries)
+# fill lock owners, unique per fetch across the workers of a host
+_fill_ids = itertools.count()
 
-    if brand == "gm":
-        data = gm_vehicles.post_vehicle_request("getVehicleInfoService", vehicle_id)
-        return gm_vehicles.translate_vehicle_info(data)
-    else:
-        err_message = f"brand {brand} not found!"
-        logger.error(err_message)
-        raise HTTPException(status_code=404, detail=err_message)
 
+def cached_vehicle_request(
+    brand: str, service: str, vehicle_id: str, request: Callable[[str, str], dict]
+) -> dict:
+    """Returns upstream data for service from the cache, or fetches it with request
+    and caches it for the service's TTL
 
-def select_security_status(brand: str, vehicle_id: str) -> List[vehicle_models.Door]:
+    Args:
+        brand (str): brand of vehicle
+        service (str): upstream service name
+        vehicle_id (str): vehicle id
+        request (Callable[[str, str], dict]): brand's post_vehicle_request
 
-    if brand == "gm":
-        data = gm_vehicles.post_vehicle_request("getSecurityStatusService", vehicle_id)
-        return gm_vehicles.translate_security_status(data)
-    else:
-        err_message = f"brand {brand} not found!"
-        logger.error(err_message)
-        raise HTTPException(status_code=404, detail=err_message)
+    Returns:
+        dict: upstream data
+    """
+    key = (brand, service, vehicle_id)
+    data = vehicle_cache.get(key)
+    metrics.count_cache_lookup(brand, service, "miss" if data is None else "hit")
+    if data is None:
+        data = request(service, vehicle_id)
+        _store(key, service, data)
+    return data
 
 
-def select_fuel_level(brand: str, vehicle_id: str) -> vehicle_models.Fuel:
+def _store(key: tuple, service: str, data: dict, ttl: Optional[float] = None):
+    if ttl is None:
+        ttl = settings.cache_ttls.get(service, 0)
+    if ttl > 0:
+        grace = settings.cache_stale_grace.get(service, 0.0)
+        vehicle_cache.set(key, data, ttl, grace)
 
-    if brand == "gm":
-        data = gm_vehicles.post_vehicle_request("getEnergyService", vehicle_id)
-        return gm_vehicles.translate_fuel_level(data)
-    else:
-        err_message = f"brand {brand} not found!"
-        logger.error(err_message)
-        raise HTTPException(status_code=404, detail=err_message)
 
+def _shared_data(key: tuple, service: str, entry: Tuple[bytes, float]) -> dict:
+    """Decodes data found in the shared cache, keeping fresh data locally for the
+    rest of its TTL
+    """
+    data = orjson.loads(entry[0])
+    if entry[1] > 0:
+        _store(key, service, data, entry[1])
+    return data
 
-def select_battery_level(brand: str, vehicle_id: str) -> vehicle_models.Battery:
 
-    if brand == "gm":
-        data = gm_vehicles.post_vehicle_request("getEnergyService", vehicle_id)
-        return gm_vehicles.translate_battery_level(data)
+async def _run_blocking(fn: Callable, *args):
+    """Runs a blocking shared cache call in the default executor, off the event loop"""
+    return await asyncio.get_event_loop().run_in_executor(None, fn, *args)
+
+
+async def _refill_shared(
+    shared: SharedCache,
+    key: tuple,
+    service: str,
+    fetch: Callable[[], Awaitable[dict]],
+) -> Optional[dict]:
+    """Fetches data into the shared cache if this worker takes the key's fill lock
+
+    Returns:
+        Optional[dict]: fetched data, None if another worker holds the lock
+    """
+    shared_key = "|".join(key)
+    owner = f"{os.getpid()}-{next(_fill_ids)}"
+    lease = settings.shared_cache_lock_lease
+    if not await _run_blocking(shared.try_lock, shared_key, owner, lease):
+        return None
+    try:
+        data = await fetch()
+        await _run_blocking(
+            shared.set,
+            shared_key,
+            orjson.dumps(data),
+            settings.cache_ttls[service],
+            settings.cache_stale_grace.get(service, 0.0),
+        )
+    finally:
+        await _run_blocking(shared.unlock, shared_key, owner)
+    _store(key, service, data)
+    return data
+
+
+async def _fill_shared(
+    shared: SharedCache,
+    key: tuple,
+    service: str,
+    fetch: Callable[[], Awaitable[dict]],
+) -> dict:
+    """Returns data cached by any worker of the host, or fetches it. Stale data is
+    returned at once and refreshed in the background by the worker taking the key's
+    fill lock. A missing key is fetched by the worker taking the lock, the others
+    wait for the new data until shared_cache_fill_wait, then fetch it themselves.
+    Shared cache calls block, they run in the default executor
+    """
+    shared_key = "|".join(key)
+    entry = await _run_blocking(shared.get, shared_key)
+    if entry is not None and entry[1] > 0:
+        return _shared_data(key, service, entry)
+
+    if entry is not None:  # stale
+
+        async def refill():
+            admission.current_route.set("refresh")  # background refreshes come last
+            await _refill_shared(shared, key, service, fetch)
+
+        refresh.refresher.schedule(shared_key, refill, "stale")
+        return _shared_data(key, service, entry)
+
+    data = await _refill_shared(shared, key, service, fetch)
+    if data is not None:
+        return data
+
+    deadline = time.monotonic() + settings.shared_cache_fill_wait
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.shared_cache_poll_interval)
+        entry = await _run_blocking(shared.get, shared_key)
+        if entry is not None and entry[1] > 0:
+            return _shared_data(key, service, entry)
+
+    logger.warning("shared cache fill of %s timed out, fetching it", shared_key)
+    data = await fetch()
+    _store(key, service, data)
+    return data
+
+
+async def _fetch(
+    brand: str,
+    service: str,
+    vehicle_id: str,
+    request: Callable[[str, str], Awaitable[dict]],
+) -> dict:
+    """Fetches upstream data and caches it, through the shared cache if one is
+    configured (see _fill_shared)
+    """
+
+    async def fetch() -> dict:
+        return await request(service, vehicle_id)
+
+    key = (brand, service, vehicle_id)
+    shared = get_shared_cache()
+    if shared is not None and settings.cache_ttls.get(service, 0) > 0:
+        return await _fill_shared(shared, key, service, fetch)
+
+    data = await fetch()
+    _store(key, service, data)
+    return data
+
+
+async def _refresh(
+    brand: str,
+    service: str,
+    vehicle_id: str,
+    request: Callable[[str, str], Awaitable[dict]],
+):
+    admission.current_route.set("refresh")  # background refreshes come last
+    await _fetch(brand, service, vehicle_id, request)
+
+
+async def cached_vehicle_request_async(
+    brand: str,
+    service: str,
+    vehicle_id: str,
+    request: Callable[[str, str], Awaitable[dict]],
+) -> dict:
+    """Async version of cached_vehicle_request, the adapter puts upstream calls
+    through the brand's admission control (see admission.admit). Stale data (within the service's
+    cache_stale_grace) is returned at once and refreshed in the background, as is
+    data of hot vehicles about to expire (see refresh)
+    """
+    key = (brand, service, vehicle_id)
+    hot = refresh.hot_keys.touch(key)
+    entry = vehicle_cache.lookup(key)
+    if entry is None:
+        metrics.count_cache_lookup(brand, service, "miss")
+        return await _fetch(brand, service, vehicle_id, request)
+
+    data, expires_in = entry
+    if expires_in <= 0:
+        metrics.count_cache_lookup(brand, service, "stale")
+        refresh.refresher.schedule(
+            key, lambda: _refresh(brand, service, vehicle_id, request), "stale"
+        )
     else:
-        err_message = f"brand {brand} not found!"
+        metrics.count_cache_lookup(brand, service, "hit")
+        if hot and expires_in <= settings.refresh_ahead:
+            refresh.refresher.schedule(
+                key, lambda: _refresh(brand, service, vehicle_id, request), "ahead"
+            )
+    return data
+
+
+def is_supported_brand(brand: str) -> bool:
+    return brand in BRAND_ADAPTERS
+
+
+def get_adapter(brand: str) -> ModuleType:
+    """Returns the adapter module of brand, importing it on first use
+
+    Args:
+        brand (str): brand of vehicle
+
+    Raises:
+        HTTPException: raises 404 error if brand has no adapter
+
+    Returns:
+        ModuleType: brand adapter module
+    """
+    adapter = _adapters.get(brand)
+    if adapter is None:
+        if brand not in BRAND_ADAPTERS:
+            err_message = f"brand {brand} not found!"
+            logger.error(err_message)
+            raise HTTPException(status_code=404, detail=err_message)
+        adapter = _adapters[brand] = importlib.import_module(BRAND_ADAPTERS[brand])
+    return adapter
+
+
+def _get_resource(adapter: ModuleType, brand: str, resource: str) -> tuple:
+    """Returns the (service, translator) pair of resource for brand"""
+    if resource not in adapter.RESOURCES:
+        err_message = f"{resource} not available for brand {brand}"
         logger.error(err_message)
         raise HTTPException(status_code=404, detail=err_message)
+    return adapter.RESOURCES[resource]
+
+
+def _delete_shared(shared: SharedCache, brand: str, vehicle_id: str):
+    for service in settings.cache_ttls:
+        shared.delete("|".join((brand, service, vehicle_id)))
+
+
+def invalidate_vehicle(brand: str, vehicle_id: str):
+    """Drops every cached upstream response for the vehicle"""
+    for service in settings.cache_ttls:
+        vehicle_cache.delete((brand, service, vehicle_id))
+    shared = get_shared_cache()
+    if shared is not None:
+        _delete_shared(shared, brand, vehicle_id)
+
+
+async def invalidate_vehicle_async(brand: str, vehicle_id: str):
+    """Same as invalidate_vehicle, deleting from the shared cache in the executor"""
+    for service in settings.cache_ttls:
+        vehicle_cache.delete((brand, service, vehicle_id))
+    shared = get_shared_cache()
+    if shared is not None:
+        await _run_blocking(_delete_shared, shared, brand, vehicle_id)
+
+
+def select_resource(brand: str, resource: str, vehicle_id: str):
+    """Fetches resource (info|doors|fuel|battery) of a vehicle through the brand's
+    adapter and translates it to the Smartcar format
+    """
+    adapter = get_adapter(brand)
+    service, translate = _get_resource(adapter, brand, resource)
+    data = cached_vehicle_request(
+        brand, service, vehicle_id, adapter.post_vehicle_request
+    )
+    return translate(data)
+
+
+async def select_resource_async(brand: str, resource: str, vehicle_id: str):
+    """Async version of select_resource. Translations of cached upstream data are
+    cached too, the same model object is returned while the data is unchanged
+    """
+    adapter = get_adapter(brand)
+    service, translate = _get_resource(adapter, brand, resource)
+    data = await cached_vehicle_request_async(
+        brand, service, vehicle_id, adapter.post_vehicle_request_async
+    )
+    key = (brand, resource, vehicle_id)
+    entry = translation_cache.get(key)
+    if entry is not None and entry[0] is data:
+        return entry[1]
+
+    translated = translate(data)
+    ttl = settings.cache_ttls.get(service, 0)
+    if ttl > 0:
+        grace = settings.cache_stale_grace.get(service, 0.0)
+        translation_cache.set(key, (data, translated), ttl + grace)
+    return translated
+
+
+def select_vehicle_info(brand: str, vehicle_id: str) -> vehicle_models.VehicleInfo:
+    return select_resource(brand, "info", vehicle_id)
+
+
+def select_security_status(brand: str, vehicle_id: str) -> List[vehicle_models.Door]:
+    return select_resource(brand, "doors", vehicle_id)
+
+
+def select_fuel_level(brand: str, vehicle_id: str) -> vehicle_models.Fuel:
+    return select_resource(brand, "fuel", vehicle_id)
+
+
+def select_battery_level(brand: str, vehicle_id: str) -> vehicle_models.Battery:
+    return select_resource(brand, "battery", vehicle_id)
 
 
 def select_start_stop_engine(
     brand: str, vehicle_id: str, post_data: dict
 ) -> vehicle_models.StartStopEngineResponse:
-    if brand == "gm":
-        return gm_vehicles.start_stop_engine(vehicle_id, post_data)
-    else:
-        err_message = f"brand {brand} not found!"
-        logger.error(err_message)
-        raise HTTPException(status_code=404, detail=err_message)
\ No newline at end of file
+    adapter = get_adapter(brand)
+    try:
+        return adapter.start_stop_engine(vehicle_id, post_data)
+    finally:  # vehicle state may have changed, even if the command failed
+        invalidate_vehicle(brand, vehicle_id)
+
+
+# async versions of the selectors above, used by the API routes so upstream calls
+# don't hold a threadpool slot while waiting on the third-party API
+async def select_vehicle_info_async(
+    brand: str, vehicle_id: str
+) -> vehicle_models.VehicleInfo:
+    return await select_resource_async(brand, "info", vehicle_id)
+
+
+async def select_security_status_async(
+    brand: str, vehicle_id: str
+) -> List[vehicle_models.Door]:
+    return await select_resource_async(brand, "doors", vehicle_id)
+
+
+async def select_fuel_level_async(brand: str, vehicle_id: str) -> vehicle_models.Fuel:
+    return await select_resource_async(brand, "fuel", vehicle_id)
+
+
+async def select_battery_level_async(
+    brand: str, vehicle_id: str
+) -> vehicle_models.Battery:
+    return await select_resource_async(brand, "battery", vehicle_id)
+
+
+async def select_start_stop_engine_async(
+    brand: str, vehicle_id: str, post_data: dict
+) -> vehicle_models.StartStopEngineResponse:
+    adapter = get_adapter(brand)
+    try:
+        return await adapter.start_stop_engine_async(vehicle_id, post_data)
+    finally:  # vehicle state may have changed, even if the command failed
+        await invalidate_vehicle_async(brand, vehicle_id)
+
+
+def section_error(e: Exception) -> vehicle_models.SectionError:
+    """Converts an exception raised while fetching part of a response (a snapshot
+    section, a vehicle of a batch or a background engine command) into an error
+    """
+    if isinstance(e, HTTPException):
+        return vehicle_models.SectionError(status=e.status_code, detail=str(e.detail))
+
+    logger.error("snapshot section failed: %r", e)
+    return vehicle_models.SectionError(status=500, detail="internal error")
+
+
+async def select_snapshot_async(
+    brand: str, vehicle_id: str, fields: List[str]
+) -> vehicle_models.VehicleSnapshot:
+    """Builds a snapshot of the requested resources of a vehicle. Every upstream
+    service needed is fetched once, concurrently, and a failed service only fails
+    the sections that depend on it
+
+    Args:
+        brand (str): brand of vehicle
+        vehicle_id (str): vehicle id
+        fields (List[str]): snapshot sections to fill (info|doors|fuel|battery)
+
+    Raises:
+        HTTPException: raises 404 error if brand is not supported
+
+    Returns:
+        vehicle_models.VehicleSnapshot: requested sections and per-section errors
+    """
+    adapter = get_adapter(brand)
+    resources = adapter.RESOURCES
+    request = adapter.post_vehicle_request_async
+
+    services = list(dict.fromkeys(resources[f][0] for f in fields if f in resources))
+    results = await asyncio.gather(
+        *(
+            cached_vehicle_request_async(brand, service, vehicle_id, request)
+            for service in services
+        ),
+        return_exceptions=True,
+    )
+    data_by_service = dict(zip(services, results))
+
+    sections = {}
+    errors = {}
+    for field in fields:
+        if field not in resources:
+            errors[field] = vehicle_models.SectionError(
+                status=404, detail=f"{field} not available for brand {brand}"
+            )
+            continue
+
+        service, translate = resources[field]
+        data = data_by_service[service]
+        if isinstance(data, Exception):
+            errors[field] = section_error(data)
+            continue
+
+        try:
+            sections[field] = translate(data)
+        except Exception as e:
+            errors[field] = section_error(e)
+
+    if errors:  # errors is left unset when empty so it can be left out of responses
+        sections["errors"] = errors
+    # sections are translated models already, validating them again would copy them
+    return vehicle_models.VehicleSnapshot.construct(**sections)
+
+
+async def select_batch_async(
+    vehicle_brands: Dict[str, str], fields: List[str]
+) -> vehicle_models.BatchResponse:
+    """Builds snapshots of many vehicles, fetching at most the brand's configured
+    number of vehicles at once
+
+    Args:
+        vehicle_brands (Dict[str, str]): brand by vehicle id
+        fields (List[str]): snapshot sections to fill (info|doors|fuel|battery)
+
+    Returns:
+        vehicle_models.BatchResponse: snapshots and errors by vehicle id
+    """
+    limits: Dict[str, asyncio.Semaphore] = {}
+    for brand in set(vehicle_brands.values()):
+        limits[brand] = asyncio.Semaphore(
+            settings.batch_concurrency.get(brand, settings.batch_default_concurrency)
+        )
+
+    async def snapshot(vehicle_id: str, brand: str) -> vehicle_models.VehicleSnapshot:
+        async with limits[brand]:
+            return await select_snapshot_async(brand, vehicle_id, fields)
+
+    snapshots = await asyncio.gather(
+        *(snapshot(vid, brand) for vid, brand in vehicle_brands.items()),
+        return_exceptions=True,
+    )
+
+    batch = vehicle_models.BatchResponse(results={})
+    for vehicle_id, result in zip(vehicle_brands, snapshots):
+        if isinstance(result, Exception):
+            batch.errors[vehicle_id] = section_error(result)
+        else:
+            batch.results[vehicle_id] = result
+    return batch
@@ -0,0 +1,91 @@
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from . import metrics
+
+REQUEST_ID_HEADER = b"x-request-id"
+MAX_REQUEST_ID_LENGTH = 128
+
+# id of the request being handled, None outside of requests
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    return request_id.get()
+
+
+def _valid_request_id(value: bytes) -> Optional[str]:
+    """Accepts incoming ids of printable ascii, so they are safe to log and echo back"""
+    if not value or len(value) > MAX_REQUEST_ID_LENGTH:
+        return None
+    try:
+        decoded = value.decode("ascii")
+    except UnicodeDecodeError:
+        return None
+    return decoded if decoded.isprintable() else None
+
+
+class RequestContextMiddleware:
+    """ASGI middleware assigning every request an id (the incoming X-Request-ID
+    header, or a new one), echoed in the X-Request-ID response header and available
+    to logging through get_request_id(). Also records request latency by route.
+
+    Written as a plain ASGI middleware since BaseHTTPMiddleware adds a task and a
+    stream per request.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+        # route path by endpoint, filled on first use so it covers every router
+        self._routes: Dict[Callable, str] = {}
+
+    def _route(self, scope: dict) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"  # route label values are bounded to the app's routes
+        route = self._routes.get(endpoint)
+        if route is None:
+            router = scope.get("router")
+            for candidate in getattr(router, "routes", []):
+                self._routes[getattr(candidate, "endpoint", None)] = candidate.path
+            route = self._routes.setdefault(endpoint, "unmatched")
+        return route
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                rid = _valid_request_id(value)
+                break
+        if rid is None:
+            rid = uuid.uuid4().hex
+        token = request_id.set(rid)
+        header = (REQUEST_ID_HEADER, rid.encode("ascii"))
+        status = 500
+
+        async def send_with_id(message: dict):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), header]
+            await send(message)
+
+        start = time.perf_counter()
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            metrics.child(
+                metrics.REQUEST_LATENCY,
+                scope["method"],
+                self._route(scope),
+                str(status),
+            ).observe(time.perf_counter() - start)
+            request_id.reset(token)
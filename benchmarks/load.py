@@ -0,0 +1,275 @@
+"""End-to-end load benchmark
+
+Drives the FastAPI app in-process at a fixed request rate (open loop, latency is
+measured from each request's scheduled start) against the GM simulator, and
+reports throughput, p50/p95/p99 latency per route and upstream calls per client
+request.
+
+    python -m benchmarks.load run --scenario all --output bench_results.json
+    python -m benchmarks.load compare base.json bench_results.json
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+from app.main import create_app
+from app.registry import get_registry
+from app.thirdparty_translators import (
+    admission,
+    engine_jobs,
+    hedging,
+    http_client,
+    idempotency,
+    refresh,
+    resilience,
+    telemetry,
+)
+from app.thirdparty_translators import translator_selectors as tpt
+from simulator import SimulatorConfig, create_gm_simulator, fleet_ids
+from simulator.__main__ import parse_latency
+
+from .common import percentile, read_results, run_metadata, write_results
+
+
+class BenchRequest(NamedTuple):
+    route: str  # route template used to group results
+    method: str
+    path: str
+    json: Optional[dict] = None
+
+
+class Scenario(NamedTuple):
+    description: str
+    rate: float  # request groups started per second
+    # builds the requests of one group, they are sent concurrently
+    build: Callable[[random.Random, List[str]], List[BenchRequest]]
+
+
+def single_reads(rng: random.Random, fleet: List[str]) -> List[BenchRequest]:
+    vehicle_id = rng.choice(fleet)
+    return [BenchRequest("GET /vehicles/{id}", "GET", f"/vehicles/{vehicle_id}")]
+
+
+def dashboard(rng: random.Random, fleet: List[str]) -> List[BenchRequest]:
+    # dashboards favour a small set of popular vehicles
+    vehicle_id = fleet[min(int(rng.expovariate(1 / 20)), len(fleet) - 1)]
+    return [
+        BenchRequest("GET /vehicles/{id}/fuel", "GET", f"/vehicles/{vehicle_id}/fuel"),
+        BenchRequest(
+            "GET /vehicles/{id}/battery", "GET", f"/vehicles/{vehicle_id}/battery"
+        ),
+    ]
+
+
+def engine_burst(rng: random.Random, fleet: List[str]) -> List[BenchRequest]:
+    return [
+        BenchRequest(
+            "POST /vehicles/{id}/engine",
+            "POST",
+            f"/vehicles/{rng.choice(fleet)}/engine",
+            {"action": rng.choice(["START", "STOP"])},
+        )
+        for _ in range(25)
+    ]
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "reads": Scenario("single vehicle info reads", 200, single_reads),
+    "dashboard": Scenario("concurrent fuel + battery reads", 100, dashboard),
+    "engine": Scenario("bursts of 25 engine commands", 4, engine_burst),
+}
+
+
+def reset_app_state():
+    """Forgets the app's module level state. Each scenario runs under its own event
+    loop, queues, semaphores and workers bound to the previous one can't be reused
+    """
+    resilience.reset_breakers()
+    hedging.reset()
+    admission.reset()
+    refresh.reset()
+    engine_jobs.reset()
+    idempotency.reset()
+    telemetry.reset()
+    tpt.vehicle_cache.clear()
+
+
+async def run_scenario(
+    scenario: Scenario,
+    duration: float,
+    fleet_size: int,
+    simulator_config: SimulatorConfig,
+    rate: Optional[float] = None,
+    seed: int = 0,
+) -> dict:
+    """Runs scenario for duration seconds and returns its results"""
+    rate = rate or scenario.rate
+    rng = random.Random(seed)
+    simulator = create_gm_simulator(simulator_config)
+    fleet = fleet_ids(fleet_size)
+
+    reset_app_state()
+    app = create_app()
+    get_registry().add_many((vehicle_id, "gm") for vehicle_id in fleet)
+    http_client.start_client(transport=httpx.ASGITransport(app=simulator))
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, Counter] = defaultdict(Counter)
+
+    async def send(client: httpx.AsyncClient, request: BenchRequest, scheduled: float):
+        try:
+            response = await client.request(
+                request.method, request.path, json=request.json
+            )
+            if response.status_code >= 400:
+                errors[request.route][str(response.status_code)] += 1
+        except Exception as e:
+            errors[request.route][type(e).__name__] += 1
+        latencies[request.route].append(time.perf_counter() - scheduled)
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        tasks = []
+        start = time.perf_counter()
+        for i in range(int(rate * duration)):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            for request in scenario.build(rng, fleet):
+                tasks.append(asyncio.ensure_future(send(client, request, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    await http_client.close_client()
+    reset_app_state()  # stops workers and pollers while their loop still runs
+
+    client_requests = sum(len(values) for values in latencies.values())
+    upstream_calls = sum(simulator.state.requests.values())
+    routes = {}
+    for route, values in sorted(latencies.items()):
+        values.sort()
+        routes[route] = {
+            "requests": len(values),
+            "errors": dict(errors[route]),
+            "throughput_rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+    return {
+        "description": scenario.description,
+        "rate": rate,
+        "duration_s": elapsed,
+        "client_requests": client_requests,
+        "throughput_rps": client_requests / elapsed,
+        "upstream_calls": dict(simulator.state.requests),
+        "upstream_calls_per_request": upstream_calls / max(client_requests, 1),
+        "routes": routes,
+    }
+
+
+def print_results(results: dict):
+    for name, scenario in results["scenarios"].items():
+        print(
+            f"{name}: {scenario['throughput_rps']:.1f} req/s, "
+            f"{scenario['upstream_calls_per_request']:.2f} upstream calls/request"
+        )
+        for route, stats in scenario["routes"].items():
+            print(
+                f"  {route:<30} n={stats['requests']:<6} "
+                f"p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms "
+                f"p99={stats['p99_ms']:.1f}ms errors={stats['errors']}"
+            )
+
+
+def compare(base: dict, new: dict):
+    """Prints the change of every route metric between two result files"""
+    print(f"base {base['meta']['commit']} -> new {new['meta']['commit']}")
+    for name, scenario in new["scenarios"].items():
+        base_scenario = base["scenarios"].get(name)
+        if base_scenario is None:
+            continue
+        print(
+            f"{name}: upstream calls/request "
+            f"{base_scenario['upstream_calls_per_request']:.2f} -> "
+            f"{scenario['upstream_calls_per_request']:.2f}"
+        )
+        for route, stats in scenario["routes"].items():
+            base_stats = base_scenario["routes"].get(route)
+            if base_stats is None:
+                continue
+            changes = []
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+                before, after = base_stats[metric], stats[metric]
+                change = (after - before) / before * 100 if before else 0.0
+                changes.append(f"{metric} {before:.1f}->{after:.1f} ({change:+.0f}%)")
+            print(f"  {route:<30} " + ", ".join(changes))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run load scenarios")
+    run_parser.add_argument(
+        "--scenario", choices=[*SCENARIOS, "all"], default="all", nargs="?"
+    )
+    run_parser.add_argument("--rate", type=float, help="overrides the scenario rate")
+    run_parser.add_argument("--duration", type=float, default=10.0)
+    run_parser.add_argument("--fleet-size", type=int, default=1000)
+    run_parser.add_argument(
+        "--upstream-latency", type=parse_latency, default=parse_latency("lognormal:50")
+    )
+    run_parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", default="bench_results.json")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        compare(read_results(args.base), read_results(args.new))
+        return 0
+
+    logging.disable(logging.INFO)  # keeps per-request logging out of the results
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    simulator_config = SimulatorConfig(
+        fleet_size=args.fleet_size,
+        seed=args.seed,
+        latency=args.upstream_latency,
+        error_rate=args.upstream_error_rate,
+    )
+    results = {"meta": run_metadata(), "scenarios": {}}
+    for name in names:
+        results["scenarios"][name] = asyncio.run(
+            run_scenario(
+                SCENARIOS[name],
+                args.duration,
+                args.fleet_size,
+                simulator_config,
+                rate=args.rate,
+                seed=args.seed,
+            )
+        )
+    results["meta"]["upstream_latency"] = args.upstream_latency.dict()
+
+    print_results(results)
+    write_results(args.output, results)
+    print(f"results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
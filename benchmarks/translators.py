@@ -0,0 +1,224 @@
+"""Micro-benchmarks of the GM translator functions
+
+Measures ops/sec and peak bytes allocated per call of every translate_* function
+on realistic and oversized GM payloads, and compares them with a stored baseline.
+
+    python -m benchmarks.translators run
+    python -m benchmarks.translators check   # exits 1 on a regression
+    python -m benchmarks.translators update  # stores the current results as baseline
+
+ops/sec and allocations depend on the machine and the Python version, so a check
+is only meaningful against a baseline recorded on the same machine. CI records one
+from the base branch of each pull request on its runner and checks the change
+against it, the stored baseline is for local comparisons.
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from app.thirdparty_translators.gm import vehicles as gm_vehicles
+
+from .common import read_results, run_metadata, write_results
+
+BASELINE_PATH = Path(__file__).with_name("baselines") / "translators.json"
+
+
+def _value(type_: str, value) -> dict:
+    return {"type": type_, "value": value}
+
+
+def _doors(count: int) -> dict:
+    return {
+        "doors": {
+            "type": "Array",
+            "values": [
+                {
+                    "location": _value("String", f"door{i}"),
+                    "locked": _value("Boolean", str(i % 2 == 0)),
+                }
+                for i in range(count)
+            ],
+        }
+    }
+
+
+VEHICLE_INFO = {
+    "vin": _value("String", "123123412412"),
+    "color": _value("String", "Metallic Silver"),
+    "fourDoorSedan": _value("Boolean", "True"),
+    "twoDoorCoupe": _value("Boolean", "False"),
+    "driveTrain": _value("String", "v8"),
+}
+# GM payloads carry many fields the translators don't use
+VEHICLE_INFO_OVERSIZED = {
+    **VEHICLE_INFO,
+    **{f"option{i}": _value("String", "x" * 32) for i in range(200)},
+}
+ENERGY = {
+    "tankLevel": _value("Number", "30.2"),
+    "batteryLevel": _value("Null", "null"),
+}
+
+
+class Case(NamedTuple):
+    translate: Callable
+    payload: dict
+
+
+CASES: Dict[str, Case] = {
+    "vehicle_info": Case(gm_vehicles.translate_vehicle_info, VEHICLE_INFO),
+    "vehicle_info_oversized": Case(
+        gm_vehicles.translate_vehicle_info, VEHICLE_INFO_OVERSIZED
+    ),
+    "security_status_4_doors": Case(gm_vehicles.translate_security_status, _doors(4)),
+    "security_status_200_doors": Case(
+        gm_vehicles.translate_security_status, _doors(200)
+    ),
+    "fuel_level": Case(gm_vehicles.translate_fuel_level, ENERGY),
+    "battery_level": Case(gm_vehicles.translate_battery_level, ENERGY),
+    "start_stop_engine": Case(
+        gm_vehicles.translate_start_stop_engine, {"status": "EXECUTED"}
+    ),
+}
+
+
+def ops_per_sec(case: Case, min_time: float = 0.1, repeats: int = 9) -> float:
+    """Returns the best of repeats measurements of calls per second"""
+    translate, payload = case
+    number = 1
+    while True:  # finds a call count that runs for at least min_time
+        start = time.perf_counter()
+        for _ in range(number):
+            translate(payload)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+
+    best = elapsed
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats - 1):
+            start = time.perf_counter()
+            for _ in range(number):
+                translate(payload)
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return number / best
+
+
+def alloc_bytes_per_call(case: Case) -> int:
+    """Returns the peak bytes allocated during one call"""
+    translate, payload = case
+    translate(payload)  # warm up caches so they aren't counted
+    tracemalloc.start()
+    try:
+        tracemalloc.clear_traces()  # also resets the peak
+        translate(payload)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(names: Optional[List[str]] = None) -> dict:
+    results = {}
+    for name in names or CASES:
+        case = CASES[name]
+        results[name] = {
+            "ops_per_sec": ops_per_sec(case),
+            "alloc_bytes_per_call": alloc_bytes_per_call(case),
+        }
+    return {"meta": run_metadata(), "cases": results}
+
+
+def find_regressions(
+    baseline: dict, results: dict, speed_tolerance: float, alloc_tolerance: float
+) -> List[str]:
+    """Returns a message for every case that is slower or allocates more than the
+    baseline allows
+    """
+    regressions = []
+    for name, stats in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            continue
+        min_ops = base["ops_per_sec"] * (1 - speed_tolerance)
+        if stats["ops_per_sec"] < min_ops:
+            regressions.append(
+                f"{name}: {stats['ops_per_sec']:.0f} ops/sec is below "
+                f"{min_ops:.0f} (baseline {base['ops_per_sec']:.0f})"
+            )
+        max_alloc = base["alloc_bytes_per_call"] * (1 + alloc_tolerance)
+        if stats["alloc_bytes_per_call"] > max_alloc:
+            regressions.append(
+                f"{name}: {stats['alloc_bytes_per_call']} bytes/call is above "
+                f"{max_alloc:.0f} (baseline {base['alloc_bytes_per_call']})"
+            )
+    return regressions
+
+
+def print_results(results: dict, baseline: Optional[dict] = None):
+    for name, stats in results["cases"].items():
+        line = (
+            f"{name:<28} {stats['ops_per_sec']:>12,.0f} ops/sec "
+            f"{stats['alloc_bytes_per_call']:>9,} bytes/call"
+        )
+        base = (baseline or {}).get("cases", {}).get(name)
+        if base:
+            speed = (stats["ops_per_sec"] / base["ops_per_sec"] - 1) * 100
+            line += f"  ({speed:+.0f}% ops/sec vs baseline)"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.translators")
+    parser.add_argument("command", choices=["run", "check", "update"])
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--output", help="also write results to this file")
+    # timings on shared machines vary by about 30%, allocations are deterministic
+    parser.add_argument("--speed-tolerance", type=float, default=0.4)
+    parser.add_argument("--alloc-tolerance", type=float, default=0.10)
+    parser.add_argument("--case", action="append", choices=list(CASES))
+    args = parser.parse_args(argv)
+
+    results = run(args.case)
+    baseline = read_results(args.baseline) if Path(args.baseline).exists() else None
+    print_results(results, baseline)
+    if args.output:
+        write_results(args.output, results)
+
+    if args.command == "update":
+        write_results(args.baseline, results)
+        print(f"baseline written to {args.baseline}")
+    elif args.command == "check":
+        if baseline is None:
+            print(f"no baseline at {args.baseline}, run update first")
+            return 1
+        for key in ("python", "machine"):
+            if baseline["meta"].get(key) != results["meta"].get(key):
+                print(
+                    f"WARNING baseline was recorded with {key} "
+                    f"{baseline['meta'].get(key)}, not {results['meta'].get(key)}, "
+                    "results may not be comparable"
+                )
+        regressions = find_regressions(
+            baseline, results, args.speed_tolerance, args.alloc_tolerance
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
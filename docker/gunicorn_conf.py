@@ -0,0 +1,14 @@
+"""Gunicorn config of the Docker image: the base image's defaults (workers, bind,
+timeouts from its environment variables), plus the metrics hooks
+"""
+
+import runpy
+
+# drops the metrics of exited workers
+from app.metrics import child_exit  # noqa: F401
+
+globals().update(
+    (name, value)
+    for name, value in runpy.run_path("/gunicorn_conf.py").items()
+    if not name.startswith("__")
+)
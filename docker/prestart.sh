@@ -0,0 +1,5 @@
+#! /usr/bin/env sh
+# run by the base image before gunicorn starts: metrics files of the workers of a
+# previous run would otherwise be aggregated into /metrics
+set -e
+rm -rf "${PROMETHEUS_MULTIPROC_DIR:?}"/*
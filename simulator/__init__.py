@@ -0,0 +1,8 @@
+from .gm import (
+    LatencyConfig,
+    SimulatorConfig,
+    create_gm_simulator,
+    fleet_ids,
+)
+
+__all__ = ["LatencyConfig", "SimulatorConfig", "create_gm_simulator", "fleet_ids"]
@@ -0,0 +1,63 @@
+"""Runs the GM API simulator
+
+    python -m simulator --port 8100 --fleet-size 10000 --latency lognormal:50 \
+        --error-rate 0.01
+    GM_BASE_URL=http://localhost:8100 uvicorn app.main:app
+
+Synthetic vehicle ids can be written as vehicle_id,brand rows for
+python -m app.registry import with --write-fleet fleet.csv
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+from .gm import LatencyConfig, SimulatorConfig, create_gm_simulator, fleet_ids
+
+
+def parse_latency(value: str) -> LatencyConfig:
+    """Parses distribution:median_ms[:slow_rate:slow_ms], e.g. lognormal:50:0.01:2000"""
+    parts = value.split(":")
+    latency = LatencyConfig(distribution=parts[0], median_ms=float(parts[1]))
+    if len(parts) == 4:
+        latency.slow_rate, latency.slow_ms = float(parts[2]), float(parts[3])
+    return latency
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--fleet-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=parse_latency, default=LatencyConfig())
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--engine-failure-rate", type=float, default=0.0)
+    parser.add_argument("--write-fleet", metavar="CSV_PATH")
+    args = parser.parse_args(argv)
+
+    if args.write_fleet:
+        with open(args.write_fleet, "w") as csv_file:
+            csv_file.write("vehicle_id,brand\n")
+            for vehicle_id in fleet_ids(args.fleet_size):
+                csv_file.write(f"{vehicle_id},gm\n")
+        print(f"wrote {args.fleet_size} vehicle ids to {args.write_fleet}")
+        return 0
+
+    import uvicorn
+
+    config = SimulatorConfig(
+        fleet_size=args.fleet_size,
+        seed=args.seed,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        engine_failure_rate=args.engine_failure_rate,
+    )
+    uvicorn.run(create_gm_simulator(config), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import asyncio
+import math
+import random
+from collections import Counter
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+# vehicles with the data served by the real GM API, other ids come from the
+# synthetic fleet
+KNOWN_VEHICLES = {
+    "1234": {
+        "vin": "123123412412",
+        "color": "Metallic Silver",
+        "doors": 4,
+        "driveTrain": "v8",
+    },
+    "1235": {
+        "vin": "1235AZ91XP",
+        "color": "Forest Green",
+        "doors": 2,
+        "driveTrain": "electric",
+    },
+}
+COLORS = ["Metallic Silver", "Forest Green", "Midnight Blue", "Summit White", "Red Hot"]
+DOOR_LOCATIONS = ["frontLeft", "frontRight", "backLeft", "backRight"]
+SERVICES = [
+    "getVehicleInfoService",
+    "getSecurityStatusService",
+    "getEnergyService",
+    "actionEngineService",
+]
+FLEET_ID_PREFIX = "SIM"
+
+
+class LatencyConfig(BaseModel):
+    """Response delay. distribution is constant|uniform|exponential|lognormal,
+    all centered on median_ms. slow_rate of responses get slow_ms added on top
+    to reproduce tail latency.
+    """
+
+    distribution: str = "constant"
+    median_ms: float = 0.0
+    sigma: float = 0.5  # shape of the lognormal distribution
+    slow_rate: float = 0.0
+    slow_ms: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        """Returns a delay in seconds"""
+        if not self.median_ms:
+            delay = 0.0
+        elif self.distribution == "uniform":
+            delay = rng.uniform(0, 2 * self.median_ms)
+        elif self.distribution == "exponential":
+            delay = rng.expovariate(math.log(2) / self.median_ms)
+        elif self.distribution == "lognormal":
+            delay = rng.lognormvariate(math.log(self.median_ms), self.sigma)
+        else:
+            delay = self.median_ms
+
+        if self.slow_rate and rng.random() < self.slow_rate:
+            delay += self.slow_ms
+        return delay / 1000
+
+
+class SimulatorConfig(BaseModel):
+    fleet_size: int = 1000
+    seed: int = 0
+    latency: LatencyConfig = LatencyConfig()
+    service_latency: Dict[str, LatencyConfig] = {}  # overrides latency per service
+    error_rate: float = 0.0  # responses that are a GM 500 error
+    malformed_rate: float = 0.0  # responses with a broken body
+    engine_failure_rate: float = 0.0  # engine commands answered with FAILED
+
+
+def fleet_ids(fleet_size: int) -> List[str]:
+    """Returns the ids of the synthetic fleet"""
+    return [f"{FLEET_ID_PREFIX}{i:08d}" for i in range(fleet_size)]
+
+
+def _vehicle(config: SimulatorConfig, vehicle_id: str) -> Optional[dict]:
+    """Returns the fixed attributes of a vehicle, or None if it is not in the fleet"""
+    if vehicle_id in KNOWN_VEHICLES:
+        return KNOWN_VEHICLES[vehicle_id]
+    if not vehicle_id.startswith(FLEET_ID_PREFIX):
+        return None
+    _, _, number = vehicle_id.partition(FLEET_ID_PREFIX)
+    if not number.isdigit() or int(number) >= config.fleet_size:
+        return None
+
+    rng = random.Random(f"{config.seed}:{vehicle_id}")  # same vehicle on every call
+    return {
+        "vin": f"{rng.getrandbits(40):010X}",
+        "color": rng.choice(COLORS),
+        "doors": rng.choice([2, 4]),
+        "driveTrain": rng.choice(["v6", "v8", "electric"]),
+    }
+
+
+def _value(type_: str, value) -> dict:
+    return {"type": type_, "value": value}
+
+
+def _vehicle_info(vehicle: dict, rng: random.Random) -> dict:
+    return {
+        "vin": _value("String", vehicle["vin"]),
+        "color": _value("String", vehicle["color"]),
+        "fourDoorSedan": _value("Boolean", str(vehicle["doors"] == 4)),
+        "twoDoorCoupe": _value("Boolean", str(vehicle["doors"] == 2)),
+        "driveTrain": _value("String", vehicle["driveTrain"]),
+    }
+
+
+def _security_status(vehicle: dict, rng: random.Random) -> dict:
+    doors = [
+        {
+            "location": _value("String", location),
+            "locked": _value("Boolean", str(rng.random() < 0.5)),
+        }
+        for location in DOOR_LOCATIONS[: vehicle["doors"]]
+    ]
+    return {"doors": {"type": "Array", "values": doors}}
+
+
+def _energy(vehicle: dict, rng: random.Random) -> dict:
+    level = _value("Number", f"{rng.uniform(0, 100):.2f}")
+    null = _value("Null", "null")
+    if vehicle["driveTrain"] == "electric":
+        return {"tankLevel": null, "batteryLevel": level}
+    return {"tankLevel": level, "batteryLevel": null}
+
+
+DATA_SERVICES = {
+    "getVehicleInfoService": ("getVehicleInfo", _vehicle_info),
+    "getSecurityStatusService": ("getSecurityStatus", _security_status),
+    "getEnergyService": ("getEnergy", _energy),
+}
+
+
+def _malformed(rng: random.Random, service: str) -> Response:
+    kind = rng.choice(["no_data", "wrong_shape", "not_json"])
+    if kind == "no_data":
+        return JSONResponse({"service": service, "status": "200"})
+    if kind == "wrong_shape":
+        return JSONResponse(
+            {"service": service, "status": "200", "data": {"doors": "locked", "vin": 1}}
+        )
+    return Response("<html>Service Unavailable</html>", media_type="text/html")
+
+
+def _fault(
+    config: SimulatorConfig, rng: random.Random, service: str
+) -> Optional[Response]:
+    """Returns a GM error or a malformed response for their share of requests"""
+    if config.error_rate and rng.random() < config.error_rate:
+        return JSONResponse(
+            {"status": "500", "reason": "Internal Server Error"}, status_code=500
+        )
+    if config.malformed_rate and rng.random() < config.malformed_rate:
+        return _malformed(rng, service)
+    return None
+
+
+def _engine_action(config: SimulatorConfig, rng: random.Random, body: dict) -> Response:
+    if body.get("command") not in ("START_VEHICLE", "STOP_VEHICLE"):
+        return JSONResponse(
+            {"status": "400", "reason": "Invalid command"}, status_code=400
+        )
+    failed = rng.random() < config.engine_failure_rate
+    return JSONResponse(
+        {
+            "service": "actionEngine",
+            "status": "200",
+            "actionResult": {"status": "FAILED" if failed else "EXECUTED"},
+        }
+    )
+
+
+async def _respond(
+    app: FastAPI, rng: random.Random, service: str, body: dict
+) -> Response:
+    """Answers a request to service after its simulated latency"""
+    config: SimulatorConfig = app.state.config
+    app.state.requests[service] += 1
+    latency = config.service_latency.get(service, config.latency)
+    delay = latency.sample(rng)
+    if delay:
+        await asyncio.sleep(delay)
+
+    fault = _fault(config, rng, service)
+    if fault is not None:
+        return fault
+
+    vehicle_id = str(body.get("id", ""))
+    vehicle = _vehicle(config, vehicle_id)
+    if vehicle is None:
+        return JSONResponse(
+            {"status": "404", "reason": f"Vehicle id: {vehicle_id} not found."},
+            status_code=404,
+        )
+
+    if service == "actionEngineService":
+        return _engine_action(config, rng, body)
+
+    name, build = DATA_SERVICES[service]
+    return JSONResponse({"service": name, "status": "200", "data": build(vehicle, rng)})
+
+
+def _add_route(app: FastAPI, rng: random.Random, service: str):
+    @app.post(f"/{service}", name=service)
+    async def handle(request: Request):
+        return await _respond(app, rng, service, await request.json())
+
+
+def create_gm_simulator(config: SimulatorConfig = None) -> FastAPI:
+    """Creates an ASGI stand-in for the GM API with the given latency and faults.
+    Request counts by service are kept in app.state.requests
+
+    Args:
+        config (SimulatorConfig, optional): simulator settings. Defaults to SimulatorConfig().
+
+    Returns:
+        FastAPI: simulator app
+    """
+    config = config or SimulatorConfig()
+    rng = random.Random(config.seed)
+    app = FastAPI(title="GM API simulator")
+    app.state.config = config
+    app.state.requests = Counter()
+
+    for service in SERVICES:
+        _add_route(app, rng, service)
+
+    return app
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+
+import httpx
+import pytest
+
+from app.thirdparty_translators import (
+    admission,
+    engine_jobs,
+    hedging,
+    http_client,
+    idempotency,
+    refresh,
+    resilience,
+    telemetry,
+)
+from app.thirdparty_translators import translator_selectors as tpt
+from simulator import SimulatorConfig, create_gm_simulator
+
+# apps created by the tests log to a temporary file, not to logs/ in the tree. Set
+# before app.main is imported, it creates its app at import
+os.environ.setdefault(
+    "LOG_PATH", os.path.join(tempfile.mkdtemp(prefix="app-logs-"), "access.log")
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_vehicle_cache():
+    tpt.vehicle_cache.clear()
+    tpt.translation_cache.clear()
+    yield
+    tpt.vehicle_cache.clear()
+    tpt.translation_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_upstream_state():
+    resilience.reset_breakers()
+    hedging.reset()
+    admission.reset()
+    refresh.reset()
+    engine_jobs.reset()
+    idempotency.reset()
+    telemetry.reset()
+    yield
+    resilience.reset_breakers()
+    hedging.reset()
+    admission.reset()
+    refresh.reset()
+    engine_jobs.reset()
+    idempotency.reset()
+    telemetry.reset()
+
+
+@pytest.fixture
+def run_with_upstream():
+    """Returns a runner that awaits coro_fn() with the shared upstream client routed
+    through handler instead of the network
+    """
+
+    def run(handler, coro_fn):
+        async def main():
+            http_client.start_client(transport=httpx.MockTransport(handler))
+            try:
+                return await coro_fn()
+            finally:
+                await http_client.close_client()
+
+        return asyncio.run(main())
+
+    return run
+
+
+@pytest.fixture
+def mock_upstream():
+    """Returns a function that routes the shared upstream client used by the app
+    through handler instead of the network
+    """
+
+    def install(handler):
+        http_client.start_client(transport=httpx.MockTransport(handler))
+
+    yield install
+    asyncio.run(http_client.close_client())
+
+
+@pytest.fixture
+def use_gm_simulator():
+    """Returns a function that points the shared upstream client used by the app at
+    an in-process GM simulator created from config
+    """
+
+    def install(config: SimulatorConfig = None):
+        asyncio.run(http_client.close_client())
+        simulator = create_gm_simulator(config)
+        http_client.start_client(transport=httpx.ASGITransport(app=simulator))
+        return simulator
+
+    yield install
+    asyncio.run(http_client.close_client())
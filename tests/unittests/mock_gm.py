@@ -0,0 +1,49 @@
+import httpx
+
+GM_DATA = {
+    "/getVehicleInfoService": {
+        "vin": {"type": "String", "value": "123123412412"},
+        "color": {"type": "String", "value": "Metallic Silver"},
+        "fourDoorSedan": {"type": "Boolean", "value": "True"},
+        "twoDoorCoupe": {"type": "Boolean", "value": "False"},
+        "driveTrain": {"type": "String", "value": "v8"},
+    },
+    "/getSecurityStatusService": {
+        "doors": {
+            "type": "Array",
+            "values": [
+                {
+                    "location": {"type": "String", "value": "frontLeft"},
+                    "locked": {"type": "Boolean", "value": "True"},
+                },
+                {
+                    "location": {"type": "String", "value": "frontRight"},
+                    "locked": {"type": "Boolean", "value": "False"},
+                },
+            ],
+        }
+    },
+    "/getEnergyService": {
+        "tankLevel": {"type": "Number", "value": "30.2"},
+        "batteryLevel": {"type": "Null", "value": "null"},
+    },
+}
+
+
+def gm_handler(calls: list, failing: tuple = ()):
+    """Returns a mock GM API handler that records requested paths in calls and
+    answers with a 500 for the services in failing
+    """
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        calls.append(path)
+        if path in failing:
+            return httpx.Response(500, json={"status": "500", "reason": "GM is down"})
+        if path == "/actionEngineService":
+            return httpx.Response(
+                200, json={"status": "200", "actionResult": {"status": "EXECUTED"}}
+            )
+        return httpx.Response(200, json={"status": "200", "data": GM_DATA[path]})
+
+    return handler
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from app.api import responses
+from app.api.responses import ModelResponse, dumps, etag_matches, render
+from app.api.vehicles import models
+
+
+def test_dumps_matches_pydantic():
+    snapshot = models.VehicleSnapshot(
+        info=models.VehicleInfo(vin="123", color="Blue", doorCount=4, driveTrain="v8"),
+        doors=[models.Door(location="frontLeft", locked=True)],
+    )
+    assert json.loads(dumps(snapshot)) == json.loads(snapshot.json())
+    assert json.loads(dumps(snapshot, exclude_unset=True)) == json.loads(
+        snapshot.json(exclude_unset=True)
+    )
+
+
+def test_dumps_lists_of_models():
+    doors = [models.Door(location="frontLeft", locked=False)]
+    assert dumps(doors) == b'[{"location":"frontLeft","locked":false}]'
+
+
+def test_dumps_unknown_type():
+    with pytest.raises(TypeError):
+        dumps(object())
+
+
+def test_model_response():
+    response = ModelResponse(models.Fuel(percent=None), status_code=201)
+    assert response.status_code == 201
+    assert response.body == b'{"percent":null}'
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_etag_matches():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('"x", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"abcd"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_render_memo(monkeypatch):
+    fuel = models.Fuel(percent=1.0)
+    body, etag = render(fuel, key=("fuel", "test"))
+    assert body == b'{"percent":1.0}'
+    assert etag.startswith('"') and etag.endswith('"')
+
+    monkeypatch.setattr(responses, "dumps", None)  # the memo skips serialization
+    assert render(fuel, key=("fuel", "test")) == (body, etag)
+    monkeypatch.undo()
+
+    # a different object with the same content is rendered again, same etag
+    assert render(models.Fuel(percent=1.0), key=("fuel", "test")) == (body, etag)
+    assert render(models.Fuel(percent=2.0), key=("fuel", "test"))[1] != etag
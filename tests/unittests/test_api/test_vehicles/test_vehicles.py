@@ -1,9 +1,196 @@
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
 from app.api.vehicles import vehicles
+from app.main import app
 import pytest
 
+from ...mock_gm import gm_handler
+
+client = TestClient(app)
+
 
 def test_lookup_vehicle_id():
     assert vehicles.lookup_vehicle_id("1234") == "gm"
 
     with pytest.raises(KeyError):  # attempts to lookup unknown id
-        vehicles.lookup_vehicle_id("INVALID_ID")
\ No newline at end of file
+        vehicles.lookup_vehicle_id("INVALID_ID")
+
+    with pytest.raises(KeyError):  # brand is registered but has no adapter
+        vehicles.lookup_vehicle_id("FORD")
+
+
+def test_get_snapshot(mock_upstream):
+    mock_upstream(gm_handler([], failing=("/getSecurityStatusService",)))
+
+    response = client.get("/vehicles/1234/snapshot")
+    assert response.status_code == 200
+    snapshot = response.json()
+    assert snapshot["info"]["doorCount"] == 4
+    assert snapshot["fuel"] == {"percent": 30.2}
+    assert snapshot["battery"] == {"percent": None}
+    assert "doors" not in snapshot
+    assert snapshot["errors"]["doors"]["status"] == 500
+
+
+def test_get_snapshot_fields(mock_upstream):
+    calls = []
+    mock_upstream(gm_handler(calls))
+
+    response = client.get("/vehicles/1234/snapshot?fields=fuel,battery")
+    assert response.status_code == 200
+    assert response.json() == {"fuel": {"percent": 30.2}, "battery": {"percent": None}}
+    assert calls == ["/getEnergyService"]
+
+    assert client.get("/vehicles/1234/snapshot?fields=tires").status_code == 400
+    assert client.get("/vehicles/INVALID/snapshot").status_code == 404
+
+
+def test_get_snapshot_total_failure(mock_upstream):
+    mock_upstream(gm_handler([], failing=("/getEnergyService",)))
+
+    response = client.get("/vehicles/1234/snapshot?fields=fuel")
+    assert response.status_code == 500
+
+
+def test_lookup_vehicle_ids():
+    assert vehicles.lookup_vehicle_ids(["1234", "INVALID_ID", "FORD", "1235"]) == {
+        "1234": "gm",
+        "1235": "gm",
+    }
+
+
+def test_post_batch(mock_upstream):
+    calls = []
+    mock_upstream(gm_handler(calls))
+
+    response = client.post(
+        "/vehicles/batch",
+        json={
+            "vehicle_ids": ["1234", "1235", "1234", "INVALID"],
+            "resources": ["fuel"],
+        },
+    )
+    assert response.status_code == 200
+    batch = response.json()
+    assert batch["results"] == {
+        "1234": {"fuel": {"percent": 30.2}},
+        "1235": {"fuel": {"percent": 30.2}},
+    }
+    assert batch["errors"]["INVALID"]["status"] == 404
+    assert calls == ["/getEnergyService", "/getEnergyService"]
+
+    response = client.post(
+        "/vehicles/batch", json={"vehicle_ids": ["1234"], "resources": ["tires"]}
+    )
+    assert response.status_code == 400
+
+
+def test_post_batch_size_limit(monkeypatch):
+    monkeypatch.setattr(vehicles.settings, "batch_max_vehicles", 2)
+
+    response = client.post("/vehicles/batch", json={"vehicle_ids": ["1", "2", "3"]})
+    assert response.status_code == 400
+
+
+def test_conditional_get(mock_upstream):
+    calls = []
+    mock_upstream(gm_handler(calls))
+
+    response = client.get("/vehicles/1234/doors")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = client.get("/vehicles/1234/doors", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    assert calls == ["/getSecurityStatusService"]  # served from the cache
+
+    response = client.get("/vehicles/1234/doors", headers={"If-None-Match": '"old"'})
+    assert response.status_code == 200
+    assert response.headers["etag"] == etag
+
+
+def test_async_engine_command(mock_upstream):
+    calls = []
+    mock_upstream(gm_handler(calls))
+
+    response = client.post(
+        "/vehicles/1234/engine",
+        json={"action": "START"},
+        headers={"Prefer": "respond-async"},
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "pending"
+    assert response.headers["location"].endswith(
+        f"/vehicles/1234/engine/jobs/{job['job_id']}"
+    )
+
+    for _ in range(10):  # the job runs while the client's event loop runs
+        job = client.get(f"/vehicles/1234/engine/jobs/{job['job_id']}").json()
+        if job["status"] == "succeeded":
+            break
+    assert job["result"] == {"status": "success"}
+    assert calls == ["/actionEngineService"]
+
+    assert client.get(f"/vehicles/1235/engine/jobs/{job['job_id']}").status_code == 404
+
+
+def test_engine_command_idempotency_key(mock_upstream):
+    calls = []
+    mock_upstream(gm_handler(calls))
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post(
+        "/vehicles/1234/engine", json={"action": "START"}, headers=headers
+    )
+    replay = client.post(
+        "/vehicles/1234/engine", json={"action": "START"}, headers=headers
+    )
+    assert first.status_code == replay.status_code == 200
+    assert replay.json() == first.json() == {"status": "success"}
+    assert "idempotent-replayed" not in first.headers
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert calls == ["/actionEngineService"]
+
+    response = client.post(
+        "/vehicles/1234/engine", json={"action": "STOP"}, headers=headers
+    )
+    assert response.status_code == 422
+    response = client.post(
+        "/vehicles/1234/engine",
+        json={"action": "START"},
+        headers={"Idempotency-Key": "k" * 256},
+    )
+    assert response.status_code == 400
+
+
+def test_stream_telemetry(run_with_upstream, monkeypatch):
+    monkeypatch.setattr(vehicles.settings, "telemetry_max_subscribers", 1)
+
+    class Request:  # disconnects after the first event
+        def __init__(self):
+            self.checks = 0
+
+        async def is_disconnected(self):
+            self.checks += 1
+            return self.checks > 1
+
+    async def read_stream():
+        response = await vehicles.stream_telemetry("1234", Request(), "fuel")
+        with pytest.raises(HTTPException) as e:  # refused before any response starts
+            await vehicles.stream_telemetry("1235", Request(), "fuel")
+        assert e.value.status_code == 429
+
+        events = [chunk async for chunk in response.body_iterator]
+        return response, events
+
+    response, events = run_with_upstream(gm_handler([]), read_stream)
+    assert response.media_type == "text/event-stream"
+    assert events == [b'event: telemetry\ndata: {"fuel":{"percent":30.2}}\n\n']
+    assert vehicles.telemetry.stats()["subscribers"] == 0
+
+    assert client.get("/vehicles/1234/stream?fields=info").status_code == 400
+    assert client.get("/vehicles/INVALID/stream").status_code == 404
@@ -0,0 +1,55 @@
+import asyncio
+
+from app.thirdparty_translators import admission, engine_jobs, refresh
+from benchmarks.common import percentile
+from benchmarks.load import SCENARIOS, run_scenario
+from simulator import SimulatorConfig
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 99) == 0.0
+
+
+def test_run_scenario_smoke():
+    results = asyncio.run(
+        run_scenario(
+            SCENARIOS["dashboard"],
+            duration=0.2,
+            fleet_size=10,
+            simulator_config=SimulatorConfig(fleet_size=10),
+            rate=50,
+        )
+    )
+
+    assert results["client_requests"] == 20
+    assert set(results["routes"]) == {
+        "GET /vehicles/{id}/fuel",
+        "GET /vehicles/{id}/battery",
+    }
+    assert results["routes"]["GET /vehicles/{id}/fuel"]["errors"] == {}
+    assert 0 < results["upstream_calls_per_request"] <= 0.5  # energy is shared
+
+
+def test_run_scenario_resets_loop_bound_state():
+    def run():
+        return asyncio.run(
+            run_scenario(
+                SCENARIOS["reads"],
+                duration=0.1,
+                fleet_size=5,
+                simulator_config=SimulatorConfig(fleet_size=5),
+                rate=50,
+            )
+        )
+
+    refresher, jobs = refresh.refresher, engine_jobs.engine_jobs
+    admission._limiters["stale"] = None
+    run()
+
+    assert refresh.refresher is not refresher
+    assert engine_jobs.engine_jobs is not jobs
+    assert "stale" not in admission._limiters
+    assert run()["routes"]["GET /vehicles/{id}"]["errors"] == {}
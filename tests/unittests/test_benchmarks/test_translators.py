@@ -0,0 +1,26 @@
+from benchmarks.translators import (
+    CASES,
+    alloc_bytes_per_call,
+    find_regressions,
+)
+
+
+def test_cases_translate():
+    for case in CASES.values():
+        assert case.translate(case.payload) is not None
+    assert alloc_bytes_per_call(CASES["fuel_level"]) > 0
+
+
+def test_find_regressions():
+    baseline = {
+        "cases": {"fuel_level": {"ops_per_sec": 1000, "alloc_bytes_per_call": 500}}
+    }
+
+    def results(ops: float, alloc: int) -> dict:
+        return {
+            "cases": {"fuel_level": {"ops_per_sec": ops, "alloc_bytes_per_call": alloc}}
+        }
+
+    assert find_regressions(baseline, results(800, 550), 0.25, 0.1) == []
+    assert len(find_regressions(baseline, results(700, 500), 0.25, 0.1)) == 1
+    assert len(find_regressions(baseline, results(700, 600), 0.25, 0.1)) == 2
@@ -0,0 +1,42 @@
+import pytest
+
+from app import cache_snapshot
+from app.registry import get_registry
+from app.thirdparty_translators import translator_selectors as tpt
+
+
+@pytest.fixture
+def registry_cache():
+    cache = get_registry().cache
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def test_snapshot_round_trip(tmp_path, registry_cache):
+    path = str(tmp_path / "snapshot")
+    tpt.vehicle_cache.set(("gm", "getVehicleInfoService", "1234"), {"vin": "1"}, 60)
+    tpt.vehicle_cache.set(("gm", "getEnergyService", "1234"), {"a": 1}, -1, 10)
+    tpt.vehicle_cache.set(("gm", "getEnergyService", "1235"), {"a": 2}, -1)  # expired
+    registry_cache.set("1234", "gm", 60)
+
+    assert cache_snapshot.save_snapshot(path) == 3
+    tpt.vehicle_cache.clear()
+    registry_cache.clear()
+    assert cache_snapshot.load_snapshot(path) == 3
+
+    info, expires_in = tpt.vehicle_cache.lookup(("gm", "getVehicleInfoService", "1234"))
+    assert info == {"vin": "1"}
+    assert 59 < expires_in <= 60  # keeps its original TTL
+    stale = tpt.vehicle_cache.lookup(("gm", "getEnergyService", "1234"))
+    assert stale[0] == {"a": 1} and stale[1] <= 0
+    assert tpt.vehicle_cache.lookup(("gm", "getEnergyService", "1235")) is None
+    assert registry_cache.get("1234") == "gm"
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path, registry_cache):
+    path = tmp_path / "snapshot"
+    assert cache_snapshot.load_snapshot(str(path)) == 0  # missing
+    path.write_bytes(b"not a snapshot")
+    assert cache_snapshot.load_snapshot(str(path)) == 0
+    assert len(tpt.vehicle_cache) == 0
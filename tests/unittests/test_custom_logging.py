@@ -0,0 +1,83 @@
+import io
+import json
+import logging
+
+import pytest
+
+from app.custom_logging import (
+    BoundedQueueHandler,
+    JSONFormatter,
+    QueueWriter,
+    SamplingFilter,
+)
+
+
+def make_record(level=logging.INFO, name="app.test", msg="hello %s", args=("world",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_sampling_filter_rates():
+    sampling = SamplingFilter({"DEBUG": 0.5}, {"uvicorn": 0.1, "uvicorn.error": 1.0})
+    assert sampling.rate(logging.DEBUG, "app") == 0.5
+    assert sampling.rate(logging.INFO, "app") == 1.0
+    assert sampling.rate(logging.INFO, "uvicorn.access") == 0.1  # parent logger
+    assert sampling.rate(logging.DEBUG, "uvicorn.access") == 0.05
+    assert sampling.rate(logging.INFO, "uvicorn.error") == 1.0
+
+
+def test_sampling_filter_drops():
+    sampling = SamplingFilter({"DEBUG": 0.0})
+    assert not sampling.filter(make_record(logging.DEBUG))
+    assert sampling.filter(make_record(logging.INFO))
+
+
+def test_bounded_queue_handler_drop_policy():
+    handler = BoundedQueueHandler(maxsize=4, policy="drop", watermark=0.5)
+    for _ in range(3):
+        handler.handle(make_record())
+    assert handler.queue.qsize() == 2  # overloaded at 2 records
+    assert handler.dropped == 1
+
+    handler.handle(make_record(logging.ERROR))  # errors are kept until full
+    handler.handle(make_record(logging.ERROR))
+    handler.handle(make_record(logging.ERROR))
+    assert handler.queue.qsize() == 4
+    assert handler.dropped == 2
+
+
+def test_bounded_queue_handler_sample_policy():
+    handler = BoundedQueueHandler(
+        maxsize=1000, policy="sample", watermark=0.0, overload_sample_rate=1.0
+    )
+    handler.handle(make_record())
+    assert handler.queue.qsize() == 1
+
+    with pytest.raises(ValueError):
+        BoundedQueueHandler(maxsize=10, policy="block")
+
+
+def test_json_formatter():
+    line = JSONFormatter().format(make_record())
+    entry = json.loads(line)
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "app.test"
+
+
+def test_queue_writer_reports_dropped():
+    handler = BoundedQueueHandler(maxsize=1, policy="drop", watermark=1.0)
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JSONFormatter())
+    writer = QueueWriter(handler, [output])
+
+    handler.handle(make_record())
+    handler.handle(make_record())  # queue full
+    writer.start()
+    writer.stop()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["message"] for line in lines] == [
+        "hello world",
+        "logging overloaded, dropped 1 records",
+    ]
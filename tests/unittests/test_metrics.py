@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+from .mock_gm import gm_handler
+
+client = TestClient(app)
+
+
+def sample_value(text: str, prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics(mock_upstream):
+    mock_upstream(gm_handler([]))
+    upstream = (
+        'upstream_request_duration_seconds_count{brand="gm",'
+        'service="getVehicleInfoService",status="200"}'
+    )
+    route = (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/vehicles/{vehicle_id}",status="200"}'
+    )
+    hits = 'vehicle_cache_requests_total{brand="gm",result="hit",service="getVehicleInfoService"}'
+    before = client.get("/metrics").text
+
+    assert client.get("/vehicles/1234").status_code == 200
+    assert client.get("/vehicles/1234").status_code == 200  # cached
+    client.get("/nowhere")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    after = response.text
+    assert sample_value(after, upstream) == sample_value(before, upstream) + 1
+    assert sample_value(after, route) == sample_value(before, route) + 2
+    assert sample_value(after, hits) == sample_value(before, hits) + 1
+    assert 'route="unmatched",status="404"' in after
+    assert "http_requests_in_flight" in after
+
+
+def test_metrics_not_in_openapi():
+    assert "/metrics" not in app.openapi()["paths"]
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.registry import (
+    BloomFilter,
+    CachedRegistry,
+    MemoryRegistry,
+    SQLiteRegistry,
+)
+from app.registry import sqlite as sqlite_module
+from app.registry.__main__ import main as registry_cli
+
+
+@pytest.fixture
+def sqlite_registry(tmp_path):
+    registry = SQLiteRegistry(str(tmp_path / "registry.db"))
+    yield registry
+    registry.close()
+
+
+def test_sqlite_registry(sqlite_registry):
+    assert sqlite_registry.add_many([("1234", "gm"), ("1235", "gm")]) == 2
+    assert sqlite_registry.add_many([("1235", "ford")]) == 1  # replaces brand
+
+    assert sqlite_registry.get_brand("1234") == "gm"
+    assert sqlite_registry.get_brand("1235") == "ford"
+    assert sqlite_registry.get_brand("INVALID") is None
+    assert sqlite_registry.get_brands(["1234", "INVALID", "1235"]) == {
+        "1234": "gm",
+        "1235": "ford",
+    }
+    assert sorted(sqlite_registry.iter_ids()) == ["1234", "1235"]
+    assert len(sqlite_registry) == 2
+
+
+def test_sqlite_registry_bulk_lookup_chunks(sqlite_registry):
+    sqlite_registry.add_many((str(i), "gm") for i in range(1200))
+
+    brands = sqlite_registry.get_brands([str(i) for i in range(0, 2400, 2)])
+    assert len(brands) == 600
+
+
+def test_cached_registry():
+    backend = MemoryRegistry({"1234": "gm"})
+    registry = CachedRegistry(
+        backend,
+        cache_size=10,
+        cache_ttl=60,
+        negative_cache_size=10,
+        negative_ttl=60,
+        bloom_error_rate=0.001,
+    )
+    registry.rebuild_bloom()
+
+    assert registry.get_brand("1234") == "gm"
+    backend.add_many([("1234", "ford")])  # served from cache until it expires
+    assert registry.get_brand("1234") == "gm"
+
+    assert registry.get_brand("SCANNER_JUNK") is None
+    assert registry.bloom_rejections == 1
+
+    registry.add_many([("5678", "gm")])  # new ids pass the bloom filter
+    assert registry.get_brand("5678") == "gm"
+    assert registry.get_brands(["1234", "5678", "SCANNER_JUNK"]) == {
+        "1234": "gm",
+        "5678": "gm",
+    }
+
+
+def test_cached_registry_bloom_sees_imported_ids(tmp_path):
+    now = [0.0]
+    backend = SQLiteRegistry(str(tmp_path / "registry.db"))
+    backend.add_many([("1234", "gm")])
+    registry = CachedRegistry(
+        backend,
+        cache_size=10,
+        cache_ttl=60,
+        negative_cache_size=10,
+        negative_ttl=60,
+        bloom_error_rate=0.001,
+        bloom_check_interval=5,
+        clock=lambda: now[0],
+    )
+    registry.rebuild_bloom()
+    assert registry.get_brand("SCANNER_JUNK") is None
+    assert registry.bloom_rejections == 1
+
+    importer = SQLiteRegistry(str(tmp_path / "registry.db"))  # another process
+    importer.add_many([("5678", "gm")])
+    importer.close()
+    now[0] = 5  # the next check sees the new generation and skips the filter
+    assert registry.get_brand("5678") == "gm"
+    registry.close()
+
+
+def test_cached_registry_async_lookups_run_off_the_loop(tmp_path):
+    threads = []
+
+    class RecordingRegistry(SQLiteRegistry):
+        def get_brand(self, vehicle_id):
+            threads.append(threading.current_thread())
+            return super().get_brand(vehicle_id)
+
+        def get_brands(self, vehicle_ids):
+            threads.append(threading.current_thread())
+            return super().get_brands(vehicle_ids)
+
+        def generation(self):
+            threads.append(threading.current_thread())
+            return super().generation()
+
+    backend = RecordingRegistry(str(tmp_path / "registry.db"))
+    backend.add_many([("1234", "gm"), ("5678", "gm")])
+    registry = CachedRegistry(
+        backend,
+        cache_size=10,
+        cache_ttl=60,
+        negative_cache_size=10,
+        negative_ttl=60,
+        bloom_error_rate=0.001,
+    )
+    registry.rebuild_bloom()
+    threads.clear()
+
+    async def lookups():
+        return (
+            await registry.get_brand_async("1234"),
+            await registry.get_brands_async(["1234", "5678", "UNKNOWN"]),
+        )
+
+    brand, brands = asyncio.run(lookups())
+    assert brand == "gm" and brands == {"1234": "gm", "5678": "gm"}
+    assert len(threads) == 3  # generation check, then one lookup per cache miss
+    assert threading.main_thread() not in threads
+    registry.close()
+
+
+def test_sqlite_registry_generation_is_bumped_once_per_import(
+    sqlite_registry, monkeypatch
+):
+    monkeypatch.setattr(sqlite_module, "WRITE_CHUNK_SIZE", 2)
+    assert sqlite_registry.generation() == 0
+    sqlite_registry.add_many((f"V{i}", "gm") for i in range(7))
+    assert sqlite_registry.generation() == 1
+    sqlite_registry.add_many([])
+    assert sqlite_registry.generation() == 1
+
+
+def test_cached_registry_bloom_includes_ids_added_while_built():
+    class ImportingRegistry(MemoryRegistry):
+        def iter_ids(self):
+            ids = super().iter_ids()
+            if self.generation() == 0:  # another import lands during the first scan
+                self.add_many([("5678", "gm")])
+            return ids
+
+    registry = CachedRegistry(
+        ImportingRegistry({"1234": "gm"}),
+        cache_size=10,
+        cache_ttl=60,
+        negative_cache_size=10,
+        negative_ttl=60,
+        bloom_error_rate=0.001,
+    )
+    registry.rebuild_bloom()
+    assert registry.get_brand("5678") == "gm"
+    assert registry.bloom.might_contain("5678")
+
+
+def test_cached_registry_negative_cache():
+    backend = MemoryRegistry({})
+    registry = CachedRegistry(
+        backend, cache_size=10, cache_ttl=60, negative_cache_size=10, negative_ttl=60
+    )
+
+    assert registry.get_brand("1234") is None
+    backend.add_many([("1234", "gm")])  # still unknown until the entry expires
+    assert registry.get_brand("1234") is None
+    assert registry.stats()["negative_cache"]["hits"] == 1
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"vehicle-{i}")
+
+    assert all(f"vehicle-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300  # about 1% expected
+
+
+def test_registry_cli_import(tmp_path, capsys):
+    csv_path = tmp_path / "vehicles.csv"
+    csv_path.write_text(
+        "vehicle_id,brand\n1234,GM\n1235,gm\n\nBROKEN\nFORD,ford\n ,gm\n"
+    )
+    db = str(tmp_path / "registry.db")
+
+    assert registry_cli(["import", str(csv_path), "--db", db]) == 0
+    err = capsys.readouterr().err
+    assert "skipped line 5 " in err and "skipped line 7 " in err
+
+    registry = SQLiteRegistry(db)
+    assert registry.get_brands(["1234", "1235", "FORD"]) == {
+        "1234": "gm",
+        "1235": "gm",
+        "FORD": "ford",
+    }
+    registry.close()
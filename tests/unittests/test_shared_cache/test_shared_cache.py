@@ -0,0 +1,72 @@
+import pytest
+
+from app.shared_cache import MemorySharedCache, SQLiteSharedCache
+from app.shared_cache import sqlite as sqlite_shared_cache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    """Returns a function creating caches on the same backend, like the workers of
+    a host, with a settable clock
+    """
+    now = [1000.0]
+    caches = []
+
+    def make(maxsize=100):
+        if request.param == "memory":
+            cache = caches[0] if caches else MemorySharedCache(maxsize, lambda: now[0])
+        else:
+            cache = SQLiteSharedCache(
+                str(tmp_path / "shared.db"), maxsize, lambda: now[0]
+            )
+        caches.append(cache)
+        return cache
+
+    make.now = now
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_entries_expire(make_cache):
+    cache = make_cache()
+    cache.set("gm|getEnergyService|1234", b'{"a":1}', ttl=5, grace=10)
+
+    assert make_cache().get("gm|getEnergyService|1234") == (b'{"a":1}', 5)
+    make_cache.now[0] += 6
+    assert cache.get("gm|getEnergyService|1234") == (b'{"a":1}', -1)  # stale
+    make_cache.now[0] += 10
+    assert cache.get("gm|getEnergyService|1234") is None
+
+    cache.set("key", b"1", ttl=5)
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_fill_lock_has_one_owner(make_cache):
+    first, second = make_cache(), make_cache()
+
+    assert first.try_lock("key", "worker-1", lease=10)
+    assert not second.try_lock("key", "worker-2", lease=10)
+    second.unlock("key", "worker-2")  # not the owner, keeps the lock
+    assert not second.try_lock("key", "worker-2", lease=10)
+
+    first.unlock("key", "worker-1")
+    assert second.try_lock("key", "worker-2", lease=10)
+    make_cache.now[0] += 11  # the lease of a crashed owner runs out
+    assert first.try_lock("key", "worker-1", lease=10)
+
+
+def test_sqlite_size_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_shared_cache, "PRUNE_EVERY", 10)
+    cache = SQLiteSharedCache(str(tmp_path / "shared.db"), maxsize=5)
+    try:
+        for i in range(20):
+            cache.set(str(i), b"1", ttl=i + 1)
+        assert len(cache) <= 10
+        cache.prune()
+        assert len(cache) == 5
+        assert cache.get("19") is not None  # entries closest to expiring go first
+        assert cache.get("0") is None
+    finally:
+        cache.close()
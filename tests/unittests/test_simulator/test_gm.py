@@ -0,0 +1,81 @@
+import random
+
+from fastapi.testclient import TestClient
+import pytest
+
+from app.main import app
+from app.thirdparty_translators import translator_selectors as tpt
+from simulator import LatencyConfig, SimulatorConfig, create_gm_simulator, fleet_ids
+
+client = TestClient(app)
+
+
+def post(simulator, service: str, vehicle_id: str, **extra):
+    return TestClient(simulator).post(
+        f"/{service}", json={"id": vehicle_id, "responseType": "JSON", **extra}
+    )
+
+
+def test_known_and_synthetic_vehicles():
+    simulator = create_gm_simulator(SimulatorConfig(fleet_size=10))
+
+    info = post(simulator, "getVehicleInfoService", "1235").json()
+    assert info["status"] == "200"
+    assert info["data"]["vin"]["value"] == "1235AZ91XP"
+
+    vehicle_id = fleet_ids(10)[3]
+    first = post(simulator, "getVehicleInfoService", vehicle_id).json()
+    assert first == post(simulator, "getVehicleInfoService", vehicle_id).json()
+
+    response = post(simulator, "getVehicleInfoService", fleet_ids(11)[10])
+    assert response.status_code == 404
+    assert response.json()["status"] == "404"
+
+    action = post(simulator, "actionEngineService", "1234", command="START_VEHICLE")
+    assert action.json()["actionResult"]["status"] == "EXECUTED"
+
+    assert simulator.state.requests["getVehicleInfoService"] == 4
+
+
+@pytest.mark.parametrize(
+    "distribution", ["constant", "uniform", "exponential", "lognormal"]
+)
+def test_latency_distributions(distribution: str):
+    latency = LatencyConfig(distribution=distribution, median_ms=50)
+    rng = random.Random(0)
+    samples = sorted(latency.sample(rng) for _ in range(2001))
+
+    assert all(s >= 0 for s in samples)
+    assert 0.03 < samples[1000] < 0.07  # median close to 50ms
+
+    slow = LatencyConfig(median_ms=10, slow_rate=1.0, slow_ms=1000)
+    assert slow.sample(rng) == pytest.approx(1.01)
+
+
+def test_app_against_simulator(use_gm_simulator):
+    use_gm_simulator()
+
+    response = client.get("/vehicles/1234")
+    assert response.status_code == 200
+    assert response.json() == {
+        "vin": "123123412412",
+        "color": "Metallic Silver",
+        "doorCount": 4,
+        "driveTrain": "v8",
+    }
+    assert len(client.get("/vehicles/1235/doors").json()) == 2
+    assert client.get("/vehicles/1235/fuel").json() == {"percent": None}
+    assert isinstance(client.get("/vehicles/1235/battery").json()["percent"], float)
+    engine = client.post("/vehicles/1234/engine", json={"action": "START"})
+    assert engine.json() == {"status": "success"}
+
+
+def test_app_against_faulty_simulator(use_gm_simulator):
+    use_gm_simulator(SimulatorConfig(error_rate=1.0))
+    assert client.get("/vehicles/1234/doors").status_code == 500
+
+    use_gm_simulator(SimulatorConfig(malformed_rate=1.0))
+    unchecked_client = TestClient(app, raise_server_exceptions=False)
+    for _ in range(5):  # info fails on every kind of malformed body
+        tpt.vehicle_cache.clear()
+        assert unchecked_client.get("/vehicles/1234").status_code == 500
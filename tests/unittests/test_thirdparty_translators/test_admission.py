@@ -0,0 +1,175 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.thirdparty_translators import admission, resilience
+from app.thirdparty_translators import translator_selectors as tpt
+from app.thirdparty_translators.admission import AdaptiveLimiter
+
+from ..mock_gm import gm_handler
+
+
+def make_limiter(limit=1, queue_size=10, target_latency=1.0):
+    return AdaptiveLimiter(
+        "gm",
+        initial_limit=limit,
+        min_limit=1,
+        max_limit=10,
+        target_latency=target_latency,
+        backoff_ratio=0.5,
+        queue_size=queue_size,
+    )
+
+
+def test_limiter_queues_by_priority():
+    async def main():
+        limiter = make_limiter()
+        limiter.avg_latency = 0.0
+        order = []
+
+        async def call(name, priority):
+            await limiter.acquire(priority, 1.0, name)
+            order.append(name)
+            await asyncio.sleep(0)
+            limiter.release(0.01, False)
+
+        await limiter.acquire(1, 1.0, "first")
+        tasks = [
+            asyncio.ensure_future(call("read", 1)),
+            asyncio.ensure_future(call("engine", 0)),
+        ]
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == 2
+        limiter.release(0.01, False)
+        await asyncio.gather(*tasks)
+        return order, limiter
+
+    order, limiter = asyncio.run(main())
+    assert order == ["engine", "read"]
+    assert limiter.in_flight == 0
+
+
+def test_limiter_rejects_past_deadline():
+    async def main():
+        limiter = make_limiter()
+        await limiter.acquire(1, 1.0, "info")
+        limiter.avg_latency = 5.0  # expected wait is past the deadline
+        with pytest.raises(HTTPException) as e:
+            await limiter.acquire(1, 1.0, "info")
+        return e.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "5"
+
+
+def test_limiter_times_out_waiting():
+    async def main():
+        limiter = make_limiter()
+        limiter.avg_latency = 0.0
+        await limiter.acquire(1, 1.0, "info")
+        with pytest.raises(HTTPException) as e:
+            await limiter.acquire(1, 0.01, "info")
+        assert limiter.stats()["queued"] == 0
+        return e.value
+
+    assert asyncio.run(main()).status_code == 429
+
+
+def test_limiter_full_queue_preempts_lower_priority():
+    async def main():
+        limiter = make_limiter(queue_size=1)
+        limiter.avg_latency = 0.0
+        await limiter.acquire(1, 1.0, "info")
+        read = asyncio.ensure_future(limiter.acquire(1, 1.0, "info"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException):  # same priority, queue is full
+            await limiter.acquire(1, 1.0, "fuel")
+
+        engine = asyncio.ensure_future(limiter.acquire(0, 1.0, "engine"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException):
+            await read
+        limiter.release(0.01, False)
+        await engine
+        return limiter
+
+    assert asyncio.run(main()).in_flight == 1
+
+
+def test_limiter_adapts_limit():
+    limiter = make_limiter(limit=4)
+    limiter.in_flight = 3
+    limiter.release(2.0, False)  # slower than target
+    assert limiter.limit == 2
+    limiter.release(0.1, True)  # failed
+    assert limiter.limit == 1
+    limiter.release(0.1, False)
+    assert limiter.limit == 2
+
+
+def test_routes_tag_admission(mock_upstream, monkeypatch):
+    mock_upstream(gm_handler([]))
+    client = TestClient(app)
+    assert client.get("/vehicles/1234/fuel").status_code == 200
+    assert client.post("/vehicles/1234/engine", json={"action": "START"}).json() == {
+        "status": "success"
+    }
+    limiter = admission.get_limiter("gm")
+    assert limiter.admitted == 2
+    assert limiter.in_flight == 0
+
+    seen = []
+
+    async def acquire(priority, timeout, route):
+        seen.append((route, priority, timeout))
+        raise HTTPException(429)
+
+    monkeypatch.setattr(limiter, "acquire", acquire)
+    assert client.get("/vehicles/1234/battery").status_code == 429
+    engine = client.post("/vehicles/1234/engine", json={"action": "START"})
+    assert engine.status_code == 429
+    assert seen == [("battery", 1, 2.0), ("engine", 0, 5.0)]
+
+
+def test_coalesced_reads_hold_one_slot(run_with_upstream, monkeypatch):
+    monkeypatch.setattr(admission.settings, "admission_initial_limit", 2)
+    calls = []
+    slots_held = []
+    handle = gm_handler(calls)
+
+    def handler(request):
+        slots_held.append(admission.get_limiter("gm").in_flight)
+        return handle(request)
+
+    async def identical_reads():
+        return await asyncio.gather(
+            *(tpt.select_fuel_level_async("gm", "1234") for _ in range(10))
+        )
+
+    results = run_with_upstream(handler, identical_reads)
+    assert all(fuel.percent == 30.2 for fuel in results)
+    assert calls == ["/getEnergyService"]
+    assert slots_held == [1]
+    assert admission.get_limiter("gm").admitted == 1
+
+
+def test_open_circuit_leaves_limit(run_with_upstream):
+    breaker = resilience.get_breaker("gm")
+    breaker.state, breaker.opened_at = resilience.OPEN, time.monotonic()
+
+    async def read_while_open():
+        for _ in range(10):
+            with pytest.raises(HTTPException) as e:
+                await tpt.select_fuel_level_async("gm", "1234")
+            assert e.value.status_code == 503
+
+    run_with_upstream(gm_handler([]), read_while_open)
+    limiter = admission.get_limiter("gm")
+    assert limiter.limit == admission.settings.admission_initial_limit
+    assert limiter.avg_latency == admission.settings.admission_target_latency / 2
+    assert limiter.in_flight == 0
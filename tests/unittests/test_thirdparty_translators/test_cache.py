@@ -0,0 +1,73 @@
+from app.thirdparty_translators.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expiry():
+    clock = FakeClock()
+    cache = TTLCache(10, clock=clock)
+
+    cache.set("key", {"value": 1}, ttl=5)
+    assert cache.get("key") == {"value": 1}
+
+    clock.now = 5  # entry expires at exactly its TTL
+    assert cache.get("key") is None
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(2)
+
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == 1  # makes "b" the least recently used entry
+    cache.set("c", 3, ttl=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_delete():
+    cache = TTLCache(2)
+    cache.set("a", 1, ttl=60)
+    cache.delete("a")
+    cache.delete("missing")
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_stale_grace():
+    clock = FakeClock()
+    cache = TTLCache(10, clock=clock)
+
+    cache.set("key", 1, ttl=5, grace=10)
+    assert cache.lookup("key") == (1, 5)
+
+    clock.now = 8
+    assert cache.get("key") is None  # get only returns fresh values
+    assert cache.lookup("key") == (1, -3)
+    assert cache.stats()["stale_hits"] == 1
+
+    clock.now = 15
+    assert cache.lookup("key") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_items():
+    clock = FakeClock()
+    cache = TTLCache(10, clock=clock)
+    cache.set("a", 1, ttl=5, grace=10)
+    cache.set("b", 2, ttl=20)
+    cache.get("a")
+
+    clock.now = 8
+    assert cache.items() == [("b", 2, 12, 0), ("a", 1, -3, 10)]  # LRU first
+    clock.now = 16
+    assert cache.items() == [("b", 2, 4, 0)]
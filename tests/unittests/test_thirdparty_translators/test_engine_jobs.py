@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import tracing
+from app.api.vehicles import models
+from app.thirdparty_translators.engine_jobs import FAILED, SUCCEEDED, UNKNOWN, JobQueue
+
+
+def make_queue(run, **kwargs):
+    options = dict(
+        workers=1, queue_size=10, command_timeout=1.0, ttl=60.0, max_jobs=100
+    )
+    options.update(kwargs)
+    return JobQueue(run=run, **options)
+
+
+def test_jobs_run_in_background():
+    async def run(brand, vehicle_id, post_data):
+        if post_data["action"] == "FAIL":
+            raise HTTPException(502, detail="GM API is unreachable")
+        return models.StartStopEngineResponse(status="success")
+
+    async def main():
+        queue = make_queue(run)
+        ok = queue.submit("gm", "1234", {"action": "START"})
+        failing = queue.submit("gm", "1234", {"action": "FAIL"})
+        assert ok.status == "pending"
+        await asyncio.sleep(0.01)
+        queue.close()
+        return queue, ok, failing
+
+    queue, ok, failing = asyncio.run(main())
+    assert queue.get(ok.id) is ok
+    assert ok.status == SUCCEEDED and ok.result.status == "success"
+    assert failing.status == FAILED
+    assert failing.error == models.SectionError(
+        status=502, detail="GM API is unreachable"
+    )
+    assert queue.stats()["failed"] == 1
+
+
+def test_job_timeout_and_queue_limit():
+    async def run(brand, vehicle_id, post_data):
+        await asyncio.sleep(0.02)
+        raise HTTPException(504, detail="GM API timed out (actionEngineService)")
+
+    async def main():
+        queue = make_queue(run, queue_size=1, command_timeout=2.5)
+        slow = queue.submit("gm", "1234", {"action": "START"})
+        await asyncio.sleep(0)  # the worker takes the first job
+        queue.submit("gm", "1234", {"action": "START"})
+        with pytest.raises(HTTPException) as e:
+            queue.submit("gm", "1234", {"action": "START"})
+        assert e.value.status_code == 429
+        assert e.value.headers == {"Retry-After": "3"}
+        await asyncio.sleep(0.01)
+        assert slow.status == "running"  # not cancelled while GM is answering
+        await asyncio.sleep(0.05)
+        queue.close()
+        return queue, slow
+
+    queue, slow = asyncio.run(main())
+    assert slow.status == UNKNOWN and slow.error.status == 504
+    assert queue.stats()["unknown"] == 2 and queue.stats()["failed"] == 0
+
+
+def test_jobs_run_with_their_request_id():
+    seen = []
+
+    async def run(brand, vehicle_id, post_data):
+        seen.append((post_data["action"], tracing.get_request_id()))
+        return models.StartStopEngineResponse(status="success")
+
+    async def submit(queue, request_id, action):
+        tracing.request_id.set(request_id)
+        return queue.submit("gm", "1234", {"action": action})
+
+    async def main():
+        queue = make_queue(run)
+        # each request runs in its own context, like under RequestContextMiddleware
+        await asyncio.ensure_future(submit(queue, "first", "START"))
+        await asyncio.ensure_future(submit(queue, "second", "STOP"))
+        await asyncio.sleep(0.01)
+        queue.close()
+
+    asyncio.run(main())
+    assert seen == [("START", "first"), ("STOP", "second")]
+
+
+def test_pending_jobs_are_not_evicted():
+    release = None
+
+    async def run(brand, vehicle_id, post_data):
+        await release.wait()
+        return models.StartStopEngineResponse(status="success")
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()  # bound to this loop
+        queue = make_queue(run, queue_size=5, max_jobs=2)
+        jobs = [queue.submit("gm", "1234", {"action": "START"}) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert all(queue.get(job.id) is job for job in jobs)  # beyond max_jobs
+        release.set()
+        await asyncio.sleep(0.01)
+        queue.close()
+        return queue, jobs
+
+    queue, jobs = asyncio.run(main())
+    assert all(job.status == SUCCEEDED for job in jobs)
+    assert [queue.get(job.id) for job in jobs] == [None, None, None] + jobs[3:]
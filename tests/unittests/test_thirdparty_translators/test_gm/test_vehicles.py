@@ -1,3 +1,4 @@
+import httpx
 import pytest
 from fastapi import HTTPException
 from app.thirdparty_translators.gm import vehicles
@@ -25,6 +26,116 @@ def test_post_vehicle_request():
     )
 
 
+def test_post_vehicle_request_async(run_with_upstream):
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/getVehicleInfoService"
+        return httpx.Response(
+            200, json={"service": "getVehicleInfo", "status": "200", "data": {"vin": {}}}
+        )
+
+    data = run_with_upstream(
+        handler,
+        lambda: vehicles.post_vehicle_request_async("getVehicleInfoService", "1234"),
+    )
+    assert data == {"vin": {}}
+
+    # tests to see if raw response works
+    assert "status" in run_with_upstream(
+        handler,
+        lambda: vehicles.post_vehicle_request_async(
+            "getVehicleInfoService", "1234", raw=True
+        ),
+    )
+
+
+def test_post_vehicle_request_async_exceptions(run_with_upstream):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            404, json={"status": "404", "reason": "Vehicle id: 1 not found."}
+        )
+
+    with pytest.raises(ValueError):  # tests with missing id
+        run_with_upstream(
+            handler,
+            lambda: vehicles.post_vehicle_request_async("getVehicleInfoService", ""),
+        )
+
+    with pytest.raises(HTTPException) as e:
+        run_with_upstream(
+            handler,
+            lambda: vehicles.post_vehicle_request_async("getVehicleInfoService", "1"),
+        )
+    assert e.value.status_code == 404
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(vehicles.settings, "upstream_retry_backoff", 0.0)
+
+
+def test_post_vehicle_request_async_retries(run_with_upstream, fast_retries):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if len(calls) < 3:
+            return httpx.Response(503, json={"status": "503", "reason": "busy"})
+        return httpx.Response(200, json={"status": "200", "data": {"vin": {}}})
+
+    data = run_with_upstream(
+        handler,
+        lambda: vehicles.post_vehicle_request_async("getVehicleInfoService", "1234"),
+    )
+    assert data == {"vin": {}}
+    assert len(calls) == 3
+
+
+def test_post_vehicle_request_async_engine_not_retried(run_with_upstream, fast_retries):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    with pytest.raises(HTTPException) as e:
+        run_with_upstream(
+            handler,
+            lambda: vehicles.post_vehicle_request_async(
+                "actionEngineService",
+                "1234",
+                raw=True,
+                extra_data={"command": "START_VEHICLE"},
+            ),
+        )
+    assert e.value.status_code == 504
+    assert calls == ["/actionEngineService"]
+
+
+def test_post_vehicle_request_async_circuit_breaker(run_with_upstream, fast_retries):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        raise httpx.ConnectError("refused", request=request)
+
+    request = lambda: vehicles.post_vehicle_request_async(  # noqa: E731
+        "getEnergyService", "1234"
+    )
+    with pytest.raises(HTTPException) as e:
+        run_with_upstream(handler, request)
+    assert e.value.status_code == 502
+    with pytest.raises(HTTPException):
+        run_with_upstream(handler, request)
+    # threshold of 5 failures reached on the 2nd attempt of the 2nd request
+    assert len(calls) == 5
+
+    with pytest.raises(HTTPException) as e:  # fails fast while open
+        run_with_upstream(handler, request)
+    assert e.value.status_code == 503
+    assert "Retry-After" in e.value.headers
+    assert len(calls) == 5
+
+
 def test_translator_wrapper():
     with pytest.raises(HTTPException):
         vehicles.translate_vehicle_info({})
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from app.thirdparty_translators import hedging
+from app.thirdparty_translators.hedging import HedgeBudget, Hedger, LatencyTracker
+
+
+def make_hedger(budget=1.0, burst=10.0):
+    tracker = LatencyTracker(window=100, percentile=90)
+    for _ in range(10):
+        tracker.add(0.01)
+    return Hedger(
+        "gm", "getEnergyService", tracker, HedgeBudget(budget, burst), 10, 0.0
+    )
+
+
+def slow_then_fast(calls: list, slow: float = 1.0):
+    async def fn():
+        calls.append(len(calls))
+        await asyncio.sleep(slow if len(calls) == 1 else 0)
+        return len(calls)
+
+    return fn
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(window=100, percentile=95, refresh_every=1)
+    assert tracker.threshold() is None
+    for ms in range(1, 101):
+        tracker.add(ms / 1000)
+    assert tracker.threshold() == pytest.approx(0.096)
+    tracker.add(1.0)  # window drops the oldest sample
+    assert len(tracker) == 100
+    assert tracker.threshold() == pytest.approx(0.097)
+
+
+def test_hedge_budget():
+    budget = HedgeBudget(0.5, burst=1.0)
+    assert not budget.try_spend()
+    budget.earn()
+    budget.earn()
+    budget.earn()  # capped at burst
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+
+def test_hedger_hedge_wins():
+    hedger = make_hedger()
+    calls = []
+    assert asyncio.run(hedger.run(slow_then_fast(calls))) == 2
+    assert hedger.stats()["hedged"] == 1
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_hedger_fast_requests_are_not_hedged():
+    hedger = make_hedger()
+    calls = []
+    assert asyncio.run(hedger.run(slow_then_fast(calls, slow=0))) == 1
+    assert calls == [0]
+    assert hedger.hedged == 0
+
+
+def test_hedger_budget_exhausted():
+    hedger = make_hedger(budget=0.0)
+    calls = []
+    result = asyncio.run(hedger.run(slow_then_fast(calls, slow=0.05)))
+    assert result == 1
+    assert calls == [0]
+
+
+def test_hedger_waits_for_samples():
+    hedger = Hedger(
+        "gm", "getEnergyService", LatencyTracker(10, 90), HedgeBudget(1.0), 5, 0.0
+    )
+    assert hedger.delay() is None
+
+
+def test_hedger_failed_hedge_falls_back_to_primary():
+    hedger = make_hedger()
+    calls = []
+
+    async def fn():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            await asyncio.sleep(0.05)
+            return "primary"
+        raise ValueError("hedge failed")
+
+    assert asyncio.run(hedger.run(fn)) == "primary"
+
+
+def test_get_hedger(monkeypatch):
+    monkeypatch.setattr(hedging.settings, "hedge_enabled", False)
+    assert hedging.get_hedger("gm", "getEnergyService") is None  # disabled
+    monkeypatch.setattr(hedging.settings, "hedge_enabled", True)
+    hedger = hedging.get_hedger("gm", "getEnergyService")
+    assert hedger is hedging.get_hedger("gm", "getEnergyService")
+    assert hedging.get_hedger("gm", "actionEngineService") is None
+    assert "gm/getEnergyService" in hedging.stats()
@@ -0,0 +1,78 @@
+import asyncio
+
+import httpx
+from prometheus_client import REGISTRY
+
+from app.thirdparty_translators import http_client
+
+
+def test_pooled_client_per_host_limit():
+    peak = 0
+    in_flight = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal peak, in_flight
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={})
+
+    async def main():
+        client = http_client.PooledClient(
+            max_connections=10,
+            max_keepalive_connections=10,
+            keepalive_expiry=5.0,
+            max_connections_per_host=2,
+            transport=httpx.MockTransport(handler),
+        )
+        await asyncio.gather(*(client.post("http://gm.test/svc") for _ in range(6)))
+        await client.aclose()
+        return client.stats()
+
+    stats = asyncio.run(main())
+
+    assert peak == 2  # never more than the per host limit at once
+    assert stats["gm.test"]["requests"] == 6
+    assert stats["gm.test"]["peak_in_flight"] == 2
+    assert stats["gm.test"]["saturated"] == 4
+    assert stats["gm.test"]["in_flight"] == 0 and stats["gm.test"]["waiting"] == 0
+    assert stats["gm.test"]["keepalive"] == 0  # mock transports have no pool
+
+
+def test_pooled_client_gauges():
+    def gauge(state):
+        labels = {"host": "gauges.test", "state": state}
+        return REGISTRY.get_sample_value("upstream_pool_connections", labels)
+
+    seen = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        seen.append((gauge("in_use"), gauge("waiting")))
+        return httpx.Response(200, json={})
+
+    async def main():
+        client = http_client.PooledClient(
+            max_connections=10,
+            max_keepalive_connections=10,
+            keepalive_expiry=5.0,
+            max_connections_per_host=1,
+            transport=httpx.MockTransport(handler),
+        )
+        await asyncio.gather(*(client.post("http://gauges.test/svc") for _ in range(2)))
+        await client.aclose()
+
+    asyncio.run(main())
+    assert seen == [(1.0, 1.0), (1.0, 0.0)]
+    assert gauge("in_use") == 0 and gauge("waiting") == 0
+
+
+def test_start_and_close_client():
+    async def main():
+        client = http_client.start_client()
+        assert http_client.get_client() is client
+        await http_client.close_client()
+
+    asyncio.run(main())
+    assert http_client.pool_stats() == {}
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.thirdparty_translators.idempotency import IdempotencyStore
+
+
+def test_duplicates_run_once():
+    calls = []
+
+    async def command():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "success"
+
+    async def main():
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        concurrent = await asyncio.gather(
+            store.run("key", "START", command), store.run("key", "START", command)
+        )
+        later = await store.run("key", "START", command)
+        other_key = await store.run("other", "START", command)
+        return concurrent, later, other_key
+
+    concurrent, later, other_key = asyncio.run(main())
+    assert concurrent == [("success", False), ("success", True)]
+    assert later == ("success", True)
+    assert other_key == ("success", False)
+    assert len(calls) == 2
+
+
+def test_key_reused_for_another_request():
+    async def command():
+        await asyncio.sleep(0.01)
+        return "success"
+
+    async def main():
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        first = asyncio.ensure_future(store.run("key", "START", command))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as in_flight:
+            await store.run("key", "STOP", command)
+        await first
+        with pytest.raises(HTTPException) as stored:
+            await store.run("key", "STOP", command)
+        return in_flight.value, stored.value
+
+    in_flight, stored = asyncio.run(main())
+    assert in_flight.status_code == 409
+    assert stored.status_code == 422
+
+
+def test_failures_are_not_stored():
+    results = [HTTPException(502, detail="GM API is unreachable"), "success"]
+
+    async def command():
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def main():
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        with pytest.raises(HTTPException):
+            await store.run("key", "START", command)
+        return await store.run("key", "START", command)  # the retry is sent
+
+    assert asyncio.run(main()) == ("success", False)
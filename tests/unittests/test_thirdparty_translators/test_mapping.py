@@ -0,0 +1,111 @@
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from app.thirdparty_translators.mapping import (
+    Field,
+    ListSpec,
+    ModelSpec,
+    bool_from_string,
+    enum_map,
+    first_flag,
+    float_or_null,
+    to_str,
+    value,
+)
+
+
+class Item(BaseModel):
+    name: str
+    active: bool
+
+
+ITEM_SPEC = ModelSpec(
+    Item,
+    {
+        "name": value("name", coerce=to_str),
+        "active": value("active", coerce=bool_from_string),
+    },
+)
+
+
+def test_model_spec():
+    translate = ITEM_SPEC.compile()
+    item = translate({"name": {"value": 12}, "active": {"value": "True"}})
+    assert item == {"name": "12", "active": True}
+
+
+def test_model_spec_missing_required_field():
+    translate = ITEM_SPEC.compile()
+    with pytest.raises(KeyError):
+        translate({"name": {"value": "a"}})
+
+
+def test_model_spec_must_map_every_field():
+    with pytest.raises(ValueError):
+        ModelSpec(Item, {"name": value("name")})
+
+
+def test_field_needs_path_or_compute():
+    with pytest.raises(ValueError):
+        Field()
+    with pytest.raises(ValueError):
+        Field(path=("a",), compute=lambda data: data)
+
+
+def test_field_paths():
+    nested = Field(path=("a", "b", "c")).compile("x")
+    assert nested({"a": {"b": {"c": 1}}}) == 1
+    with pytest.raises(KeyError):
+        nested({"a": {}})
+    optional = Field(path=("a",), required=False).compile("x")
+    assert optional({}) is None
+
+
+def test_list_spec():
+    translate = ListSpec(("items", "values"), ITEM_SPEC).compile()
+    item = {"name": {"value": "a"}, "active": {"value": "False"}}
+    assert translate({"items": {"values": [item]}}) == [{"name": "a", "active": False}]
+    assert translate({}) == []
+    with pytest.raises(TypeError):
+        translate({"items": {"values": "a"}})
+
+
+@pytest.mark.parametrize(
+    "raw,expected", [(None, None), ("null", None), ("NULL", None), ("30.5", 30.5)]
+)
+def test_float_or_null(raw, expected):
+    assert float_or_null(raw) == expected
+
+
+def test_float_or_null_invalid():
+    with pytest.raises(ValueError):
+        float_or_null("abc")
+
+
+def test_to_str_rejects_objects():
+    with pytest.raises(TypeError):
+        to_str({"a": 1})
+
+
+def test_enum_map():
+    coerce = enum_map({"A": "a"}, "unknown {value}")
+    assert coerce("A") == "a"
+    with pytest.raises(HTTPException) as e:
+        coerce("B")
+    assert e.value.status_code == 500
+    assert e.value.detail == "unknown B"
+
+
+def test_first_flag():
+    compute = first_flag({"one": 1, "two": 2}, default=0)
+    assert compute({"two": {"value": "True"}}) == 2
+    assert compute({"one": {"value": "False"}}) == 0
+
+
+def test_model_spec_matches_construct():
+    item = ITEM_SPEC.compile()({"name": {"value": "a"}, "active": {"value": "True"}})
+    expected = Item.construct(name="a", active=True)
+    assert item == expected
+    assert item.__fields_set__ == expected.__fields_set__
+    assert item.json() == expected.json()
@@ -0,0 +1,61 @@
+import asyncio
+
+from app.thirdparty_translators.refresh import HotKeys, Refresher
+
+
+def test_hot_keys():
+    hot_keys = HotKeys(maxsize=10, window=60, threshold=3)
+    assert not hot_keys.touch("a")
+    assert not hot_keys.touch("a")
+    assert hot_keys.touch("a")
+    assert not hot_keys.touch("b")
+
+
+def test_refresher_is_bounded():
+    async def main():
+        refresher = Refresher(max_concurrency=2, max_pending=3)
+        running = []
+        peak = []
+        release = asyncio.Event()
+
+        def make_refresh(key):
+            async def refresh():
+                running.append(key)
+                peak.append(len(running))
+                await release.wait()
+                running.remove(key)
+
+            return refresh
+
+        assert refresher.schedule("a", make_refresh("a"), "stale")
+        assert not refresher.schedule("a", make_refresh("a"), "stale")  # deduplicated
+        assert refresher.schedule("b", make_refresh("b"), "stale")
+        assert refresher.schedule("c", make_refresh("c"), "ahead")
+        assert not refresher.schedule("d", make_refresh("d"), "ahead")  # dropped
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.sleep(0.01)
+        return refresher, max(peak)
+
+    refresher, peak = asyncio.run(main())
+    assert peak == 2
+    assert refresher.stats() == {
+        "pending": 0,
+        "scheduled": 3,
+        "dropped": 1,
+        "failed": 0,
+    }
+
+
+def test_refresher_failures_are_contained():
+    async def main():
+        refresher = Refresher(max_concurrency=1, max_pending=1)
+
+        async def fail():
+            raise ValueError("upstream down")
+
+        refresher.schedule("a", fail, "stale")
+        await asyncio.sleep(0.01)
+        return refresher
+
+    assert asyncio.run(main()).failed == 1
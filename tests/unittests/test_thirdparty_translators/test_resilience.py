@@ -0,0 +1,83 @@
+import pytest
+from fastapi import HTTPException
+
+from app.thirdparty_translators import resilience
+from app.thirdparty_translators.resilience import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_breaker(clock):
+    return CircuitBreaker("gm", failure_threshold=2, reset_timeout=10, clock=clock)
+
+
+def test_circuit_breaker_opens_after_threshold():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_success()  # successes reset the count
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+
+    with pytest.raises(HTTPException) as e:
+        breaker.before_call()
+    assert e.value.status_code == 503
+    assert e.value.headers["Retry-After"] == "10"
+    assert breaker.rejected == 1
+
+
+def test_circuit_breaker_probes_before_closing():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock.now = 10
+    breaker.before_call()  # the probe
+    assert breaker.state == resilience.HALF_OPEN
+    with pytest.raises(HTTPException):  # only one probe at a time
+        breaker.before_call()
+
+    breaker.record_failure()  # failed probe opens the circuit again
+    assert breaker.state == resilience.OPEN
+    with pytest.raises(HTTPException):
+        breaker.before_call()
+
+    clock.now = 20
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == resilience.CLOSED
+    breaker.before_call()
+
+
+def test_circuit_breaker_replaces_lost_probe():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now = 10
+    breaker.before_call()  # probe never reports back
+    clock.now = 20
+    breaker.before_call()
+
+
+def test_get_breaker():
+    assert resilience.get_breaker("gm") is resilience.get_breaker("gm")
+    assert resilience.get_breaker("gm") is not resilience.get_breaker("ford")
+
+
+def test_backoff_delay(monkeypatch):
+    monkeypatch.setattr(resilience.settings, "upstream_retry_backoff", 0.1)
+    monkeypatch.setattr(resilience.settings, "upstream_retry_backoff_max", 0.3)
+    for _ in range(100):
+        assert 0 <= resilience.backoff_delay(1) <= 0.1
+        assert 0 <= resilience.backoff_delay(5) <= 0.3
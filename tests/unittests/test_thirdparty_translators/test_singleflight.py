@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from prometheus_client import CollectorRegistry, Counter
+
+from app.thirdparty_translators.singleflight import SingleFlight
+
+
+def test_single_flight_collapses_calls():
+    flights = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"value": calls}
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", fetch) for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert calls == 1
+    assert results == [{"value": 1}] * 5
+    assert flights.stats() == {"calls": 5, "collapsed": 4, "in_flight": 0}
+
+
+def test_single_flight_shares_errors():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(
+            *(flights.do("key", fetch) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.collapsed == 2
+
+    # a later call is not served the old error
+    async def ok():
+        return "ok"
+
+    assert asyncio.run(flights.do("key", ok)) == "ok"
+
+
+def test_single_flight_caller_cancellation():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("key", fetch))
+        second = asyncio.ensure_future(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()  # the shared call keeps going for the other caller
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_single_flight_counts_collapsed_calls():
+    registry = CollectorRegistry()
+    collapsed = Counter("collapsed", "collapsed calls", ["service"], registry=registry)
+    flights = SingleFlight(collapsed)
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(
+            *(flights.do("key", fetch, ("getEnergyService",)) for _ in range(3))
+        )
+
+    asyncio.run(main())
+    labels = {"service": "getEnergyService"}
+    assert registry.get_sample_value("collapsed_total", labels) == 2
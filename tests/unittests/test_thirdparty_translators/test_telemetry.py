@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import tracing
+from app.api.vehicles import models
+from app.thirdparty_translators import telemetry
+
+from ..mock_gm import gm_handler
+
+
+@pytest.fixture
+def fast_polls(monkeypatch):
+    monkeypatch.setattr(telemetry.settings, "telemetry_min_interval", 0.01)
+    monkeypatch.setattr(telemetry.settings, "telemetry_max_interval", 0.02)
+    monkeypatch.setattr(telemetry.settings, "cache_ttls", {})  # every poll hits GM
+
+
+def fuel_handler(calls, levels):
+    """GM handler answering getEnergyService with the next of levels"""
+    handle = gm_handler(calls)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path != "/getEnergyService":
+            return handle(request)
+        calls.append(request.url.path)
+        level = levels.pop(0) if len(levels) > 1 else levels[0]
+        data = {
+            "tankLevel": {"type": "Number", "value": level},
+            "batteryLevel": {"type": "Null", "value": "null"},
+        }
+        return httpx.Response(200, json={"status": "200", "data": data})
+
+    return handler
+
+
+def test_subscribers_share_a_poller(run_with_upstream, fast_polls):
+    calls = []
+
+    async def two_subscribers():
+        first = telemetry.subscribe("gm", "1234", ["doors", "fuel"])
+        second = telemetry.subscribe("gm", "1234", ["fuel"])
+        assert telemetry.stats() == {"pollers": 1, "subscribers": 2}
+
+        initial = await first.next(1), await second.next(1)
+        changed = await first.next(1)  # doors are unchanged, only fuel is pushed
+        telemetry.unsubscribe(first)
+        telemetry.unsubscribe(second)
+        polls = calls.count("/getEnergyService")
+        await asyncio.sleep(0.05)
+        return initial, changed, polls
+
+    handler = fuel_handler(calls, ["30.2", "50.0"])
+    (first, second), changed, polls = run_with_upstream(handler, two_subscribers)
+
+    assert sorted(first) == ["doors", "fuel"]
+    assert first["fuel"].percent == 30.2
+    assert list(second) == ["fuel"]
+    assert changed == {"fuel": models.Fuel(percent=50.0)}
+    assert calls.count("/getSecurityStatusService") == polls  # one poll for both
+    assert calls.count("/getEnergyService") == polls  # stopped with the last client
+    assert telemetry.stats() == {"pollers": 0, "subscribers": 0}
+
+
+def test_section_errors_are_pushed(run_with_upstream, fast_polls):
+    async def subscribe():
+        subscriber = telemetry.subscribe("gm", "1234", ["doors", "fuel"])
+        try:
+            return await subscriber.next(1)
+        finally:
+            telemetry.unsubscribe(subscriber)
+
+    handler = gm_handler([], failing=("/getSecurityStatusService",))
+    changes = run_with_upstream(handler, subscribe)
+    assert changes["fuel"].percent == 30.2
+    assert changes["errors"]["doors"].status == 500
+    assert "doors" not in changes
+
+
+def test_poll_interval_adapts_to_subscribers(monkeypatch):
+    monkeypatch.setattr(telemetry.settings, "telemetry_min_interval", 1.0)
+    monkeypatch.setattr(telemetry.settings, "telemetry_max_interval", 10.0)
+    poller = telemetry.VehiclePoller("gm", "1234")
+
+    assert poller.interval() == 10.0
+    poller.subscribers = {object(), object()}
+    assert poller.interval() == 5.0
+    poller.subscribers = set(range(50))
+    assert poller.interval() == 1.0
+
+
+def test_subscriber_limit(monkeypatch):
+    monkeypatch.setattr(telemetry.settings, "telemetry_max_subscribers", 0)
+    with pytest.raises(telemetry.HTTPException) as e:
+        telemetry.subscribe("gm", "1234", ["fuel"])
+    assert e.value.status_code == 429
+
+
+def test_poller_runs_outside_the_request_context(run_with_upstream, fast_polls):
+    request_ids = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        request_ids.append(tracing.get_request_id())
+        return gm_handler([])(request)
+
+    async def subscribe():
+        tracing.request_id.set("first-subscriber")
+        subscriber = telemetry.subscribe("gm", "1234", ["fuel"])
+        try:
+            await subscriber.next(1)
+        finally:
+            telemetry.unsubscribe(subscriber)
+
+    run_with_upstream(handler, subscribe)
+    assert request_ids and set(request_ids) == {None}
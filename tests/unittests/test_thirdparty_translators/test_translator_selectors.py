@@ -0,0 +1,269 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app import shared_cache as shared_cache_module
+from app.thirdparty_translators import translator_selectors as tpt
+
+from ..mock_gm import gm_handler
+
+
+def test_reads_are_cached(run_with_upstream):
+    calls = []
+    hits = tpt.vehicle_cache.hits
+
+    async def read_twice():
+        fuel = await tpt.select_fuel_level_async("gm", "1234")
+        battery = await tpt.select_battery_level_async("gm", "1234")
+        return fuel, battery
+
+    fuel, battery = run_with_upstream(gm_handler(calls), read_twice)
+
+    assert fuel.percent == 30.2 and battery.percent is None
+    assert calls == ["/getEnergyService"]  # second read is served from cache
+    assert tpt.vehicle_cache.hits == hits + 1
+
+
+def test_engine_command_invalidates_vehicle(run_with_upstream):
+    calls = []
+
+    async def read_command_read():
+        await tpt.select_fuel_level_async("gm", "1234")
+        await tpt.select_start_stop_engine_async("gm", "1234", {"action": "START"})
+        await tpt.select_fuel_level_async("gm", "1234")
+
+    run_with_upstream(gm_handler(calls), read_command_read)
+
+    assert calls == ["/getEnergyService", "/actionEngineService", "/getEnergyService"]
+
+
+def test_concurrent_reads_share_one_request(run_with_upstream):
+    calls = []
+
+    async def dashboard():
+        return await asyncio.gather(
+            tpt.select_fuel_level_async("gm", "1234"),
+            tpt.select_battery_level_async("gm", "1234"),
+        )
+
+    fuel, battery = run_with_upstream(gm_handler(calls), dashboard)
+
+    assert fuel.percent == 30.2 and battery.percent is None
+    assert calls == ["/getEnergyService"]
+
+
+def test_snapshot_fetches_each_service_once(run_with_upstream):
+    calls = []
+
+    snapshot = run_with_upstream(
+        gm_handler(calls),
+        lambda: tpt.select_snapshot_async(
+            "gm", "1234", ["info", "doors", "fuel", "battery"]
+        ),
+    )
+
+    assert sorted(calls) == [
+        "/getEnergyService",
+        "/getSecurityStatusService",
+        "/getVehicleInfoService",
+    ]
+    assert snapshot.info.doorCount == 4
+    assert len(snapshot.doors) == 2
+    assert snapshot.fuel.percent == 30.2 and snapshot.battery.percent is None
+    assert snapshot.errors == {}
+
+
+def test_snapshot_partial_failure(run_with_upstream):
+    calls = []
+
+    snapshot = run_with_upstream(
+        gm_handler(calls, failing=("/getEnergyService",)),
+        lambda: tpt.select_snapshot_async("gm", "1234", ["info", "fuel", "battery"]),
+    )
+
+    assert snapshot.info.vin == "123123412412"
+    assert snapshot.fuel is None and snapshot.battery is None
+    assert snapshot.errors["fuel"].status == 500
+    assert snapshot.errors["battery"].detail == "GM is down"
+    assert "/getSecurityStatusService" not in calls  # doors were not requested
+
+
+def test_batch_concurrency_per_brand(run_with_upstream, monkeypatch):
+    monkeypatch.setitem(tpt.settings.batch_concurrency, "gm", 2)
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return gm_handler([])(request)
+
+    vehicle_brands = {str(vid): "gm" for vid in range(6)}
+    vehicle_brands["FORD"] = "ford"
+    batch = run_with_upstream(
+        handler, lambda: tpt.select_batch_async(vehicle_brands, ["fuel"])
+    )
+
+    assert peak == 2
+    assert len(batch.results) == 6
+    assert batch.errors["FORD"].status == 404
+
+
+def test_get_adapter(monkeypatch):
+    monkeypatch.setattr(tpt, "_adapters", {})
+
+    adapter = tpt.get_adapter("gm")
+    assert adapter.__name__ == tpt.BRAND_ADAPTERS["gm"]
+    assert tpt.get_adapter("gm") is adapter  # imported once
+
+    with pytest.raises(HTTPException) as e:
+        tpt.get_adapter("ford")
+    assert e.value.status_code == 404
+
+
+def test_cached_translations_are_reused(run_with_upstream):
+    async def read_three_times():
+        first = await tpt.select_vehicle_info_async("gm", "1234")
+        second = await tpt.select_vehicle_info_async("gm", "1234")
+        tpt.invalidate_vehicle("gm", "1234")
+        third = await tpt.select_vehicle_info_async("gm", "1234")
+        return first, second, third
+
+    first, second, third = run_with_upstream(gm_handler([]), read_three_times)
+    assert second is first
+    assert third is not first  # translated again from the new upstream data
+    assert third == first
+
+
+def test_stale_reads_are_refreshed_in_background(run_with_upstream, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(tpt.vehicle_cache, "_clock", lambda: now[0])
+    calls = []
+
+    async def read_through_expiry():
+        await tpt.select_fuel_level_async("gm", "1234")
+        now[0] = 6.0  # past the 5s TTL, within the grace period
+        stale = await tpt.select_fuel_level_async("gm", "1234")
+        upstream_calls = len(calls)
+        await asyncio.sleep(0.05)  # lets the background refresh finish
+        return stale, upstream_calls
+
+    stale, upstream_calls = run_with_upstream(gm_handler(calls), read_through_expiry)
+    assert stale == {"percent": 30.2}
+    assert upstream_calls == 1  # stale value served without waiting on GM
+    assert calls == ["/getEnergyService", "/getEnergyService"]
+    assert tpt.vehicle_cache.lookup(("gm", "getEnergyService", "1234"))[1] > 0
+
+
+@pytest.fixture
+def shared_cache(monkeypatch):
+    monkeypatch.setattr(tpt.settings, "shared_cache_backend", "memory")
+    monkeypatch.setattr(tpt.settings, "shared_cache_fill_wait", 0.5)
+    yield tpt.get_shared_cache()
+    shared_cache_module.close_shared_cache()
+
+
+def test_shared_cache_fills_other_workers(run_with_upstream, shared_cache):
+    calls = []
+
+    async def read_from_two_workers():
+        first = await tpt.select_fuel_level_async("gm", "1234")
+        tpt.vehicle_cache.clear()  # the next read is another worker's miss
+        tpt.translation_cache.clear()
+        return first, await tpt.select_fuel_level_async("gm", "1234")
+
+    first, second = run_with_upstream(gm_handler(calls), read_from_two_workers)
+    assert first == second
+    assert calls == ["/getEnergyService"]
+    assert tpt.vehicle_cache.lookup(("gm", "getEnergyService", "1234"))[1] > 0
+
+
+def test_shared_cache_calls_run_off_the_event_loop(
+    run_with_upstream, shared_cache, monkeypatch
+):
+    threads = []
+    for name in ("get", "try_lock", "set", "unlock", "delete"):
+        call = getattr(shared_cache, name)
+
+        def record(*args, call=call, name=name):
+            threads.append((name, threading.current_thread()))
+            return call(*args)
+
+        monkeypatch.setattr(shared_cache, name, record)
+
+    async def read_and_command():
+        await tpt.select_fuel_level_async("gm", "1234")
+        await tpt.select_start_stop_engine_async("gm", "1234", {"action": "START"})
+
+    run_with_upstream(gm_handler([]), read_and_command)
+    assert {name for name, _ in threads} == {
+        "get",
+        "try_lock",
+        "set",
+        "unlock",
+        "delete",
+    }
+    assert threading.main_thread() not in {thread for _, thread in threads}
+
+
+def test_shared_cache_serves_stale_data_while_refreshing(
+    run_with_upstream, shared_cache
+):
+    calls = []
+    key = "gm|getEnergyService|1234"
+    stale = b'{"tankLevel": {"type": "Number", "value": "10.0"}}'
+
+    async def read_stale_twice():
+        shared_cache.set(key, stale, -1, 60)  # expired, within its grace period
+        first = await tpt.select_fuel_level_async("gm", "1234")
+        await asyncio.sleep(0.05)  # lets the background refresh fail
+        second = await tpt.select_fuel_level_async("gm", "1234")
+        await asyncio.sleep(0.05)
+        return first, second
+
+    handler = gm_handler(calls, failing=("/getEnergyService",))
+    first, second = run_with_upstream(handler, read_stale_twice)
+    assert first.percent == second.percent == 10.0  # the failed refresh kept it
+    assert calls == ["/getEnergyService"] * 2
+    assert tpt.refresh.refresher.stats()["failed"] == 2
+
+    calls.clear()
+
+    async def read_stale_then_fresh():
+        first = await tpt.select_fuel_level_async("gm", "1234")
+        await asyncio.sleep(0.05)  # lets the background refresh finish
+        return first, shared_cache.get(key)
+
+    fuel, entry = run_with_upstream(gm_handler(calls), read_stale_then_fresh)
+    assert fuel.percent == 10.0
+    assert calls == ["/getEnergyService"]
+    assert entry[1] > 0
+
+
+def test_shared_cache_waits_for_filling_worker(run_with_upstream, shared_cache):
+    calls = []
+    key = "gm|getEnergyService|1234"
+
+    async def read_while_other_worker_fills():
+        assert shared_cache.try_lock(key, "other-worker", lease=10)
+
+        async def fill():
+            await asyncio.sleep(0.05)
+            shared_cache.set(
+                key, b'{"tankLevel": {"type": "Number", "value": "10.0"}}', 5
+            )
+            shared_cache.unlock(key, "other-worker")
+
+        _, fuel = await asyncio.gather(
+            fill(), tpt.select_fuel_level_async("gm", "1234")
+        )
+        return fuel
+
+    fuel = run_with_upstream(gm_handler(calls), read_while_other_worker_fills)
+    assert calls == []
+    assert fuel.percent == 10.0
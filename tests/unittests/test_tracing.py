@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.tracing import _valid_request_id
+
+client = TestClient(app)
+
+
+def test_request_id_is_propagated():
+    response = client.get("/vehicles/INVALID_ID", headers={"X-Request-ID": "abc-123"})
+    assert response.status_code == 404
+    assert response.headers["x-request-id"] == "abc-123"
+
+
+def test_request_id_is_assigned():
+    first = client.get("/vehicles/INVALID_ID").headers["x-request-id"]
+    second = client.get("/vehicles/INVALID_ID").headers["x-request-id"]
+    assert first and second and first != second
+
+
+def test_valid_request_id():
+    assert _valid_request_id(b"abc") == "abc"
+    assert _valid_request_id(b"") is None
+    assert _valid_request_id(b"a" * 129) is None
+    assert _valid_request_id(b"a\nb") is None
+    assert _valid_request_id("é".encode()) is None